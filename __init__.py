@@ -14,40 +14,94 @@ import importlib
 if "humanoid_utils" in locals():
     importlib.reload(humanoid_utils)
 
+if "core" in locals():
+    importlib.reload(core.skeleton)
+    importlib.reload(core.pose_math)
+    importlib.reload(core.gltf)
+    importlib.reload(core.vrma)
+    importlib.reload(core.bone_names)
+    importlib.reload(core.topology)
+    importlib.reload(core.humanoid_layout)
+    importlib.reload(core.rig_spec)
+
 if "humanoid_properties" in locals():
     importlib.reload(humanoid_properties)
 
 if "create_humanoid" in locals():
     importlib.reload(create_humanoid)
 
+if "rig_spec" in locals():
+    importlib.reload(rig_spec)
+
 if "add_humanoid_rig" in locals():
     importlib.reload(add_humanoid_rig)
 
 if "copy_humanoid_pose" in locals():
     importlib.reload(copy_humanoid_pose)
 
+if "apply_humanoid_pose" in locals():
+    importlib.reload(apply_humanoid_pose)
+
+if "export_vrma" in locals():
+    importlib.reload(export_vrma)
+
+if "import_vrma" in locals():
+    importlib.reload(import_vrma)
+
+if "vmc" in locals():
+    importlib.reload(vmc)
+
+if "bone_map_cache" in locals():
+    importlib.reload(bone_map_cache)
+
+if "guess_topology" in locals():
+    importlib.reload(guess_topology)
+
 if "guess_human_bones" in locals():
     importlib.reload(guess_human_bones)
 
+if "constraint_index" in locals():
+    importlib.reload(constraint_index)
+
 if "humanoid_panel" in locals():
     importlib.reload(humanoid_panel)
 
+from . import core
+from .core import skeleton, pose_math, gltf, vrma
+from .core import bone_names, topology, humanoid_layout
 from . import humanoid_utils
+from . import humanoid_properties
 from .humanoid_properties import HumanoidProperties
-from .create_humanoid import CreateHumanoid
+from .create_humanoid import CreateHumanoid, CreateHumanoidCrowd
+from . import rig_spec
 from .add_humanoid_rig import AddHumanoidRig
 from .copy_humanoid_pose import CopyHumanoidPose
+from .apply_humanoid_pose import PasteHumanoidPose
+from .export_vrma import ExportHumanoidVrma
+from .import_vrma import ImportHumanoidVrma
+from . import vmc
 from .guess_human_bones import GuessHumanBones
-from .humanoid_panel import ArmatureHumanoidPanel, SelectPoseBone
+from . import bone_map_cache
+from .bone_map_cache import ExportBoneMapCache, ImportBoneMapCache
+from . import constraint_index
+from .humanoid_panel import ArmatureHumanoidPanel, SelectPoseBone, BONE_PANELS
 
 OPERATORS = [
     CreateHumanoid,
+    CreateHumanoidCrowd,
     AddHumanoidRig,
     CopyHumanoidPose,
+    PasteHumanoidPose,
+    ExportHumanoidVrma,
+    ImportHumanoidVrma,
+    vmc.VmcSend,
+    vmc.VmcReceive,
     GuessHumanBones,
+    ExportBoneMapCache,
+    ImportBoneMapCache,
     SelectPoseBone,
 ]
-CLASSES = [HumanoidProperties, ArmatureHumanoidPanel] + OPERATORS
+CLASSES = [HumanoidProperties, ArmatureHumanoidPanel] + BONE_PANELS + OPERATORS
 
 
 def add_to_menu(menu: str, op):
@@ -68,9 +122,40 @@ def register():
             add_to_menu(cls.bl_menu, cls)
 
     bpy.types.Armature.humanoid = bpy.props.PointerProperty(type=HumanoidProperties)
+    bpy.types.WindowManager.humanoid_show_draw_time = bpy.props.BoolProperty(
+        name="Show Draw Time"
+    )
+
+    for handlers in humanoid_properties.HANDLERS:
+        handlers.append(humanoid_properties.clear_index_cache)
+
+    for handlers, handler in constraint_index.HANDLERS:
+        handlers.append(handler)
+    constraint_index.subscribe()
+
+    for handlers, handler in bone_map_cache.HANDLERS:
+        handlers.append(handler)
 
 
 def unregister():
+    vmc.stop_all()
+
+    for handlers in humanoid_properties.HANDLERS:
+        if humanoid_properties.clear_index_cache in handlers:
+            handlers.remove(humanoid_properties.clear_index_cache)
+
+    for handlers, handler in constraint_index.HANDLERS:
+        if handler in handlers:
+            handlers.remove(handler)
+    constraint_index.unsubscribe()
+
+    for handlers, handler in bone_map_cache.HANDLERS:
+        if handler in handlers:
+            handlers.remove(handler)
+    bone_map_cache.flush()
+
+    del bpy.types.WindowManager.humanoid_show_draw_time
+
     for cls in CLASSES:
         bpy.utils.unregister_class(cls)
 
@@ -1,71 +1,103 @@
-from typing import cast, Optional
+from typing import Dict, List, Optional, Tuple
 import bpy
-from .humanoid_utils import (
-    enter_pose,
-    get_or_create_editbone,
-    set_bone_group,
-    get_or_create_constraint,
-    get_human_bone,
-    get_human_editbone,
-    get_human_posebone,
+from .humanoid_utils import prop_to_name
+from .core.rig_spec import (
+    ConstraintSpec,
+    DriverSpec,
+    EditBoneSpec,
+    PoseBoneSpec,
+    RigPart,
+    StyleSpec,
+    Vector3,
 )
+from .rig_spec import find_python_drivers, get_rest, update_rig
+from . import humanoid_properties
 import math
 
-
-def make_inverted_pelvis(obj: bpy.types.Object):
-    mode = bpy.context.object.mode
-    if mode != "EDIT":
-        print(f"enter EDIT mode from {mode} mode")
-        bpy.ops.object.mode_set(mode="EDIT")
-
-    armature = cast(bpy.types.Armature, obj.data)
-
-    root = get_or_create_editbone(armature, "Root")
-    root.parent = None
-    root.use_connect = False
-    root.head = (0, 0, 0)
-    root.tail = (0, 1, 0)
-
-    cog = get_or_create_editbone(armature, "COG")
-    cog.parent = root
-    cog.head = get_human_editbone(armature, "spine").head
-    cog.tail = (cog.head.x, cog.head.y + 0.4, cog.head.z)
-
-    pelvis = get_or_create_editbone(armature, "Pelvis")
-    pelvis.parent = cog
-    pelvis.use_connect = False
-    pelvis.head = cog.head
-
-    hips = get_human_editbone(armature, "hips")
-    pelvis.tail = hips.head
-
-    hips.parent = pelvis
-    with enter_pose(obj):
-        set_bone_group(obj, "Root", "Rig", "THEME05")
-        set_bone_group(obj, "COG", "Rig", "THEME05")
-        set_bone_group(obj, "Pelvis", "Rig", "THEME05")
-        set_bone_group(obj, "spine", "Rig", "THEME05")
-        set_bone_group(obj, "chest", "Rig", "THEME05")
-        set_bone_group(obj, "neck", "Rig", "THEME05")
-        set_bone_group(obj, "head", "Rig", "THEME05")
-        set_bone_group(obj, "left_toes", "Rig", "THEME05")
-        set_bone_group(obj, "right_toes", "Rig", "THEME05")
-
-        hips = get_human_posebone(obj, "hips")
-        hips.lock_rotation = (True, True, True)
-        hips.lock_scale = (True, True, True)
-        get_human_bone(armature, "hips").hide = True
-
-    get_human_bone(armature, "spine").use_inherit_rotation = False
-
-
-def make_leg_ik(obj: bpy.types.Object, suffix: str):
-    mode = bpy.context.object.mode
-    if mode != "EDIT":
-        print(f"enter EDIT mode from {mode} mode")
-        bpy.ops.object.mode_set(mode="EDIT")
-
-    armature = cast(bpy.types.Armature, obj.data)
+Rest = Dict[str, Tuple[Vector3, Vector3]]
+
+
+def get_name(armature: bpy.types.Armature, prop: str) -> str:
+    return prop_to_name(armature, prop) or prop
+
+
+def offset(v: Vector3, x: float = 0, y: float = 0, z: float = 0) -> Vector3:
+    return (v[0] + x, v[1] + y, v[2] + z)
+
+
+def vector(rest: Rest, name: str) -> Vector3:
+    head, tail = rest[name]
+    return (tail[0] - head[0], tail[1] - head[1], tail[2] - head[2])
+
+
+def rig_style(name: str) -> StyleSpec:
+    return StyleSpec(name, "Rig", "THEME05")
+
+
+def make_inverted_pelvis(obj: bpy.types.Object, rest: Rest) -> RigPart:
+    armature = obj.data
+    assert isinstance(armature, bpy.types.Armature)
+
+    cog_head = rest[get_name(armature, "spine")][0]
+    hips_name = get_name(armature, "hips")
+    return RigPart(
+        "pelvis",
+        edit_bones=[
+            EditBoneSpec(
+                "Root", parent="", use_connect=False, head=(0, 0, 0), tail=(0, 1, 0)
+            ),
+            EditBoneSpec(
+                "COG", parent="Root", head=cog_head, tail=offset(cog_head, y=0.4)
+            ),
+            EditBoneSpec(
+                "Pelvis",
+                parent="COG",
+                use_connect=False,
+                head=cog_head,
+                tail=rest[hips_name][0],
+            ),
+            EditBoneSpec(hips_name, parent="Pelvis"),
+            EditBoneSpec(get_name(armature, "spine"), use_inherit_rotation=False),
+        ],
+        pose_bones=[
+            PoseBoneSpec(
+                hips_name,
+                (
+                    ("rotation_mode", "ZYX"),
+                    ("lock_rotation", (True, True, True)),
+                    ("lock_scale", (True, True, True)),
+                ),
+                hide=True,
+            ),
+        ],
+        styles=[
+            rig_style(name)
+            for name in ["Root", "COG", "Pelvis"]
+            + [
+                get_name(armature, prop)
+                for prop in ["spine", "chest", "neck", "head", "left_toes", "right_toes"]
+            ]
+        ],
+    )
+
+
+def make_ik(ik_name: str, pole_name: str, lower_name: str) -> ConstraintSpec:
+    return ConstraintSpec(
+        lower_name,
+        "IK",
+        "IK",
+        (
+            ("subtarget", ik_name),
+            ("pole_subtarget", pole_name),
+            ("pole_angle", math.pi * (-90) / 180),
+            ("chain_count", 2),
+        ),
+    )
+
+
+def make_leg_ik(obj: bpy.types.Object, suffix: str, rest: Rest) -> RigPart:
+    armature = obj.data
+    assert isinstance(armature, bpy.types.Armature)
 
     prefix = ""
     if suffix == ".L":
@@ -73,64 +105,62 @@ def make_leg_ik(obj: bpy.types.Object, suffix: str):
     elif suffix == ".R":
         prefix = "right_"
 
-    foot_name = f"{prefix}foot"
+    foot_name = get_name(armature, f"{prefix}foot")
     foot_offset_name = f"FootOffset{suffix}"
     ik_name = f"LegIK{suffix}"
-    upper_name = f"{prefix}upper_leg"
-    lower_name = f"{prefix}lower_leg"
+    upper_name = get_name(armature, f"{prefix}upper_leg")
+    lower_name = get_name(armature, f"{prefix}lower_leg")
     pole_name = f"LegPole{suffix}"
 
-    ik_head = get_human_editbone(armature, foot_name).head
-    ik = get_or_create_editbone(armature, ik_name)
-    ik.parent = armature.edit_bones["Root"]
-    ik.use_connect = False
-    ik.head = ik_head
-    ik.tail = (ik_head.x, ik_head.y + 0.2, ik_head.z)
-
-    pole_head = get_human_editbone(armature, lower_name).head
-    pole = get_or_create_editbone(armature, pole_name)
-    pole.parent = ik
-    pole.use_connect = False
-    pole.head = (pole_head.x, pole_head.y - 0.4, pole_head.z)
-    pole.tail = (pole_head.x, pole_head.y - 0.6, pole_head.z)
-
-    upper = get_human_editbone(armature, upper_name)
-    lower = get_human_editbone(armature, lower_name)
-    if upper.vector == lower.vector:
+    foot_head, foot_tail = rest[foot_name]
+    pole_head = rest[lower_name][0]
+    edit_bones = [
+        EditBoneSpec(
+            ik_name,
+            parent="Root",
+            use_connect=False,
+            head=foot_head,
+            tail=offset(foot_head, y=0.2),
+        ),
+        EditBoneSpec(
+            pole_name,
+            parent=ik_name,
+            use_connect=False,
+            head=offset(pole_head, y=-0.4),
+            tail=offset(pole_head, y=-0.6),
+        ),
+        EditBoneSpec(
+            foot_offset_name,
+            parent=ik_name,
+            use_connect=False,
+            head=foot_head,
+            tail=foot_tail,
+        ),
+    ]
+    if vector(rest, upper_name) == vector(rest, lower_name):
         # ちょっと曲げる
-        lower.head.y -= 0.01
-
-    foot_offset = get_or_create_editbone(armature, foot_offset_name)
-    foot_offset.parent = ik
-    foot_offset.use_connect = False
-    foot_offset.head = get_human_editbone(armature, foot_name).head
-    foot_offset.tail = get_human_editbone(armature, foot_name).tail
-
-    with enter_pose(obj):
-        # IK
-        c = get_or_create_constraint(obj, lower_name, "IK")
-        c.target = obj
-        c.subtarget = ik_name
-        c.pole_target = obj
-        c.pole_subtarget = pole_name
-        c.pole_angle = math.pi * (-90) / 180
-        c.chain_count = 2
-        set_bone_group(obj, ik_name, "Rig", "THEME05")
-        set_bone_group(obj, pole_name, "Rig", "THEME05")
-
-        # FootCopy
-        c = get_or_create_constraint(obj, foot_name, "COPY_ROTATION", "Copy Rotation")
-        c.target = obj
-        c.subtarget = foot_offset_name
-
-
-def make_arm_ik(obj: bpy.types.Object, suffix: str):
-    mode = bpy.context.object.mode
-    if mode != "EDIT":
-        print(f"enter EDIT mode from {mode} mode")
-        bpy.ops.object.mode_set(mode="EDIT")
-
-    armature = cast(bpy.types.Armature, obj.data)
+        edit_bones.append(EditBoneSpec(lower_name, head=offset(pole_head, y=-0.01)))
+
+    return RigPart(
+        f"leg_ik{suffix}",
+        edit_bones=edit_bones,
+        constraints=[
+            make_ik(ik_name, pole_name, lower_name),
+            # FootCopy
+            ConstraintSpec(
+                foot_name,
+                "COPY_ROTATION",
+                "Copy Rotation",
+                (("subtarget", foot_offset_name),),
+            ),
+        ],
+        styles=[rig_style(ik_name), rig_style(pole_name)],
+    )
+
+
+def make_arm_ik(obj: bpy.types.Object, suffix: str, rest: Rest) -> RigPart:
+    armature = obj.data
+    assert isinstance(armature, bpy.types.Armature)
 
     prefix = ""
     if suffix == ".L":
@@ -138,48 +168,42 @@ def make_arm_ik(obj: bpy.types.Object, suffix: str):
     elif suffix == ".R":
         prefix = "right_"
 
-    hand_name = f"{prefix}hand"
+    hand_name = get_name(armature, f"{prefix}hand")
     ik_name = f"ArmIK{suffix}"
-    upper_name = f"{prefix}upper_arm"
-    lower_name = f"{prefix}lower_arm"
+    upper_name = get_name(armature, f"{prefix}upper_arm")
+    lower_name = get_name(armature, f"{prefix}lower_arm")
     pole_name = f"ArmPole{suffix}"
 
-    hand = get_human_editbone(armature, hand_name)
-    ik = get_or_create_editbone(armature, ik_name)
-    ik.parent = armature.edit_bones["COG"]
-    ik.use_connect = False
-    ik.head = hand.head
-    ik.tail = hand.tail
-
-    pole_head = get_human_editbone(armature, lower_name).head
-    pole = get_or_create_editbone(armature, pole_name)
-    pole.parent = armature.edit_bones["COG"]
-    pole.use_connect = False
-    pole.head = (pole_head.x, pole_head.y + 0.4, pole_head.z)
-    pole.tail = (pole_head.x, pole_head.y + 0.6, pole_head.z)
-
-    upper = get_human_editbone(armature, upper_name)
-    lower = get_human_editbone(armature, lower_name)
-    if upper.vector == lower.vector:
+    hand_head, hand_tail = rest[hand_name]
+    pole_head = rest[lower_name][0]
+    edit_bones = [
+        EditBoneSpec(
+            ik_name, parent="COG", use_connect=False, head=hand_head, tail=hand_tail
+        ),
+        EditBoneSpec(
+            pole_name,
+            parent="COG",
+            use_connect=False,
+            head=offset(pole_head, y=0.4),
+            tail=offset(pole_head, y=0.6),
+        ),
+    ]
+    if vector(rest, upper_name) == vector(rest, lower_name):
         # ちょっと曲げる
-        lower.head.y += 0.01
-
-    with enter_pose(obj):
-        # IK
-        c = get_or_create_constraint(obj, lower_name, "IK")
-        c.target = obj
-        c.subtarget = ik_name
-        c.pole_target = obj
-        c.pole_subtarget = pole_name
-        c.pole_angle = math.pi * (-90) / 180
-        c.chain_count = 2
-        set_bone_group(obj, ik_name, "Rig", "THEME05")
-        set_bone_group(obj, pole_name, "Rig", "THEME05")
-
-        # HandCopy
-        c = get_or_create_constraint(obj, hand_name, "COPY_ROTATION", "Copy Rotation")
-        c.target = obj
-        c.subtarget = ik_name
+        edit_bones.append(EditBoneSpec(lower_name, head=offset(pole_head, y=0.01)))
+
+    return RigPart(
+        f"arm_ik{suffix}",
+        edit_bones=edit_bones,
+        constraints=[
+            make_ik(ik_name, pole_name, lower_name),
+            # HandCopy
+            ConstraintSpec(
+                hand_name, "COPY_ROTATION", "Copy Rotation", (("subtarget", ik_name),)
+            ),
+        ],
+        styles=[rig_style(ik_name), rig_style(pole_name)],
+    )
 
 
 def is_limb(bone: str) -> bool:
@@ -198,13 +222,85 @@ def is_limb(bone: str) -> bool:
     return False
 
 
-def make_finger_bend(obj: bpy.types.Object, finger_name: str, suffix: str):
-    mode = bpy.context.object.mode
-    if mode != "EDIT":
-        print(f"enter EDIT mode from {mode} mode")
-        bpy.ops.object.mode_set(mode="EDIT")
-
-    armature = cast(bpy.types.Armature, obj.data)
+# bend only. lower arms, lower legs and fingers
+LIMB_PROPS = set()
+for side in ("left_", "right_"):
+    LIMB_PROPS.add(f"{side}lower_arm")
+    LIMB_PROPS.add(f"{side}lower_leg")
+    LIMB_PROPS.update(humanoid_properties.enum_subtree(f"{side}hand"))
+    LIMB_PROPS.discard(f"{side}hand")
+
+
+def scale_influence(src_name: str, scale_min: float, scale_range: float) -> DriverSpec:
+    """
+    1 at scale_min, 0 at scale_min + scale_range.
+    only min, max and arithmetic, so blender evaluates it without python
+    """
+    scale_max = round(scale_min + scale_range, 6)
+    return DriverSpec(
+        "influence",
+        f"({scale_max:g} - min(max(var, {scale_min:g}), {scale_max:g}))"
+        f" / {scale_range:g}",
+        (("var", f'pose.bones["{src_name}"].scale[1]'),),
+    )
+
+
+def copy_rot(
+    src_name: str,
+    dst_name: str,
+    scale_min: Optional[float] = None,
+    *,
+    scale_range: float = 0.3,
+) -> ConstraintSpec:
+    props = (
+        ("subtarget", src_name),
+        ("target_space", "LOCAL"),
+        ("owner_space", "LOCAL"),
+    )
+    if not scale_min:
+        return ConstraintSpec(dst_name, "COPY_ROTATION", "Copy Rotation", props)
+    # for Intermediate & Distal
+    return ConstraintSpec(
+        dst_name,
+        "COPY_ROTATION",
+        "Copy Rotation",
+        props + (("use_y", False), ("use_z", False)),
+        (scale_influence(src_name, scale_min, scale_range),),
+    )
+
+
+def copy_rot_3(
+    src_name: str,
+    dst_name: str,
+    scale_min: Optional[float] = None,
+    *,
+    scale_range: float = 0.3,
+) -> ConstraintSpec:
+    return ConstraintSpec(
+        dst_name,
+        "TRANSFORM",
+        "Transformation",
+        (
+            ("subtarget", src_name),
+            ("target_space", "LOCAL"),
+            ("owner_space", "LOCAL"),
+            ("map_from", "ROTATION"),
+            ("from_min_x_rot", -1),
+            ("from_max_x_rot", 1),
+            ("map_to", "ROTATION"),
+            ("to_min_x_rot", -3),
+            ("to_max_x_rot", 3),
+            ("mix_mode_rot", "BEFORE"),
+        ),
+        (scale_influence(src_name, scale_min, scale_range),) if scale_min else (),
+    )
+
+
+def make_finger_bend(
+    obj: bpy.types.Object, finger_name: str, suffix: str, rest: Rest
+) -> RigPart:
+    armature = obj.data
+    assert isinstance(armature, bpy.types.Armature)
 
     prefix = ""
     if suffix == ".L":
@@ -212,192 +308,194 @@ def make_finger_bend(obj: bpy.types.Object, finger_name: str, suffix: str):
     elif suffix == ".R":
         prefix = "right_"
 
-    hand_name = f"{prefix}hand"
+    hand_name = get_name(armature, f"{prefix}hand")
     if finger_name == "Thumb":
-        proximal_name = f"{prefix}{finger_name.lower()}_metacarpal"
-        intermediate_name = f"{prefix}{finger_name.lower()}_proximal"
+        proximal_prop = f"{prefix}{finger_name.lower()}_metacarpal"
+        intermediate_prop = f"{prefix}{finger_name.lower()}_proximal"
     else:
-        proximal_name = f"{prefix}{finger_name.lower()}_proximal"
-        intermediate_name = f"{prefix}{finger_name.lower()}_intermediate"
-    distal_name = f"{prefix}{finger_name.lower()}_distal"
+        proximal_prop = f"{prefix}{finger_name.lower()}_proximal"
+        intermediate_prop = f"{prefix}{finger_name.lower()}_intermediate"
+    proximal_name = get_name(armature, proximal_prop)
+    intermediate_name = get_name(armature, intermediate_prop)
+    distal_name = get_name(armature, f"{prefix}{finger_name.lower()}_distal")
     bend_name = f"Bend{finger_name}{suffix}"
 
-    hand = get_human_editbone(armature, hand_name)
-    proximal = get_human_editbone(armature, proximal_name)
-    distal = get_human_editbone(armature, distal_name)
-
-    bend = get_or_create_editbone(armature, bend_name)
-    bend.parent = hand
-    bend.use_connect = False
-    delta = 0.01 if proximal.head.x > 0 else -0.01
-    bend.head = proximal.head
-    bend.tail = distal.tail
-    bend.roll = proximal.roll
+    head = rest[proximal_name][0]
+    tail = rest[distal_name][1]
     if finger_name == "Thumb":
-        bend.head.y -= 0.02
-        bend.tail.y -= 0.02
+        head = offset(head, y=-0.02)
+        tail = offset(tail, y=-0.02)
+        lock_rotation = (False, True, False)
+        constraints = [
+            copy_rot(bend_name, proximal_name),
+            copy_rot_3(bend_name, intermediate_name, 0.7, scale_range=0.3),
+            copy_rot_3(bend_name, distal_name, 0.4, scale_range=0.3),
+        ]
     else:
-        bend.head.z += 0.02
-        bend.tail.z += 0.02
-
-    def copy_rot(
-        src_name: str,
-        dst_name: str,
-        scale_min: Optional[float] = None,
-        *,
-        scale_range: float = 0.3,
-    ):
-        c = get_or_create_constraint(obj, dst_name, "COPY_ROTATION", "Copy Rotation")
-        c.target = obj
-        c.subtarget = src_name
-        c.target_space = "LOCAL"
-        c.owner_space = "LOCAL"
-        set_bone_group(obj, src_name, "Rig", "THEME05")
-
-        if scale_min:
-            # for Intermediate & Distal
-            c.use_y = False
-            c.use_z = False
-            # scale influence
-            factor = 1 / scale_range
-            scale_max = scale_min + scale_range
-            driver = c.driver_add("influence")
-            driver.driver.type = "SCRIPTED"
-            var = driver.driver.variables.new()
-            var.name = "var"
-            var.type = "SINGLE_PROP"
-            var.targets[0].id = obj
-            var.targets[0].data_path = f'pose.bones["{src_name}"].scale[1]'
-            driver.driver.expression = (
-                f"({scale_max} - min(max(var, {scale_min}), {scale_max})) * {factor}"
+        head = offset(head, z=0.02)
+        tail = offset(tail, z=0.02)
+        lock_rotation = (False, True, True)
+        constraints = [
+            copy_rot(bend_name, proximal_name),
+            copy_rot(bend_name, intermediate_name, 0.7, scale_range=0.3),
+            copy_rot(bend_name, distal_name, 0.4, scale_range=0.3),
+        ]
+
+    return RigPart(
+        f"bend_{finger_name.lower()}{suffix}",
+        edit_bones=[
+            EditBoneSpec(
+                bend_name,
+                parent=hand_name,
+                use_connect=False,
+                head=head,
+                tail=tail,
+                roll_from=proximal_name,
             )
-
-    def copy_rot_3(
-        src_name: str,
-        dst_name: str,
-        scale_min: Optional[float] = None,
-        *,
-        scale_range: float = 0.3,
-    ):
-        c = get_or_create_constraint(obj, dst_name, "TRANSFORM", "Transformation")
-        c.target = obj
-        c.subtarget = src_name
-        c.target_space = "LOCAL"
-        c.owner_space = "LOCAL"
-
-        c.map_from = "ROTATION"
-        c.from_min_x_rot = -1
-        c.from_max_x_rot = 1
-
-        c.map_to = "ROTATION"
-        c.to_min_x_rot = -3
-        c.to_max_x_rot = 3
-        c.mix_mode_rot = "BEFORE"
-
-        set_bone_group(obj, src_name, "Rig", "THEME05")
-
-        if scale_min:
-            # scale influence
-            factor = 1 / scale_range
-            scale_max = scale_min + scale_range
-            driver = c.driver_add("influence")
-            driver.driver.type = "SCRIPTED"
-            var = driver.driver.variables.new()
-            var.name = "var"
-            var.type = "SINGLE_PROP"
-            var.targets[0].id = obj
-            var.targets[0].data_path = f'pose.bones["{src_name}"].scale[1]'
-            driver.driver.expression = (
-                f"({scale_max} - min(max(var, {scale_min}), {scale_max})) * {factor}"
+        ],
+        pose_bones=[
+            PoseBoneSpec(
+                bend_name,
+                (
+                    ("rotation_mode", "ZYX"),
+                    ("lock_location", (True, True, True)),
+                    ("lock_rotation", lock_rotation),
+                    ("lock_scale", (True, False, True)),
+                ),
             )
-
-    with enter_pose(obj):
-        bend_pose = obj.pose.bones[bend_name]
-        bend_pose.rotation_mode = "ZYX"
-        bend_pose.lock_location[0] = True
-        bend_pose.lock_location[1] = True
-        bend_pose.lock_location[2] = True
-        if finger_name == "Thumb":
-            bend_pose.lock_rotation[1] = True
-        else:
-            bend_pose.lock_rotation[1] = True
-            bend_pose.lock_rotation[2] = True
-        bend_pose.lock_scale[0] = True
-        bend_pose.lock_scale[2] = True
-
-        copy_rot(bend_name, proximal_name)
-        if finger_name == "Thumb":
-            copy_rot_3(bend_name, intermediate_name, 0.7, scale_range=0.3)
-            copy_rot_3(bend_name, distal_name, 0.4, scale_range=0.3)
-        else:
-            copy_rot(bend_name, intermediate_name, 0.7, scale_range=0.3)
-            copy_rot(bend_name, distal_name, 0.4, scale_range=0.3)
-
-
-def make_hand_rig(obj, suffix: str):
-    make_finger_bend(obj, "Index", suffix)
-    make_finger_bend(obj, "Middle", suffix)
-    make_finger_bend(obj, "Ring", suffix)
-    make_finger_bend(obj, "Little", suffix)
-    make_finger_bend(obj, "Thumb", suffix)
-
-    mode = bpy.context.object.mode
-    if mode != "EDIT":
-        print(f"enter EDIT mode from {mode} mode")
-        bpy.ops.object.mode_set(mode="EDIT")
-    armature = cast(bpy.types.Armature, obj.data)
-
-    prefix = ""
-    if suffix == ".L":
-        prefix = "left_"
-    elif suffix == ".R":
-        prefix = "right_"
-
-    hand_name = f"{prefix}hand"
+        ],
+        constraints=constraints,
+        styles=[rig_style(bend_name)],
+    )
+
+
+def make_hand_rig(obj: bpy.types.Object, suffix: str, rest: Rest) -> List[RigPart]:
+    armature = obj.data
+    assert isinstance(armature, bpy.types.Armature)
+
+    prefix = "left_" if suffix == ".L" else "right_"
+    # finger roots are the children of the hand
+    parts = [
+        make_finger_bend(
+            obj, finger[len(prefix) :].split("_")[0].capitalize(), suffix, rest
+        )
+        for finger in humanoid_properties.enum_children(f"{prefix}hand")
+    ]
+
+    hand_name = get_name(armature, f"{prefix}hand")
     spread_name = f"Spread{suffix}"
-    little_proximal_name = f"{prefix}little_proximal"
-    little_distal_name = f"{prefix}little_distal"
-
-    hand = get_human_editbone(armature, hand_name)
-    ring_proximal = get_human_editbone(armature, little_proximal_name)
-    ring_distal = get_human_editbone(armature, little_distal_name)
-    spread = get_or_create_editbone(armature, spread_name)
-    spread.parent = hand
-    spread.use_connect = False
-    spread.head = ring_proximal.head
-    spread.head.y += 0.02
-    spread.head.z += 0.02
-    spread.tail = ring_distal.tail
-    spread.tail.y += 0.02
-    spread.tail.z += 0.02
-    spread.roll = ring_proximal.roll
+    little_proximal_name = get_name(armature, f"{prefix}little_proximal")
+    little_distal_name = get_name(armature, f"{prefix}little_distal")
 
     def copy_rot2bend(src_name: str, dst_name: str, influence: float):
-        c = get_or_create_constraint(obj, dst_name, "TRANSFORM", "Transformation")
-        c.target = obj
-        c.subtarget = src_name
-        c.target_space = "LOCAL"
-        c.owner_space = "LOCAL"
-
-        c.map_from = "ROTATION"
-        c.from_min_z_rot = -1.5  # about pi/2
-        c.from_max_z_rot = 1.5
-
-        c.map_to = "ROTATION"
-        c.to_min_z_rot = -1.5 * influence
-        c.to_max_z_rot = 1.5 * influence
-        c.mix_mode_rot = "BEFORE"
-
-        set_bone_group(obj, src_name, "Rig", "THEME05")
-
-    with enter_pose(obj):
-        spread_pose = obj.pose.bones[spread_name]
-        spread_pose.rotation_mode = "ZYX"
-        spread_pose.lock_rotation = [True, True, False]
-        copy_rot2bend(spread_name, f"BendIndex{suffix}", -0.65)
-        # copy_rot2bend(spread_name, f'BendMiddle{suffix}')
-        copy_rot2bend(spread_name, f"BendRing{suffix}", 0.65)
-        copy_rot2bend(spread_name, f"BendLittle{suffix}", 1)
+        return ConstraintSpec(
+            dst_name,
+            "TRANSFORM",
+            "Transformation",
+            (
+                ("subtarget", src_name),
+                ("target_space", "LOCAL"),
+                ("owner_space", "LOCAL"),
+                ("map_from", "ROTATION"),
+                ("from_min_z_rot", -1.5),  # about pi/2
+                ("from_max_z_rot", 1.5),
+                ("map_to", "ROTATION"),
+                ("to_min_z_rot", -1.5 * influence),
+                ("to_max_z_rot", 1.5 * influence),
+                ("mix_mode_rot", "BEFORE"),
+            ),
+        )
+
+    parts.append(
+        RigPart(
+            f"spread{suffix}",
+            edit_bones=[
+                EditBoneSpec(
+                    spread_name,
+                    parent=hand_name,
+                    use_connect=False,
+                    head=offset(rest[little_proximal_name][0], y=0.02, z=0.02),
+                    tail=offset(rest[little_distal_name][1], y=0.02, z=0.02),
+                    roll_from=little_proximal_name,
+                )
+            ],
+            pose_bones=[
+                PoseBoneSpec(
+                    spread_name,
+                    (
+                        ("rotation_mode", "ZYX"),
+                        ("lock_rotation", (True, True, False)),
+                    ),
+                )
+            ],
+            constraints=[
+                copy_rot2bend(spread_name, f"BendIndex{suffix}", -0.65),
+                # copy_rot2bend(spread_name, f'BendMiddle{suffix}')
+                copy_rot2bend(spread_name, f"BendRing{suffix}", 0.65),
+                copy_rot2bend(spread_name, f"BendLittle{suffix}", 1),
+            ],
+            styles=[rig_style(spread_name)],
+        )
+    )
+    return parts
+
+
+def make_base(obj: bpy.types.Object, skip: set) -> RigPart:
+    """
+    rotation locks of the humanoid bones.
+    bones made or posed by the other parts are skipped.
+    bones that are not assigned to a humanBone keep the locks of the user
+    """
+    bones = obj.data.bones
+    # a bone assigned to two props gets the locks of the first
+    done = set(skip)
+    pose_bones = []
+    for prop in humanoid_properties.PROP_NAMES:
+        name = prop_to_name(obj.data, prop)
+        if not name or name not in bones or name in done:
+            continue
+        done.add(name)
+        if prop in LIMB_PROPS or is_limb(name):
+            lock_rotation = (False, True, True)
+        else:
+            lock_rotation = (False, False, False)
+        pose_bones.append(
+            PoseBoneSpec(
+                name,
+                (
+                    ("rotation_mode", "ZYX"),
+                    ("lock_scale", (True, True, True)),
+                    ("lock_rotation", lock_rotation),
+                ),
+            )
+        )
+    return RigPart("base", pose_bones=pose_bones)
+
+
+def make_rig(obj: bpy.types.Object) -> List[RigPart]:
+    rest = get_rest(obj.data)
+    parts = [
+        make_inverted_pelvis(obj, rest),
+        make_leg_ik(obj, ".L", rest),
+        make_leg_ik(obj, ".R", rest),
+        make_arm_ik(obj, ".L", rest),
+        make_arm_ik(obj, ".R", rest),
+    ]
+    parts += make_hand_rig(obj, ".L", rest)
+    parts += make_hand_rig(obj, ".R", rest)
+
+    humanoid_names = {
+        get_name(obj.data, prop) for prop in humanoid_properties.PROP_NAMES
+    }
+    rig_names = {
+        spec.name
+        for part in parts
+        for spec in part.edit_bones
+        if spec.name not in humanoid_names
+    }
+    # hips. the pelvis part owns it
+    posed_names = {spec.name for part in parts for spec in part.pose_bones}
+    return [make_base(obj, rig_names | posed_names)] + parts
 
 
 class AddHumanoidRig(bpy.types.Operator):
@@ -414,19 +512,13 @@ class AddHumanoidRig(bpy.types.Operator):
 
     def execute(self, context):
         obj = context.active_object
-        with enter_pose(obj):
-            for b in obj.pose.bones:
-                b.rotation_mode = "ZYX"
-                b.lock_scale = [True, True, True]
-                if is_limb(b.name):
-                    b.lock_rotation[1] = True
-                    b.lock_rotation[2] = True
-
-        make_inverted_pelvis(obj)
-        make_leg_ik(obj, ".L")
-        make_leg_ik(obj, ".R")
-        make_arm_ik(obj, ".L")
-        make_arm_ik(obj, ".R")
-        make_hand_rig(obj, ".L")
-        make_hand_rig(obj, ".R")
+        try:
+            parts = update_rig(obj, make_rig)
+        except ValueError as e:
+            self.report({"ERROR"}, str(e))
+            return {"CANCELLED"}
+        self.report({"INFO"}, f"rig: {len(parts)} parts updated")
+        slow = find_python_drivers(obj)
+        if slow:
+            self.report({"WARNING"}, f"drivers need python: {', '.join(slow)}")
         return {"FINISHED"}
@@ -0,0 +1,152 @@
+from typing import Dict, List, Optional
+import json
+import bpy
+import numpy
+from . import humanoid_properties
+from .core import pose_math
+from .core.vrma import VRM_POSE, normalized_from_world_deltas, parse_pose
+
+
+class PoseApplier:
+    """
+    writes VRM normalized rotations to the humanoid pose bones of obj.
+    all bones are written by one foreach_set for each rotation mode.
+
+    non humanoid bones between humanoid bones are assumed to be in rest pose.
+    """
+
+    def __init__(self, obj: bpy.types.Object, to_meter: float = 1) -> None:
+        self.obj = obj
+        self.to_meter = to_meter
+        tree = humanoid_properties.HumanTree(obj.data)
+        self.bone_names, self.vrm_names, self.parent_indices = tree.index.flatten()
+
+        pose_bones = obj.pose.bones
+        self.pose_indices = pose_math.bone_indices(pose_bones.keys(), self.bone_names)
+
+        # rest pose corrections
+        armature = obj.data
+        rest = numpy.empty(len(armature.bones) * 16, dtype=numpy.float32)
+        armature.bones.foreach_get("matrix_local", rest)
+        rest = pose_math.select_matrices(
+            rest, pose_math.bone_indices(armature.bones.keys(), self.bone_names)
+        )
+        self.rest_heads = rest[:, :3, 3]
+        self.rest_rotations = pose_math.normalized_mat3_to_quat(
+            pose_math.normalized_mat3(rest)
+        )
+        self.rest_inverses = pose_math.quat_conjugate(self.rest_rotations)
+        self.hips_rest = pose_math.normalized_mat3(rest[:1])[0]
+
+        # humanoid index grouped by rotation_mode
+        modes = {}
+        for i, bone_name in enumerate(self.bone_names):
+            modes.setdefault(pose_bones[bone_name].rotation_mode, []).append(i)
+        self.modes = {
+            mode: numpy.array(indices, dtype=int) for mode, indices in modes.items()
+        }
+
+        count = len(pose_bones)
+        self.quaternions = numpy.empty(count * 4, dtype=numpy.float32)
+        self.eulers = numpy.empty(count * 3, dtype=numpy.float32)
+        self.axis_angles = numpy.empty(count * 4, dtype=numpy.float32)
+        self.locations = numpy.empty(count * 3, dtype=numpy.float32)
+
+    def from_world_deltas(
+        self, deltas: Dict[str, numpy.ndarray], frames: int = 1
+    ) -> numpy.ndarray:
+        """
+        humanBone => (frames, 4) world rotation from rest pose.
+        returns (frames, len(bone_names), 4) VRM normalized local rotations.
+        bones not in deltas follow the parent.
+        """
+        return normalized_from_world_deltas(
+            deltas, self.vrm_names, self.parent_indices, frames
+        )
+
+    def to_basis(self, rotations: numpy.ndarray) -> numpy.ndarray:
+        """
+        VRM normalized local rotations (n, 4) in armature axes to pose bone basis
+        """
+        return pose_math.quat_multiply(
+            pose_math.quat_multiply(self.rest_inverses, rotations),
+            self.rest_rotations,
+        )
+
+    def apply(
+        self,
+        rotations: numpy.ndarray,
+        hips_translation: Optional[numpy.ndarray] = None,
+    ):
+        """
+        rotations: (len(bone_names), 4) VRM normalized local rotations. xyzw
+        hips_translation: (3,) in armature space
+        """
+        pose_bones = self.obj.pose.bones
+        basis = self.to_basis(rotations)
+
+        for mode, indices in self.modes.items():
+            targets = self.pose_indices[indices]
+            if mode == "QUATERNION":
+                pose_bones.foreach_get("rotation_quaternion", self.quaternions)
+                values = self.quaternions.reshape(-1, 4)
+                # bpy order is wxyz
+                values[targets] = basis[indices][:, [3, 0, 1, 2]]
+                pose_bones.foreach_set("rotation_quaternion", self.quaternions)
+            elif mode == "AXIS_ANGLE":
+                pose_bones.foreach_get("rotation_axis_angle", self.axis_angles)
+                values = self.axis_angles.reshape(-1, 4)
+                values[targets] = pose_math.quat_to_axis_angle(basis[indices])
+                pose_bones.foreach_set("rotation_axis_angle", self.axis_angles)
+            else:
+                pose_bones.foreach_get("rotation_euler", self.eulers)
+                values = self.eulers.reshape(-1, 3)
+                values[targets] = pose_math.quat_to_euler(basis[indices], mode)
+                pose_bones.foreach_set("rotation_euler", self.eulers)
+
+        if hips_translation is not None:
+            pose_bones.foreach_get("location", self.locations)
+            values = self.locations.reshape(-1, 3)
+            t = numpy.asarray(hips_translation) / self.to_meter - self.rest_heads[0]
+            values[self.pose_indices[0]] = self.hips_rest.T @ t
+            pose_bones.foreach_set("location", self.locations)
+
+        # foreach_set does not tag. one update for all bones
+        self.obj.update_tag()
+
+
+def paste_pose(obj: bpy.types.Object, text: str, to_meter: float = 1) -> List[str]:
+    """
+    returns the humanBone names that are skipped
+    """
+    gltf = json.loads(text)
+    pose = parse_pose(gltf)
+    applier = PoseApplier(obj, to_meter)
+    rotations = applier.from_world_deltas(pose.deltas)[0]
+    applier.apply(rotations, pose.hips_position)
+    return pose.unknown
+
+
+class PasteHumanoidPose(bpy.types.Operator):
+    bl_idname = "humanoid.paste_pose"
+    bl_label = "Paste Pose From Clipboard"
+    bl_options = {"REGISTER", "UNDO"}
+
+    @classmethod
+    def poll(cls, context: bpy.types.Context) -> bool:
+        if context.active_object:
+            return isinstance(context.active_object.data, bpy.types.Armature)
+        return False
+
+    def execute(self, context: bpy.types.Context):
+        try:
+            unknown = paste_pose(
+                context.active_object, context.window_manager.clipboard
+            )
+        except (ValueError, KeyError) as e:
+            self.report({"ERROR"}, f"clipboard is not {VRM_POSE}: {e}")
+            return {"CANCELLED"}
+        if unknown:
+            self.report({"WARNING"}, f"unknown humanBone: {', '.join(unknown)}")
+        self.report({"INFO"}, "paste pose from clipboard")
+        return {"FINISHED"}
@@ -0,0 +1,270 @@
+"""
+export many .blend files with a pool of headless blender workers.
+bpy free. run with the system python
+
+    python humanoid/batch_export.py --blender blender --out-dir out *.blend
+
+each worker runs cli.main of this add-on. results are appended to a
+JSON lines manifest as they complete.
+"""
+
+from typing import Iterable, List, NamedTuple, Optional
+import argparse
+import concurrent.futures
+import json
+import os
+import subprocess
+import sys
+import time
+
+# cli.EXIT_MAPPING_ERROR. the file is broken, a retry does not help
+EXIT_MAPPING_ERROR = 1
+GIB = 1024**3
+
+
+class Job(NamedTuple):
+    blend: str
+    out: str
+
+
+class Result(NamedTuple):
+    blend: str
+    out: str
+    status: str
+    returncode: Optional[int]
+    attempts: int
+    seconds: float
+    message: str
+
+
+def get_total_memory() -> Optional[int]:
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def get_workers(jobs: int, worker_memory: float) -> int:
+    """
+    bounded by cpu count and memory
+    """
+    workers = os.cpu_count() or 1
+    total = get_total_memory()
+    if total and worker_memory > 0:
+        workers = min(workers, max(1, int(total // (worker_memory * GIB))))
+    return max(1, min(workers, jobs))
+
+
+def make_expression() -> str:
+    """
+    import this add-on from its parent directory and run cli.main
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    parent = os.path.dirname(package_dir)
+    package = os.path.basename(package_dir)
+    return (
+        f"import sys; sys.path.insert(0, {parent!r}); "
+        f"import {package}.cli; sys.exit({package}.cli.main())"
+    )
+
+
+def make_command(blender: str, job: Job, cli_args: List[str]) -> List[str]:
+    return [
+        blender,
+        "-b",
+        "--factory-startup",
+        job.blend,
+        "--python-exit-code",
+        "2",
+        "--python-expr",
+        make_expression(),
+        "--",
+        "--out",
+        job.out,
+    ] + cli_args
+
+
+def run_job(
+    blender: str,
+    job: Job,
+    cli_args: List[str],
+    *,
+    retries: int = 2,
+    timeout: Optional[float] = None,
+) -> Result:
+    """
+    workers killed by a signal or timed out are retried.
+    other exit codes are deterministic and are not
+    """
+    start = time.perf_counter()
+    attempts = 0
+    returncode: Optional[int] = None
+    message = ""
+    while attempts <= retries:
+        attempts += 1
+        try:
+            p = subprocess.run(
+                make_command(blender, job, cli_args),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                timeout=timeout,
+            )
+        except subprocess.TimeoutExpired:
+            returncode = None
+            message = f"timeout: {timeout}s"
+            continue
+        except OSError as e:
+            return Result(
+                job.blend, job.out, "failed", None, attempts, 0, f"{blender}: {e}"
+            )
+        returncode = p.returncode
+        message = p.stderr.decode("utf-8", errors="replace").strip()[-1000:]
+        if returncode == 0:
+            return Result(
+                job.blend,
+                job.out,
+                "ok",
+                returncode,
+                attempts,
+                time.perf_counter() - start,
+                "",
+            )
+        if returncode == EXIT_MAPPING_ERROR:
+            return Result(
+                job.blend,
+                job.out,
+                "mapping_error",
+                returncode,
+                attempts,
+                time.perf_counter() - start,
+                message,
+            )
+        if returncode > 0:
+            # python exception or usage error
+            break
+    return Result(
+        job.blend,
+        job.out,
+        "failed",
+        returncode,
+        attempts,
+        time.perf_counter() - start,
+        message,
+    )
+
+
+def make_jobs(blends: Iterable[str], out_dir: str, ext: str) -> List[Job]:
+    """
+    the output keeps the path relative to the common directory of the blends,
+    so a/scene.blend and b/scene.blend do not overwrite each other
+    """
+    blends = list(blends)
+    if not blends:
+        return []
+    paths = [os.path.abspath(blend) for blend in blends]
+    root = os.path.commonpath([os.path.dirname(path) for path in paths])
+    jobs = []
+    outs = {}
+    for blend, path in zip(blends, paths):
+        stem = os.path.splitext(os.path.relpath(path, root))[0]
+        out = os.path.join(out_dir, stem + ext)
+        key = os.path.normcase(out)
+        if key in outs:
+            raise ValueError(f"same output {out}: {outs[key]}, {blend}")
+        outs[key] = blend
+        jobs.append(Job(blend, out))
+    return jobs
+
+
+def export_all(
+    blender: str,
+    jobs: List[Job],
+    manifest: str,
+    cli_args: List[str],
+    *,
+    workers: int,
+    retries: int = 2,
+    timeout: Optional[float] = None,
+) -> List[Result]:
+    """
+    each worker thread waits on a blender process
+    """
+    results = []
+    with open(manifest, "a", encoding="utf-8") as w:
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            futures = [
+                executor.submit(
+                    run_job, blender, job, cli_args, retries=retries, timeout=timeout
+                )
+                for job in jobs
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                result = future.result()
+                w.write(json.dumps(result._asdict()) + "\n")
+                w.flush()
+                results.append(result)
+                print(
+                    f"[{len(results)}/{len(jobs)}] {result.status}: {result.blend}"
+                    f" ({result.seconds:.1f}s)"
+                )
+    return results
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="export .blend files in parallel")
+    parser.add_argument("blends", nargs="*", help=".blend files")
+    parser.add_argument("--list", help="text file of .blend paths, one per line")
+    parser.add_argument("--blender", default="blender")
+    parser.add_argument("--out-dir", default=".")
+    parser.add_argument("--format", choices=["vrma", "json"], default="vrma")
+    parser.add_argument("--manifest", default="manifest.jsonl")
+    parser.add_argument("--workers", type=int, help="default is by cpu and memory")
+    parser.add_argument(
+        "--worker-memory", type=float, default=2, help="GiB per blender process"
+    )
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--timeout", type=float, help="seconds per attempt")
+    # passed to cli
+    parser.add_argument("--armature")
+    parser.add_argument("--frames")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = make_parser().parse_args(argv)
+    blends = list(args.blends)
+    if args.list:
+        with open(args.list, encoding="utf-8") as r:
+            blends += [line.strip() for line in r if line.strip()]
+    if not blends:
+        print("no .blend files", file=sys.stderr)
+        return 2
+
+    cli_args = ["--format", args.format]
+    if args.armature:
+        cli_args += ["--armature", args.armature]
+    if args.frames:
+        cli_args += ["--frames", args.frames]
+
+    try:
+        jobs = make_jobs(blends, args.out_dir, f".{args.format}")
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    for out_dir in {os.path.dirname(job.out) for job in jobs}:
+        os.makedirs(out_dir or ".", exist_ok=True)
+    workers = args.workers or get_workers(len(jobs), args.worker_memory)
+    results = export_all(
+        args.blender,
+        jobs,
+        args.manifest,
+        cli_args,
+        workers=workers,
+        retries=args.retries,
+        timeout=args.timeout,
+    )
+    return 0 if all(result.status == "ok" for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
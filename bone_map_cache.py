@@ -0,0 +1,220 @@
+"""
+on disk cache of humanoid bone mappings.
+the key is a hash of the bone names and parent links, so a re-imported rig resolves
+without guessing.
+"""
+
+from typing import Dict, Optional
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import bpy
+import bpy_extras.io_utils
+from .humanoid_properties import PROP_NAMES
+
+CACHE_FILE = "bone_map_cache.json"
+CACHE_SIZE = 256
+VERSION = 1
+
+
+def skeleton_key(armature: bpy.types.Armature) -> str:
+    lines = sorted(
+        f"{b.name}\t{b.parent.name if b.parent else ''}" for b in armature.bones
+    )
+    return hashlib.sha1("\n".join(lines).encode("utf-8")).hexdigest()
+
+
+def get_mapping(armature: bpy.types.Armature) -> Dict[str, str]:
+    humanoid = armature.humanoid
+    return {
+        prop: getattr(humanoid, prop) for prop in PROP_NAMES if getattr(humanoid, prop)
+    }
+
+
+class BoneMapCache:
+    """
+    skeleton key => prop => bone name. least recently used entries are dropped.
+    lookups only reorder in memory. the file is written on put and flush
+    """
+
+    def __init__(self, path: str, size: int = CACHE_SIZE) -> None:
+        self.path = path
+        self.size = size
+        self.entries: Optional[collections.OrderedDict] = None
+        # order or entries changed since the last save
+        self.dirty = False
+
+    def load(self) -> collections.OrderedDict:
+        if self.entries is None:
+            self.entries = collections.OrderedDict()
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, encoding="utf-8") as r:
+                        self.merge(json.load(r))
+                except (OSError, ValueError) as e:
+                    print(f"{self.path}: {e}")
+        return self.entries
+
+    def save(self):
+        entries = self.load()
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        # a unique temporary file per writer. other blender processes save too
+        fd, tmp = tempfile.mkstemp(
+            prefix=os.path.basename(self.path), suffix=".tmp", dir=directory
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as w:
+                json.dump({"version": VERSION, "entries": entries}, w)
+            os.replace(tmp, self.path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.dirty = False
+
+    def flush(self):
+        if self.dirty:
+            self.save()
+
+    def merge(self, data: dict) -> int:
+        """
+        later entries are newer
+        """
+        if data.get("version") != VERSION:
+            raise ValueError(f"unknown version: {data.get('version')}")
+        entries = self.load()
+        count = 0
+        for key, mapping in data["entries"].items():
+            entries[key] = {
+                prop: bone for prop, bone in mapping.items() if prop in PROP_NAMES
+            }
+            entries.move_to_end(key)
+            count += 1
+        while len(entries) > self.size:
+            entries.popitem(last=False)
+        return count
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        entries = self.load()
+        mapping = entries.get(key)
+        if mapping is not None and next(reversed(entries)) != key:
+            entries.move_to_end(key)
+            self.dirty = True
+        return mapping
+
+    def put(self, key: str, mapping: Dict[str, str], save: bool = True):
+        entries = self.load()
+        if entries.get(key) == mapping:
+            return
+        self.merge({"version": VERSION, "entries": {key: mapping}})
+        self.dirty = True
+        if save:
+            self.save()
+
+
+CACHE: Optional[BoneMapCache] = None
+
+
+def get_cache() -> BoneMapCache:
+    global CACHE
+    if not CACHE:
+        CACHE = BoneMapCache(
+            os.path.join(
+                bpy.utils.user_resource("CONFIG", path="humanoid", create=True),
+                CACHE_FILE,
+            )
+        )
+    return CACHE
+
+
+def lookup(armature: bpy.types.Armature) -> Optional[Dict[str, str]]:
+    """
+    cached mapping of this skeleton. only bones that exist
+    """
+    mapping = get_cache().get(skeleton_key(armature))
+    if mapping is None:
+        return None
+    return {prop: bone for prop, bone in mapping.items() if bone in armature.bones}
+
+
+def store(armature: bpy.types.Armature, save: bool = True):
+    """
+    the current mapping including user corrections
+    """
+    mapping = get_mapping(armature)
+    if mapping:
+        get_cache().put(skeleton_key(armature), mapping, save)
+
+
+@bpy.app.handlers.persistent
+def store_all(*_):
+    """
+    mappings of all armatures when the blend file is saved
+    """
+    try:
+        for armature in bpy.data.armatures:
+            store(armature, save=False)
+        get_cache().flush()
+    except OSError as e:
+        print(f"bone map cache: {e}")
+
+
+def flush():
+    """
+    write pending lookups. on unregister
+    """
+    if CACHE:
+        try:
+            CACHE.flush()
+        except OSError as e:
+            print(f"bone map cache: {e}")
+
+
+HANDLERS = [
+    (bpy.app.handlers.save_pre, store_all),
+]
+
+
+class ExportBoneMapCache(bpy.types.Operator, bpy_extras.io_utils.ExportHelper):
+    """Export cached humanoid bone mappings"""
+
+    bl_idname = "humanoid.export_bone_map_cache"
+    bl_label = "Export Bone Map Cache"
+    bl_options = {"REGISTER"}
+
+    filename_ext = ".json"
+    filter_glob: bpy.props.StringProperty(default="*.json", options={"HIDDEN"})
+
+    def execute(self, context: bpy.types.Context):
+        cache = get_cache()
+        entries = cache.load()
+        with open(self.filepath, "w", encoding="utf-8") as w:
+            json.dump({"version": VERSION, "entries": entries}, w, indent=2)
+        self.report({"INFO"}, f"export: {len(entries)} skeletons")
+        return {"FINISHED"}
+
+
+class ImportBoneMapCache(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
+    """Merge humanoid bone mappings into the cache"""
+
+    bl_idname = "humanoid.import_bone_map_cache"
+    bl_label = "Import Bone Map Cache"
+    bl_options = {"REGISTER"}
+
+    filename_ext = ".json"
+    filter_glob: bpy.props.StringProperty(default="*.json", options={"HIDDEN"})
+
+    def execute(self, context: bpy.types.Context):
+        cache = get_cache()
+        try:
+            with open(self.filepath, encoding="utf-8") as r:
+                count = cache.merge(json.load(r))
+        except (OSError, ValueError, KeyError) as e:
+            self.report({"ERROR"}, f"{self.filepath}: {e}")
+            return {"CANCELLED"}
+        cache.save()
+        self.report({"INFO"}, f"import: {count} skeletons")
+        return {"FINISHED"}
@@ -0,0 +1,226 @@
+"""
+headless entry point. no window manager or clipboard is used.
+
+    blender -b file.blend --python-expr "import sys, humanoid.cli; sys.exit(humanoid.cli.main())" -- --armature Armature --frames 1-500 --out clip.vrma
+
+the output is .vrma for a frame range or UNIVRM_pose json (.json) for a frame.
+`--out -` writes to stdout. it needs `blender -b -q`, the startup banner goes
+to stdout otherwise. messages go to stderr.
+"""
+
+from typing import List, Optional, Sequence, Tuple
+import argparse
+import contextlib
+import os
+import sys
+import bpy
+from .humanoid_properties import PROP_NAMES
+from .copy_humanoid_pose import Builder
+from .export_vrma import AnimationBaker
+
+# required by VRM-1.0
+REQUIRED_PROPS = [
+    "hips",
+    "spine",
+    "head",
+    "left_upper_arm",
+    "left_lower_arm",
+    "left_hand",
+    "right_upper_arm",
+    "right_lower_arm",
+    "right_hand",
+    "left_upper_leg",
+    "left_lower_leg",
+    "left_foot",
+    "right_upper_leg",
+    "right_lower_leg",
+    "right_foot",
+]
+
+EXIT_MAPPING_ERROR = 1
+
+
+def parse_frames(value: str) -> Tuple[int, int]:
+    """
+    10 or 1-500
+    """
+    start, _, end = value.partition("-")
+    try:
+        return int(start), int(end or start)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a frame range: {value}")
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="humanoid.cli", description="export humanoid pose or animation"
+    )
+    parser.add_argument("--armature", help="object name. default is the first armature")
+    parser.add_argument(
+        "--frames",
+        type=parse_frames,
+        help="start-end for .vrma, a frame for .json. default is the scene",
+    )
+    parser.add_argument("--step", type=int, default=1)
+    parser.add_argument("--out", required=True, help=".vrma, .json or - for stdout")
+    parser.add_argument(
+        "--format", choices=["vrma", "json"], help="default is by --out extension"
+    )
+    parser.add_argument(
+        "--no-guess", action="store_true", help="do not guess unassigned bones"
+    )
+    return parser
+
+
+def get_argv(argv: Optional[Sequence[str]] = None) -> List[str]:
+    """
+    arguments after -- are for the script
+    """
+    if argv is not None:
+        return list(argv)
+    if "--" in sys.argv:
+        return sys.argv[sys.argv.index("--") + 1 :]
+    return []
+
+
+def is_quiet() -> bool:
+    """
+    blender -q. no startup banner on stdout
+    """
+    argv = sys.argv[: sys.argv.index("--")] if "--" in sys.argv else sys.argv
+    return "-q" in argv or "--quiet" in argv
+
+
+@contextlib.contextmanager
+def stdout_to_stderr():
+    """
+    blender and operators print to stdout. keep it for the data of `--out -`
+    """
+    sys.stdout.flush()
+    saved = os.dup(1)
+    os.dup2(2, 1)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(saved)
+
+
+def find_armature(name: Optional[str]) -> Optional[bpy.types.Object]:
+    if name:
+        obj = bpy.data.objects.get(name)
+        if obj and isinstance(obj.data, bpy.types.Armature):
+            return obj
+        return None
+    for obj in bpy.context.scene.objects:
+        if isinstance(obj.data, bpy.types.Armature):
+            return obj
+    return None
+
+
+def ensure_registered():
+    if not hasattr(bpy.types.Armature, "humanoid"):
+        from . import register
+
+        register()
+
+
+def check_mapping(obj: bpy.types.Object) -> List[str]:
+    """
+    required props that are not assigned and any prop that points to a
+    missing bone
+    """
+    armature = obj.data
+    humanoid = armature.humanoid
+    errors = []
+    for prop in PROP_NAMES:
+        bone = getattr(humanoid, prop)
+        if not bone:
+            if prop in REQUIRED_PROPS:
+                errors.append(f"{prop}: not assigned")
+        elif bone not in armature.bones:
+            errors.append(f"{prop}: {bone} not found")
+    return errors
+
+
+def write(out: str, data: bytes):
+    if out == "-":
+        sys.stdout.buffer.write(data)
+        sys.stdout.flush()
+    else:
+        with open(out, "wb") as w:
+            w.write(data)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = make_parser()
+    args = parser.parse_args(get_argv(argv))
+
+    output_format = args.format
+    if not output_format:
+        is_json = args.out == "-" or args.out.endswith(".json")
+        output_format = "json" if is_json else "vrma"
+
+    if args.out == "-" and not is_quiet():
+        parser.error("--out - needs blender -q")
+    # stdout is for the data only
+    redirect = stdout_to_stderr() if args.out == "-" else contextlib.nullcontext()
+    with redirect:
+        data = export(parser, args, output_format)
+    if data is None:
+        return EXIT_MAPPING_ERROR
+    write(args.out, data)
+    if args.out != "-":
+        print(f"export: {args.out}", file=sys.stderr)
+    return 0
+
+
+def export(
+    parser: argparse.ArgumentParser, args: argparse.Namespace, output_format: str
+) -> Optional[bytes]:
+    """
+    None on mapping errors
+    """
+    ensure_registered()
+    obj = find_armature(args.armature)
+    if not obj:
+        print(f"armature not found: {args.armature or '(any)'}", file=sys.stderr)
+        return None
+
+    scene = bpy.context.scene
+    bpy.context.view_layer.objects.active = obj
+    humanoid = obj.data.humanoid
+    if not args.no_guess and not all(getattr(humanoid, prop) for prop in PROP_NAMES):
+        # parallel workers would write the same cache file
+        bpy.ops.humanoid.guess_bones(clear=False, use_cache=False)
+
+    errors = check_mapping(obj)
+    if errors:
+        for error in errors:
+            print(f"{obj.name}: {error}", file=sys.stderr)
+        return None
+
+    if output_format == "json":
+        start, end = args.frames or (scene.frame_current, scene.frame_current)
+        if start != end:
+            parser.error("json is a single frame pose")
+        current = scene.frame_current
+        scene.frame_set(start)
+        try:
+            builder = Builder(obj, 1)
+            builder.get_tpose()
+            builder.get_current_pose(bpy.context.evaluated_depsgraph_get())
+        finally:
+            scene.frame_set(current)
+        return builder.to_json().encode("utf-8")
+
+    start, end = args.frames or (scene.frame_start, scene.frame_end)
+    baker = AnimationBaker(obj)
+    try:
+        baker.bake(scene, start, end, args.step)
+    except ValueError as e:
+        # empty frame range or step
+        parser.error(str(e))
+    return baker.to_glb()
+
@@ -0,0 +1,198 @@
+"""
+target bone => constraints that reference it.
+built once per armature object, so the panel does not scan every constraint
+on redraw. after an update of the object the index is rebuilt only if the
+bone names, constraint names or targets changed.
+posing does not rebuild it. interactive posing does not even compare them,
+the comparison waits for a finished operator or a property edit in the UI.
+"""
+
+from typing import Dict, List, NamedTuple, Set, Tuple
+import bpy
+
+# constraint attributes that hold a bone name
+TARGET_ATTRIBUTES = ("subtarget", "pole_subtarget")
+
+
+class ConstraintRef(NamedTuple):
+    # owner pose bone
+    bone: str
+    constraint: str
+    attribute: str
+
+
+Epoch = Tuple[int, int, int]
+
+
+class Entry(NamedTuple):
+    epoch: Epoch
+    signature: int
+    index: Dict[str, List[ConstraintRef]]
+
+
+# object pointer => entry
+_CACHE: Dict[int, Entry] = {}
+# objects updated since the signature was compared
+_UPDATED: Set[int] = set()
+# property edits of names and targets in the UI
+_edits = 0
+# msgbus owner
+_OWNER = object()
+
+
+def get_signature(obj: bpy.types.Object) -> int:
+    """
+    changes when constraints are added, removed, renamed or retargeted and
+    when bones are renamed. cheaper than build_index
+    """
+    return hash(
+        tuple(
+            (
+                b.name,
+                tuple(
+                    (
+                        c.name,
+                        getattr(c, "subtarget", None),
+                        getattr(c, "pole_subtarget", None),
+                        tuple(t.subtarget for t in getattr(c, "targets", ())),
+                    )
+                    for c in b.constraints
+                ),
+            )
+            for b in obj.pose.bones
+        )
+    )
+
+
+def get_epoch() -> Epoch:
+    """
+    the last finished operator and the count of UI edits.
+    constant during a modal transform
+    """
+    operators = bpy.context.window_manager.operators
+    last = operators[-1].as_pointer() if len(operators) else 0
+    return (last, len(operators), _edits)
+
+
+def build_index(obj: bpy.types.Object) -> Dict[str, List[ConstraintRef]]:
+    index: Dict[str, List[ConstraintRef]] = {}
+    for b in obj.pose.bones:
+        for c in b.constraints:
+            for k in TARGET_ATTRIBUTES:
+                target = getattr(c, k, None)
+                if target:
+                    index.setdefault(target, []).append(
+                        ConstraintRef(b.name, c.name, k)
+                    )
+            # ARMATURE constraint
+            for i, t in enumerate(getattr(c, "targets", ())):
+                if getattr(t, "subtarget", None):
+                    index.setdefault(t.subtarget, []).append(
+                        ConstraintRef(b.name, c.name, f"targets[{i}].subtarget")
+                    )
+    return index
+
+
+def get_constraint_index(obj: bpy.types.Object) -> Dict[str, List[ConstraintRef]]:
+    """
+    for scripts. rig audit, etc
+    """
+    key = obj.as_pointer()
+    entry = _CACHE.get(key)
+    if entry is None:
+        entry = Entry(get_epoch(), get_signature(obj), build_index(obj))
+        _CACHE[key] = entry
+    elif key in _UPDATED:
+        epoch = get_epoch()
+        if epoch != entry.epoch:
+            # keep the mark until the epoch changes. that is after posing
+            _UPDATED.discard(key)
+            signature = get_signature(obj)
+            if signature != entry.signature:
+                entry = Entry(epoch, signature, build_index(obj))
+            else:
+                entry = entry._replace(epoch=epoch)
+            _CACHE[key] = entry
+    return entry.index
+
+
+def find_references(obj: bpy.types.Object, bone_name: str) -> List[ConstraintRef]:
+    return get_constraint_index(obj).get(bone_name, [])
+
+
+def invalidate(obj: bpy.types.Object):
+    key = obj.as_pointer()
+    _CACHE.pop(key, None)
+    _UPDATED.discard(key)
+
+
+@bpy.app.handlers.persistent
+def on_depsgraph_update(scene, depsgraph: bpy.types.Depsgraph):
+    if not _CACHE:
+        return
+    for update in depsgraph.updates:
+        obj = update.id
+        if not isinstance(obj, bpy.types.Object) or obj.type != "ARMATURE":
+            continue
+        # moving the object only does not change constraints
+        if update.is_updated_transform and not update.is_updated_geometry:
+            continue
+        # posing is a geometry update too. compare the signature on the next use
+        key = obj.original.as_pointer()
+        if key in _CACHE:
+            _UPDATED.add(key)
+
+
+@bpy.app.handlers.persistent
+def clear_cache(*_):
+    _CACHE.clear()
+    _UPDATED.clear()
+
+
+def on_edit(*_):
+    global _edits
+    _edits += 1
+
+
+def get_edit_keys() -> List[tuple]:
+    """
+    names and target properties of constraints and bones
+    """
+    keys: List[tuple] = [
+        (bpy.types.Bone, "name"),
+        (bpy.types.Constraint, "name"),
+        (bpy.types.ConstraintTarget, "subtarget"),
+    ]
+    for name in dir(bpy.types):
+        # IKConstraint, CopyRotationConstraint ...
+        cls = getattr(bpy.types, name)
+        if not name.endswith("Constraint") or cls is bpy.types.Constraint:
+            continue
+        for k in TARGET_ATTRIBUTES:
+            if k in cls.bl_rna.properties:
+                keys.append((cls, k))
+    return keys
+
+
+def subscribe():
+    for key in get_edit_keys():
+        bpy.msgbus.subscribe_rna(key=key, owner=_OWNER, args=(), notify=on_edit)
+
+
+def unsubscribe():
+    bpy.msgbus.clear_by_owner(_OWNER)
+
+
+@bpy.app.handlers.persistent
+def on_load_post(*_):
+    # loading a file clears the subscriptions
+    clear_cache()
+    subscribe()
+
+
+HANDLERS = [
+    (bpy.app.handlers.depsgraph_update_post, on_depsgraph_update),
+    (bpy.app.handlers.undo_post, clear_cache),
+    (bpy.app.handlers.redo_post, clear_cache),
+    (bpy.app.handlers.load_post, on_load_post),
+]
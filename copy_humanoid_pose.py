@@ -1,147 +1,176 @@
-from typing import Optional
+from typing import Optional, Tuple, Dict, List
 import bpy
+import copy
 import json
+import numpy
 from . import humanoid_properties
-from .humanoid_utils import enter_pose
+from .core import pose_math
+from .core import vrma
+from .core.vrma import VRM_ANIMATION
+from .humanoid_utils import get_evaluated
 
-VRM_ANIMATION = "VRMC_vrm_animation"
-VRM_POSE = "UNIVRM_pose"
+# armature pointer => (fingerprint, nodes, humanBones)
+_TPOSE_CACHE: Dict[int, Tuple[tuple, List[dict], dict]] = {}
+
+
+def get_tpose_fingerprint(
+    armature: bpy.types.Armature, tree: humanoid_properties.HumanTree
+) -> tuple:
+    """
+    rest matrices and humanoid mapping. cheap compared to traversal
+    """
+    values = numpy.empty(len(armature.bones) * 16, dtype=numpy.float32)
+    armature.bones.foreach_get("matrix_local", values)
+    return (
+        hash(values.tobytes()),
+        tuple(tree.index.bone_from_prop.items()),
+    )
 
 
 class Builder:
+    """
+    UNIVRM_pose document of obj. bpy adapter over core.vrma
+    """
+
     def __init__(self, obj: bpy.types.Object, to_meter: float) -> None:
         self.obj = obj
         self.tree = humanoid_properties.HumanTree(obj.data)
         self.to_meter = to_meter
+        self._sampler: Optional[PoseSampler] = None
+        self.gltf = vrma.new_pose_gltf()
 
-        self.gltf = {
-            "scene": 0,
-            "scenes": [{"nodes": [0]}],
-            "nodes": [
-                {
-                    "name": "__zup__",
-                    "rotation": [-0.7071, 0, 0, 0.7071],
-                }
-            ],
-            "asset": {"version": "2.0"},
-            "extensionsUsed": [VRM_ANIMATION, VRM_POSE],
-            "extensions": {
-                VRM_ANIMATION: {
-                    "humanoid": {
-                        "humanBones": {},
-                    },
-                    "specVersion": "1.0",
-                    "extras": {
-                        VRM_POSE: {
-                            "humanoid": {
-                                "translation": [0, 0, 0],
-                                "rotations": {},
-                            },
-                            "expressions": {
-                                "preset": {
-                                    "happy": 1,
-                                    "Aa": 1,
-                                }
-                            },
-                            "lookAt": {
-                                "position": [4, 5, 6],
-                            },
-                        },
-                    },
-                },
-            },
-        }
-
-    def add_gltf_node(self, gltf_parent: Optional[dict], gltf_node: dict) -> int:
-        index = len(self.gltf["nodes"])
-        if not gltf_parent:
-            # root
-            gltf_parent = self.gltf["nodes"][0]
-        if "children" not in gltf_parent:
-            gltf_parent["children"] = []
-        gltf_parent["children"].append(index)
-        self.gltf["nodes"].append(gltf_node)
-        return index
-
-    def _traverse_tpose(
-        self,
-        b: bpy.types.Bone,
-        parent: Optional[bpy.types.Bone],
-        gltf_parent,
-        *,
-        indent: str,
-    ):
-        m = b.matrix_local
-        if parent:
-            m = parent.matrix_local.inverted() @ m
-        t, r, s = m.decompose()
-        print(f"{indent}{b}: {t} {r}")
-        gltf_node = {
-            "name": b.name,
-            "translation": [
-                t.x * self.to_meter,
-                t.y * self.to_meter,
-                t.z * self.to_meter,
-            ],
-            "rotation": [r.x, r.y, r.z, r.w],
-        }
-        index = self.add_gltf_node(gltf_parent, gltf_node)
-        bone_name = self.tree.vrm_from_name(b.name)
-        if bone_name:
-            # bone node mapping
-            self.gltf["extensions"][VRM_ANIMATION]["humanoid"]["humanBones"][
-                bone_name
-            ] = {"node": index}
-
-        for child_name in self.tree.child_bone_names_from_name(b.name):
-            child = self.obj.data.bones[child_name]
-            self._traverse_tpose(child, b, gltf_node, indent=indent + "  ")
-
-        return gltf_node
+    @property
+    def sampler(self) -> "PoseSampler":
+        # not needed when the tpose is cached and no pose is read
+        if not self._sampler:
+            self._sampler = PoseSampler(self.obj, self.to_meter)
+        return self._sampler
 
     def get_tpose(self):
-        hips_name = self.tree.bonename_from_prop("hips")
-        hips = self.obj.data.bones[hips_name]
-        self._traverse_tpose(hips, None, None, indent="")
-
-    def _traverse_current_pose(
-        self, b: bpy.types.PoseBone, parent: Optional[bpy.types.PoseBone]
-    ):
-        human_bone = self.tree.vrm_from_name(b.name)
-        assert human_bone
-
-        m = b.matrix
-        if parent:
-            m = parent.matrix.inverted() @ m
-        else:
-            pass
-        t, r, s = m.decompose()
-
-        vrm_pose = self.gltf["extensions"][VRM_ANIMATION]["extras"][VRM_POSE][
-            "humanoid"
-        ]
-        vrm_pose["rotations"][human_bone] = [r.x, r.y, r.z, r.w]
-        if human_bone == "hips":
-            vrm_pose["translation"] = [
-                t.x * self.to_meter,
-                t.y * self.to_meter,
-                t.z * self.to_meter,
-            ]
-
-        for child_name in self.tree.child_bone_names_from_name(b.name):
-            child = self.obj.pose.bones[child_name]
-            self._traverse_current_pose(child, b)
-
-    def get_current_pose(self):
-        with enter_pose(self.obj):
-            hips_name = self.tree.bonename_from_prop("hips")
-            hips = self.obj.pose.bones[hips_name]
-            self._traverse_current_pose(hips, None)
+        armature = self.obj.data
+        key = armature.as_pointer()
+        fingerprint = (self.to_meter, get_tpose_fingerprint(armature, self.tree))
+        cached = _TPOSE_CACHE.get(key)
+        if cached and cached[0] == fingerprint:
+            # rest pose not changed
+            _, nodes, human_bones = cached
+            self.gltf["nodes"] = copy.deepcopy(nodes)
+            self.gltf["extensions"][VRM_ANIMATION]["humanoid"]["humanBones"] = (
+                copy.deepcopy(human_bones)
+            )
+            return
+
+        vrma.add_tpose(
+            self.gltf,
+            self.sampler.bone_names,
+            self.sampler.vrm_names,
+            self.sampler.parent_indices,
+            self.sampler.rest_matrices,
+            self.to_meter,
+        )
+        _TPOSE_CACHE[key] = (
+            fingerprint,
+            copy.deepcopy(self.gltf["nodes"]),
+            copy.deepcopy(self.human_bones),
+        )
+
+    @property
+    def human_bones(self) -> dict:
+        return vrma.get_human_bones(self.gltf)
+
+    @property
+    def vrm_pose(self) -> dict:
+        return vrma.get_pose(self.gltf)
+
+    def get_current_pose(self, depsgraph: Optional[bpy.types.Depsgraph] = None):
+        vrma.set_pose(
+            self.gltf,
+            self.sampler.vrm_names,
+            self.sampler.parent_indices,
+            self.sampler.read_matrices(depsgraph),
+            self.to_meter,
+        )
 
     def to_json(self) -> str:
         return json.dumps(self.gltf, indent=2)
 
 
+class PoseSampler:
+    """
+    humanoid bone matrices of obj as numpy arrays.
+    all pose bone matrices are read by one foreach_get.
+    """
+
+    def __init__(self, obj: bpy.types.Object, to_meter: float) -> None:
+        self.obj = obj
+        self.to_meter = to_meter
+        tree = humanoid_properties.HumanTree(obj.data)
+        self.bone_names, self.vrm_names, self.parent_indices = tree.index.flatten()
+
+        self.pose_indices = pose_math.bone_indices(
+            obj.pose.bones.keys(), self.bone_names
+        )
+        self.buffer = numpy.empty(len(obj.pose.bones) * 16, dtype=numpy.float32)
+        self._rest_matrices: Optional[numpy.ndarray] = None
+        self._rest_rotations: Optional[numpy.ndarray] = None
+
+    @property
+    def rest_matrices(self) -> numpy.ndarray:
+        """
+        rest pose in armature space. read on first use
+        """
+        if self._rest_matrices is None:
+            armature = self.obj.data
+            rest = numpy.empty(len(armature.bones) * 16, dtype=numpy.float32)
+            armature.bones.foreach_get("matrix_local", rest)
+            self._rest_matrices = pose_math.select_matrices(
+                rest, pose_math.bone_indices(armature.bones.keys(), self.bone_names)
+            )
+        return self._rest_matrices
+
+    @property
+    def rest_rotations(self) -> numpy.ndarray:
+        if self._rest_rotations is None:
+            self._rest_rotations = pose_math.normalized_mat3(self.rest_matrices)
+        return self._rest_rotations
+
+    def read_matrices(
+        self, depsgraph: Optional[bpy.types.Depsgraph] = None
+    ) -> numpy.ndarray:
+        """
+        (len(bone_names), 4, 4) evaluated pose matrices in armature space
+        """
+        pose = get_evaluated(self.obj, depsgraph).pose
+        pose.bones.foreach_get("matrix", self.buffer)
+        return pose_math.select_matrices(self.buffer, self.pose_indices)
+
+    def sample(
+        self, depsgraph: Optional[bpy.types.Depsgraph] = None
+    ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        returns hips translation (3,) and rotations (len(vrm_names), 4)
+        """
+        matrices = self.read_matrices(depsgraph)
+        local = pose_math.relative_matrices(matrices, self.parent_indices)
+        t, r, _ = pose_math.decompose(local)
+        return t[0] * self.to_meter, r
+
+    def sample_normalized(
+        self, depsgraph: Optional[bpy.types.Depsgraph] = None
+    ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        returns hips translation (3,) and VRM normalized rotations
+        (len(vrm_names), 4). both in armature space axes
+        """
+        matrices = self.read_matrices(depsgraph)
+        rotations = pose_math.normalized_local_rotations(
+            pose_math.normalized_mat3(matrices),
+            self.rest_rotations,
+            self.parent_indices,
+        )
+        return matrices[0, :3, 3] * self.to_meter, rotations
+
+
 class CopyHumanoidPose(bpy.types.Operator):
     bl_idname = "humanoid.copy_pose"
     bl_label = "Copy Pose To Clipboard"
@@ -158,7 +187,7 @@ class CopyHumanoidPose(bpy.types.Operator):
         builder = Builder(o, 1)
 
         builder.get_tpose()
-        builder.get_current_pose()
+        builder.get_current_pose(context.evaluated_depsgraph_get())
 
         # to clip board
         text = builder.to_json()
@@ -0,0 +1,12 @@
+"""
+bpy free part of the humanoid addon. numpy only.
+
+- skeleton: humanoid bone tree and VRM humanBone names
+- pose_math: batched matrix and quaternion math
+- gltf: glb reader and writer
+- vrma: VRMC_vrm_animation and UNIVRM_pose documents
+- bone_names: naming profiles and the token index for bone guessing
+- topology: bone guessing from the hierarchy and head positions
+- humanoid_layout: bone layout of the default humanoid and crowd proportions
+- rig_spec: declarative rig parts and the plan of an incremental rebuild
+"""
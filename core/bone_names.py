@@ -0,0 +1,461 @@
+"""
+bone name matching. naming profiles and a token index for unknown conventions
+"""
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import re
+from .skeleton import PROP_NAMES
+
+
+# naming profiles. "{side}" in a bone name is replaced by sides[0] or sides[1]
+# for left_ and right_ props
+BUILTIN_PROFILES = [
+    {
+        "name": "mixamo",
+        "strip": r"^mixamorig\d*:",
+        "sides": ["Left", "Right"],
+        "bones": {
+            "hips": "Hips",
+            "spine": "Spine",
+            "chest": "Spine1",
+            "neck": "Neck",
+            "head": "Head",
+            "shoulder": "{side}Shoulder",
+            "upper_arm": "{side}Arm",
+            "lower_arm": "{side}ForeArm",
+            "hand": "{side}Hand",
+            "upper_leg": "{side}UpLeg",
+            "lower_leg": "{side}Leg",
+            "foot": "{side}Foot",
+            "toes": "{side}ToeBase",
+            "thumb_metacarpal": "{side}HandThumb1",
+            "thumb_proximal": "{side}HandThumb2",
+            "thumb_distal": "{side}HandThumb3",
+            "index_proximal": "{side}HandIndex1",
+            "index_intermediate": "{side}HandIndex2",
+            "index_distal": "{side}HandIndex3",
+            "middle_proximal": "{side}HandMiddle1",
+            "middle_intermediate": "{side}HandMiddle2",
+            "middle_distal": "{side}HandMiddle3",
+            "ring_proximal": "{side}HandRing1",
+            "ring_intermediate": "{side}HandRing2",
+            "ring_distal": "{side}HandRing3",
+            "little_proximal": "{side}HandPinky1",
+            "little_intermediate": "{side}HandPinky2",
+            "little_distal": "{side}HandPinky3",
+        },
+    },
+    {
+        "name": "unreal",
+        "sides": ["l", "r"],
+        "bones": {
+            "hips": "pelvis",
+            "spine": "spine_01",
+            "chest": "spine_03",
+            "neck": "neck_01",
+            "head": "head",
+            "shoulder": "clavicle_{side}",
+            "upper_arm": "upperarm_{side}",
+            "lower_arm": "lowerarm_{side}",
+            "hand": "hand_{side}",
+            "upper_leg": "thigh_{side}",
+            "lower_leg": "calf_{side}",
+            "foot": "foot_{side}",
+            "toes": "ball_{side}",
+            "thumb_metacarpal": "thumb_01_{side}",
+            "thumb_proximal": "thumb_02_{side}",
+            "thumb_distal": "thumb_03_{side}",
+            "index_proximal": "index_01_{side}",
+            "index_intermediate": "index_02_{side}",
+            "index_distal": "index_03_{side}",
+            "middle_proximal": "middle_01_{side}",
+            "middle_intermediate": "middle_02_{side}",
+            "middle_distal": "middle_03_{side}",
+            "ring_proximal": "ring_01_{side}",
+            "ring_intermediate": "ring_02_{side}",
+            "ring_distal": "ring_03_{side}",
+            "little_proximal": "pinky_01_{side}",
+            "little_intermediate": "pinky_02_{side}",
+            "little_distal": "pinky_03_{side}",
+        },
+        # twist and ik bones
+        "ignore": r"(twist|^ik_|_metacarpal_|^root$)",
+    },
+    {
+        "name": "unity",
+        "sides": ["Left", "Right"],
+        "bones": {
+            "hips": "Hips",
+            "spine": "Spine",
+            "chest": "Chest",
+            "neck": "Neck",
+            "head": "Head",
+            "shoulder": "{side}Shoulder",
+            "upper_arm": "{side}UpperArm",
+            "lower_arm": "{side}LowerArm",
+            "hand": "{side}Hand",
+            "upper_leg": "{side}UpperLeg",
+            "lower_leg": "{side}LowerLeg",
+            "foot": "{side}Foot",
+            "toes": "{side}Toes",
+            "thumb_metacarpal": "{side}ThumbProximal",
+            "thumb_proximal": "{side}ThumbIntermediate",
+            "thumb_distal": "{side}ThumbDistal",
+            "index_proximal": "{side}IndexProximal",
+            "index_intermediate": "{side}IndexIntermediate",
+            "index_distal": "{side}IndexDistal",
+            "middle_proximal": "{side}MiddleProximal",
+            "middle_intermediate": "{side}MiddleIntermediate",
+            "middle_distal": "{side}MiddleDistal",
+            "ring_proximal": "{side}RingProximal",
+            "ring_intermediate": "{side}RingIntermediate",
+            "ring_distal": "{side}RingDistal",
+            "little_proximal": "{side}LittleProximal",
+            "little_intermediate": "{side}LittleIntermediate",
+            "little_distal": "{side}LittleDistal",
+        },
+        "ignore": r"(UpperChest|Jaw|Eye)$",
+    },
+    {
+        "name": "character_creator",
+        "strip": r"^(CC_Base_|RL_)",
+        "sides": ["L_", "R_"],
+        "bones": {
+            "hips": "Hip",
+            "spine": "Waist",
+            "chest": "Spine01",
+            "neck": "NeckTwist01",
+            "head": "Head",
+            "shoulder": "{side}Clavicle",
+            "upper_arm": "{side}Upperarm",
+            "lower_arm": "{side}Forearm",
+            "hand": "{side}Hand",
+            "upper_leg": "{side}Thigh",
+            "lower_leg": "{side}Calf",
+            "foot": "{side}Foot",
+            "toes": "{side}ToeBase",
+            "thumb_metacarpal": "{side}Thumb1",
+            "thumb_proximal": "{side}Thumb2",
+            "thumb_distal": "{side}Thumb3",
+            "index_proximal": "{side}Index1",
+            "index_intermediate": "{side}Index2",
+            "index_distal": "{side}Index3",
+            "middle_proximal": "{side}Mid1",
+            "middle_intermediate": "{side}Mid2",
+            "middle_distal": "{side}Mid3",
+            "ring_proximal": "{side}Ring1",
+            "ring_intermediate": "{side}Ring2",
+            "ring_distal": "{side}Ring3",
+            "little_proximal": "{side}Pinky1",
+            "little_intermediate": "{side}Pinky2",
+            "little_distal": "{side}Pinky3",
+        },
+    },
+]
+
+
+def normalize_name(name: str) -> str:
+    """
+    Left Upper Arm, left_upper_arm and LeftUpperArm are same
+    """
+    return re.sub(r"[^0-9a-z]", "", name.lower())
+
+
+class NamingProfile:
+    """
+    bone naming convention compiled to an exact lookup dict and regexes
+    """
+
+    def __init__(self, data: dict) -> None:
+        self.name: str = data["name"]
+        self.strip = re.compile(data["strip"]) if data.get("strip") else None
+        self.ignore = re.compile(data["ignore"]) if data.get("ignore") else None
+        left, right = data.get("sides", ["Left", "Right"])
+        # normalized bone name => prop
+        self.exact: Dict[str, str] = {}
+        for key, bone in data.get("bones", {}).items():
+            if f"left_{key}" in PROP_NAMES:
+                self.exact[normalize_name(bone.format(side=left))] = f"left_{key}"
+                self.exact[normalize_name(bone.format(side=right))] = f"right_{key}"
+            elif key in PROP_NAMES:
+                self.exact[normalize_name(bone)] = key
+            else:
+                raise ValueError(f"{self.name}: unknown prop {key}")
+        # regex => prop. for names that are not fixed
+        self.patterns: List[Tuple[re.Pattern, str]] = []
+        for key, pattern in data.get("patterns", {}).items():
+            if f"left_{key}" in PROP_NAMES:
+                self.patterns.append(
+                    (re.compile(pattern.format(side=left)), f"left_{key}")
+                )
+                self.patterns.append(
+                    (re.compile(pattern.format(side=right)), f"right_{key}")
+                )
+            elif key in PROP_NAMES:
+                self.patterns.append((re.compile(pattern), key))
+            else:
+                raise ValueError(f"{self.name}: unknown prop {key}")
+
+    def get_prop(self, bone_name: str) -> Optional[str]:
+        name = self.strip.sub("", bone_name) if self.strip else bone_name
+        prop = self.exact.get(normalize_name(name))
+        if prop:
+            return prop
+        for pattern, prop in self.patterns:
+            if pattern.search(name):
+                return prop
+
+    def score(self, bone_names: List[str]) -> float:
+        """
+        ratio of names that this profile knows
+        """
+        if not bone_names:
+            return 0
+        hit = 0
+        for name in bone_names:
+            if self.get_prop(name):
+                hit += 1
+            elif self.ignore and self.ignore.search(name):
+                hit += 1
+            elif self.strip and self.strip.search(name):
+                hit += 1
+        return hit / len(bone_names)
+
+    def map_bones(self, bone_names: Iterable[str]) -> Dict[str, str]:
+        """
+        prop => bone name in one pass. first bone wins
+        """
+        result = {}
+        for name in bone_names:
+            prop = self.get_prop(name)
+            if prop and prop not in result:
+                result[prop] = name
+        return result
+
+
+# a profile must know this ratio of the sampled names.
+# a few generic names like "head" match every profile
+MIN_PROFILE_SCORE = 0.5
+
+
+def select_profile(
+    profiles: Iterable[NamingProfile],
+    bone_names: List[str],
+    sample: int = 16,
+    min_score: float = MIN_PROFILE_SCORE,
+) -> Optional[NamingProfile]:
+    """
+    the profile that knows most of the sampled names
+    """
+    if not bone_names:
+        return None
+    step = max(1, len(bone_names) // sample)
+    names = bone_names[::step]
+    best = None
+    best_score = 0.0
+    for profile in profiles:
+        score = profile.score(names)
+        if score > best_score:
+            best = profile
+            best_score = score
+    return best if best_score >= min_score else None
+
+
+# body part => token patterns. earlier pattern wins
+BODY_PATTERNS: Dict[str, List[Tuple[str, ...]]] = {
+    "hips": [("hips",), ("hip",), ("pelvis",)],
+    "spine": [("spine",)],
+    # next spine if no chest
+    "chest": [("chest",), ("upperchest",), ("spine",)],
+    "neck": [("neck",)],
+    "head": [("head",)],
+    "shoulder": [("shoulder",), ("clavicle",), ("clav",), ("collar",)],
+    "upper_arm": [("upperarm",), ("arm",)],
+    "lower_arm": [("lowerarm",), ("forearm",), ("elbow",)],
+    "hand": [("hand",), ("wrist",)],
+    "upper_leg": [("upperleg",), ("upleg",), ("thigh",)],
+    "lower_leg": [("lowerleg",), ("calf",), ("shin",), ("knee",), ("leg",)],
+    "foot": [("foot",), ("ankle",)],
+    "toes": [("toes",), ("toe",), ("toebase",), ("ball",)],
+}
+
+FINGER_TOKENS = {
+    "thumb": ("thumb",),
+    "index": ("index", "pointer"),
+    "middle": ("middle",),
+    "ring": ("ring",),
+    "little": ("little", "pinky", "pinkie"),
+}
+
+# segment words => order in a finger
+SEGMENT_ORDER = {
+    "metacarpal": 0,
+    "proximal": 1,
+    "intermediate": 2,
+    "medial": 2,
+    "distal": 3,
+}
+
+LEFT_TOKENS = {"l", "left", "lft"}
+RIGHT_TOKENS = {"r", "right", "rgt", "rt"}
+
+# rig helpers. never better than a plain bone
+HELPER_TOKENS = {
+    "twist",
+    "roll",
+    "helper",
+    "mch",
+    "org",
+    "ctrl",
+    "ctl",
+    "ik",
+    "fk",
+    "pole",
+    "target",
+    "end",
+    "nub",
+    "tip",
+    "top",
+    "corrective",
+    "offset",
+    "bend",
+    "spread",
+    "socket",
+    "tweak",
+    "pivot",
+}
+
+
+def tokenize(name: str) -> List[str]:
+    """
+    mixamorig:LeftUpLeg => [mixamorig, left, up, leg]
+    upperarm_twist_01_l => [upperarm, twist, 01, l]
+    """
+    name = re.sub(r"([a-z])([A-Z])", r"\1 \2", name)
+    name = re.sub(r"([A-Z]+)([A-Z][a-z])", r"\1 \2", name)
+    name = re.sub(r"([A-Za-z])(\d)", r"\1 \2", name)
+    name = re.sub(r"(\d)([A-Za-z])", r"\1 \2", name)
+    return [token for token in re.split(r"[^0-9A-Za-z]+", name.lower()) if token]
+
+
+class BoneTokens:
+    def __init__(self, name: str, depth: int) -> None:
+        self.name = name
+        self.depth = depth
+        self.side: Optional[str] = None
+        self.number = -1
+        words = []
+        for token in tokenize(name):
+            if token.isdigit():
+                self.number = int(token)
+            elif token in LEFT_TOKENS:
+                self.side = "left"
+            elif token in RIGHT_TOKENS:
+                self.side = "right"
+            else:
+                words.append(token)
+                if token in SEGMENT_ORDER and self.number < 0:
+                    self.number = SEGMENT_ORDER[token]
+        self.words = words
+        # UpperArm and upperarm are same
+        self.tokens: Set[str] = set(words)
+        for a, b in zip(words, words[1:]):
+            self.tokens.add(a + b)
+        self.helper = len(self.tokens & HELPER_TOKENS)
+        # UE5 index_metacarpal_l is between the hand and index_01_l
+        self.metacarpal = "metacarpal" in self.tokens
+
+
+class BoneNameIndex:
+    """
+    bone names are tokenized once into an inverted index(token => bones).
+    all props are assigned in one pass.
+    """
+
+    def __init__(
+        self,
+        bone_names: Iterable[str],
+        depths: Optional[Dict[str, int]] = None,
+    ) -> None:
+        self.bones = [
+            BoneTokens(name, depths.get(name, 0) if depths else 0)
+            for name in bone_names
+        ]
+        self.index: Dict[str, List[int]] = {}
+        for i, bone in enumerate(self.bones):
+            for token in bone.tokens:
+                self.index.setdefault(token, []).append(i)
+
+    @staticmethod
+    def get_patterns(prop: str) -> Tuple[Optional[str], List[Tuple[str, ...]]]:
+        side = None
+        body = prop
+        for prefix in ("left", "right"):
+            if prop.startswith(prefix + "_"):
+                side = prefix
+                body = prop[len(prefix) + 1 :]
+        if body in BODY_PATTERNS:
+            return side, BODY_PATTERNS[body]
+        # finger. segment is resolved by number order
+        finger = body.split("_")[0]
+        return side, [(token,) for token in FINGER_TOKENS.get(finger, ())]
+
+    @staticmethod
+    def get_segment(prop: str) -> Optional[str]:
+        """
+        left_thumb_metacarpal => metacarpal. None for body props
+        """
+        segment = prop.rsplit("_", 1)[-1]
+        return segment if segment in SEGMENT_ORDER else None
+
+    def match(self, prop: str, used: Set[int]) -> Optional[int]:
+        side, patterns = self.get_patterns(prop)
+        segment = self.get_segment(prop)
+        best = None
+        best_score = None
+        for rank, pattern in enumerate(patterns):
+            candidates = set(self.index.get(pattern[0], ()))
+            for token in pattern[1:]:
+                candidates &= set(self.index.get(token, ()))
+            for i in candidates:
+                if i in used:
+                    continue
+                bone = self.bones[i]
+                if bone.side != side:
+                    continue
+                if segment and segment != "metacarpal" and bone.metacarpal:
+                    # never a phalanx
+                    continue
+                score = (
+                    bone.helper,
+                    # an explicit metacarpal first for thumb_metacarpal.
+                    # otherwise the lowest number
+                    segment == "metacarpal" and not bone.metacarpal,
+                    rank,
+                    bone.number,
+                    len(bone.words),
+                    bone.depth,
+                    bone.name,
+                )
+                if best_score is None or score < best_score:
+                    best = i
+                    best_score = score
+            if best is not None and best_score and best_score[0] == 0:
+                break
+        return best
+
+    def match_all(
+        self, props: Iterable[str] = PROP_NAMES, exclude: Iterable[str] = ()
+    ) -> Dict[str, str]:
+        """
+        prop => bone name. bones in exclude are not assigned
+        """
+        excluded = set(exclude)
+        used = {i for i, bone in enumerate(self.bones) if bone.name in excluded}
+        result = {}
+        for prop in props:
+            i = self.match(prop, used)
+            if i is not None:
+                used.add(i)
+                result[prop] = self.bones[i].name
+        return result
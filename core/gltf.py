@@ -0,0 +1,205 @@
+"""
+glTF / GLB reading and writing with numpy accessors
+"""
+
+from typing import List, Tuple
+import json
+import struct
+import numpy
+
+GLB_MAGIC = b"glTF"
+GLB_JSON = 0x4E4F534A
+GLB_BIN = 0x004E4942
+
+# glTF componentType
+FLOAT = 5126
+
+ACCESSOR_TYPES = {
+    1: "SCALAR",
+    3: "VEC3",
+    4: "VEC4",
+}
+
+# glTF componentType => dtype, normalize divisor
+COMPONENT_TYPES = {
+    5120: (numpy.int8, 127.0),
+    5121: (numpy.uint8, 255.0),
+    5122: (numpy.int16, 32767.0),
+    5123: (numpy.uint16, 65535.0),
+    5125: (numpy.uint32, None),
+    5126: (numpy.float32, None),
+}
+
+COMPONENT_COUNTS = {
+    "SCALAR": 1,
+    "VEC2": 2,
+    "VEC3": 3,
+    "VEC4": 4,
+    "MAT4": 16,
+}
+
+
+def read_glb(data: bytes) -> Tuple[dict, bytes]:
+    magic, version, length = struct.unpack_from("<4sII", data, 0)
+    if magic != GLB_MAGIC:
+        # .gltf text
+        return json.loads(data), b""
+    if version != 2:
+        raise ValueError(f"glb version {version} is not supported")
+    gltf = None
+    binary = b""
+    pos = 12
+    while pos + 8 <= length:
+        chunk_length, chunk_type = struct.unpack_from("<II", data, pos)
+        pos += 8
+        chunk = data[pos : pos + chunk_length]
+        if chunk_type == GLB_JSON:
+            gltf = json.loads(chunk)
+        elif chunk_type == GLB_BIN:
+            binary = chunk
+        pos += chunk_length
+    if gltf is None:
+        raise ValueError("no JSON chunk")
+    return gltf, binary
+
+
+def read_accessor(gltf: dict, binary: bytes, index: int) -> numpy.ndarray:
+    """
+    returns (count, components) float64 array
+    """
+    accessor = gltf["accessors"][index]
+    dtype, divisor = COMPONENT_TYPES[accessor["componentType"]]
+    components = COMPONENT_COUNTS[accessor["type"]]
+    count = accessor["count"]
+    view = gltf["bufferViews"][accessor["bufferView"]]
+    if view.get("buffer", 0) != 0:
+        raise ValueError("only glb buffer is supported")
+    offset = view.get("byteOffset", 0) + accessor.get("byteOffset", 0)
+    item_size = numpy.dtype(dtype).itemsize * components
+    stride = view.get("byteStride", item_size)
+
+    if stride == item_size:
+        values = numpy.frombuffer(
+            binary, dtype=dtype, count=count * components, offset=offset
+        ).reshape(count, components)
+    else:
+        raw = numpy.frombuffer(
+            binary, dtype=numpy.uint8, count=stride * count, offset=offset
+        )
+        values = (
+            raw.reshape(count, stride)[:, :item_size]
+            .copy()
+            .view(dtype)
+            .reshape(count, components)
+        )
+    values = values.astype(numpy.float64)
+    if divisor and accessor.get("normalized"):
+        values = numpy.maximum(values / divisor, -1)
+    return values
+
+
+def sample_channel(
+    times: numpy.ndarray,
+    values: numpy.ndarray,
+    interpolation: str,
+    grid: numpy.ndarray,
+    is_rotation: bool,
+) -> numpy.ndarray:
+    """
+    resample keys to the frame grid
+    """
+    if interpolation == "CUBICSPLINE":
+        # in-tangent, value, out-tangent. use values only
+        values = values[1::3]
+    times = times[:, 0]
+    if len(times) == 1:
+        return numpy.repeat(values, len(grid), axis=0)
+
+    right = numpy.clip(numpy.searchsorted(times, grid), 1, len(times) - 1)
+    left = right - 1
+    t0 = times[left]
+    t1 = times[right]
+    factor = numpy.clip((grid - t0) / numpy.maximum(t1 - t0, 1e-9), 0, 1)
+    if interpolation == "STEP":
+        factor = numpy.where(factor < 1, 0.0, 1.0)
+    factor = factor[:, numpy.newaxis]
+
+    a = values[left]
+    b = values[right]
+    if is_rotation:
+        # shortest path nlerp
+        b = numpy.where(numpy.sum(a * b, axis=1, keepdims=True) < 0, -b, b)
+        q = a + (b - a) * factor
+        return q / numpy.linalg.norm(q, axis=1, keepdims=True)
+    return a + (b - a) * factor
+
+
+def make_continuous(q: numpy.ndarray) -> numpy.ndarray:
+    """
+    (frames, 4). flip signs so that neighbour quaternions are in the same hemisphere
+    """
+    dot = numpy.sum(q[1:] * q[:-1], axis=1)
+    signs = numpy.concatenate([[1.0], numpy.cumprod(numpy.where(dot < 0, -1.0, 1.0))])
+    return q * signs[:, numpy.newaxis]
+
+
+class BinaryBuffer:
+    """
+    packs accessor arrays into one glTF buffer (GLB BIN chunk)
+    """
+
+    def __init__(self, gltf: dict) -> None:
+        self.gltf = gltf
+        self.chunks: List[bytes] = []
+        self.length = 0
+        gltf.setdefault("buffers", [])
+        gltf.setdefault("bufferViews", [])
+        gltf.setdefault("accessors", [])
+
+    def add_accessor(self, values: numpy.ndarray, *, min_max: bool = False) -> int:
+        values = numpy.ascontiguousarray(values, dtype=numpy.float32)
+        count = values.shape[0]
+        components = 1 if values.ndim == 1 else values.shape[1]
+        data = values.tobytes()
+
+        view_index = len(self.gltf["bufferViews"])
+        self.gltf["bufferViews"].append(
+            {"buffer": 0, "byteOffset": self.length, "byteLength": len(data)}
+        )
+        self.chunks.append(data)
+        # float32 keeps 4 byte alignment
+        self.length += len(data)
+
+        accessor = {
+            "bufferView": view_index,
+            "componentType": FLOAT,
+            "count": count,
+            "type": ACCESSOR_TYPES[components],
+        }
+        if min_max:
+            values = values.reshape(count, components)
+            accessor["min"] = values.min(axis=0).tolist()
+            accessor["max"] = values.max(axis=0).tolist()
+        accessor_index = len(self.gltf["accessors"])
+        self.gltf["accessors"].append(accessor)
+        return accessor_index
+
+    def to_glb(self) -> bytes:
+        self.gltf["buffers"] = [{"byteLength": self.length}]
+        json_chunk = json.dumps(self.gltf, separators=(",", ":")).encode("utf-8")
+        json_chunk += b" " * (-len(json_chunk) % 4)
+        bin_chunk = b"".join(self.chunks)
+        bin_chunk += b"\x00" * (-len(bin_chunk) % 4)
+
+        total = 12 + 8 + len(json_chunk) + 8 + len(bin_chunk)
+        return b"".join(
+            [
+                struct.pack("<4sII", GLB_MAGIC, 2, total),
+                struct.pack("<II", len(json_chunk), GLB_JSON),
+                json_chunk,
+                struct.pack("<II", len(bin_chunk), GLB_BIN),
+                bin_chunk,
+            ]
+        )
+
+
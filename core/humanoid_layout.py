@@ -0,0 +1,315 @@
+"""
+bone layout of the default humanoid. offsets from the parent head in
+blender armature space, +x is left of the character, +z is up.
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import math
+import numpy
+from .skeleton import PROP_NAMES
+
+
+class Bone(NamedTuple):
+    human_bone: str
+    head: Tuple[float, float, float]
+    children: List["Bone"] = []
+
+
+def get_finger(name: str, lr: float, y: float) -> Bone:
+    """
+    手首から指: 10
+    指: 5-3-2
+    親指: 5-4-3
+    """
+    base = lr / 10
+    return Bone(
+        f"{name}Proximal",
+        (base * 10, y, 0),
+        [
+            Bone(
+                f"{name}Intermediate",
+                (base * 5, 0, 0),
+                [
+                    Bone(
+                        f"{name}Distal",
+                        (base * 3, 0, 0),
+                        [Bone("tip", (base * 2, 0, 0))],
+                    )
+                ],
+            )
+        ],
+    )
+
+
+def get_thumb(x, y, z) -> Bone:
+    return Bone(
+        f"ThumbMetacarpal",
+        (0, 0, -0.02),
+        [
+            Bone(
+                f"ThumbProximal",
+                (x * 5, y * 5, z * 5),
+                [
+                    Bone(
+                        f"ThumbDistal",
+                        (x * 3, y * 3, z * 3),
+                        [Bone("tip", (x * 2, y * 2, z * 2))],
+                    )
+                ],
+            )
+        ],
+    )
+
+
+def get_arm(lr: float) -> Bone:
+    f = lr * 0.6
+    return Bone(
+        "Shoulder",
+        (lr * 0.1, 0, math.fabs(lr) * 2),
+        [
+            Bone(
+                "UpperArm",
+                (lr, 0, 0),
+                [
+                    Bone(
+                        "LowerArm",
+                        (lr * 2, 0, 0),
+                        [
+                            Bone(
+                                "Hand",
+                                (lr * 2, 0, 0),
+                                [
+                                    get_finger("Middle", f, 0),
+                                    get_finger("Index", f, -0.015),
+                                    get_finger("Ring", f, 0.015),
+                                    get_finger("Little", f, 0.03),
+                                    get_thumb(f / 10, -abs(f / 10), 0),
+                                ],
+                            )
+                        ],
+                    )
+                ],
+            )
+        ],
+    )
+
+
+def get_leg(tall: float, lr: float):
+    # upper 1
+    # lower 1
+    # foot 0.2
+    base = tall / 11
+    return Bone(
+        "UpperLeg",
+        (lr * base, 0, 0),
+        [
+            Bone(
+                "LowerLeg",
+                (0, 0, -base * 5),
+                [
+                    Bone(
+                        "Foot",
+                        (0, 0, -base * 5),
+                        [
+                            Bone(
+                                "Toes",
+                                (0, -base, -base),
+                                [Bone("tip", (0, -base, 0))],
+                            )
+                        ],
+                    )
+                ],
+            ),
+        ],
+    )
+
+
+def get_humanoid(tall: float):
+    head = tall / 6
+    # head=1
+    #
+    # neck  1
+    # chest 4
+    # spine 2
+    # hips  2
+    base = head * 2 / 9
+    return Bone(
+        "Hips",
+        (0, 0, tall / 2),
+        [
+            Bone(
+                "Spine",
+                (0, 0, base * 2),
+                [
+                    Bone(
+                        "Chest",
+                        (0, 0, base * 2),
+                        [
+                            Bone(
+                                "Neck",
+                                (0, 0, base * 4),
+                                [
+                                    Bone(
+                                        "Head",
+                                        (0, 0, base),
+                                        [Bone("tip", (0, 0, head))],
+                                    )
+                                ],
+                            ),
+                            get_arm(base * 2),
+                            get_arm(-base * 2),
+                        ],
+                    )
+                ],
+            ),
+            get_leg(tall / 2, 1),
+            get_leg(tall / 2, -1),
+        ],
+    )
+
+
+def _bone_name(prop: str) -> str:
+    """
+    left_upper_arm => UpperArm.L
+    """
+    words = prop.split("_")
+    suffix = ""
+    if words[0] == "left":
+        suffix = ".L"
+        words = words[1:]
+    elif words[0] == "right":
+        suffix = ".R"
+        words = words[1:]
+    return "".join(word.capitalize() for word in words) + suffix
+
+
+# bone names of get_humanoid
+BONE_FROM_PROP: Dict[str, str] = {prop: _bone_name(prop) for prop in PROP_NAMES}
+
+
+class Proportions(NamedTuple):
+    """
+    a row of the proportions table. ratios scale the default humanoid
+    """
+
+    height: float = 1.6
+    arm: float = 1.0
+    leg: float = 1.0
+    finger: float = 1.0
+
+
+class HumanoidLayout:
+    """
+    get_humanoid flattened to arrays, parent first.
+    bone offsets are affine in the height, offset = constant + height * scale
+    """
+
+    def __init__(self) -> None:
+        self.names: List[str] = []
+        self.parents: List[int] = []
+        self.first_children: List[int] = []
+        offsets = []
+        self._flatten(get_humanoid(1), -1, 0, offsets)
+        scale = numpy.array(offsets)
+        offsets = []
+        self._flatten(get_humanoid(0), -1, 0, offsets, names=False)
+        self.constant = numpy.array(offsets)
+        self.scale = scale - self.constant
+
+        # the first child of a bone gives the tail and is connected
+        self.tails = numpy.array(self.first_children)
+        self.connected = [
+            parent >= 0 and self.first_children[parent] == i
+            for i, parent in enumerate(self.parents)
+        ]
+        # tips are tails only
+        self.bones = [
+            i for i, name in enumerate(self.names) if not name.endswith(".tip")
+        ]
+
+        hand_descendants = set()
+        for i, parent in enumerate(self.parents):
+            if parent >= 0 and (
+                self.names[parent].startswith("Hand") or parent in hand_descendants
+            ):
+                hand_descendants.add(i)
+        base_names = [name.split(".")[0] for name in self.names]
+        self.arm = [
+            i for i, name in enumerate(base_names) if name in ("LowerArm", "Hand")
+        ]
+        self.leg = [
+            i for i, name in enumerate(base_names) if name in ("LowerLeg", "Foot")
+        ]
+        self.finger = sorted(hand_descendants)
+
+    def _flatten(
+        self,
+        bone: Bone,
+        parent: int,
+        x: float,
+        offsets: list,
+        names: bool = True,
+    ):
+        i = len(offsets)
+        offsets.append(bone.head)
+        x += bone.head[0]
+        if names:
+            name = bone.human_bone
+            if parent >= 0 and name == "tip":
+                name = self.names[parent] + ".tip"
+            elif x > 0:
+                name += ".L"
+            elif x < 0:
+                name += ".R"
+            self.names.append(name)
+            self.parents.append(parent)
+            self.first_children.append(-1)
+        for j, child in enumerate(bone.children):
+            if names and j == 0:
+                self.first_children[i] = len(offsets)
+            self._flatten(child, i, x, offsets, names)
+
+    def heads(self, table: numpy.ndarray) -> numpy.ndarray:
+        """
+        proportions table (M, 4) => bone heads (M, N, 3) in armature space
+        """
+        count = len(table)
+        factor = numpy.ones((count, len(self.names)))
+        factor[:, self.arm] = table[:, 1:2]
+        factor[:, self.leg] = table[:, 2:3]
+        factor[:, self.finger] = table[:, 3:4]
+        offsets = (
+            self.constant[None]
+            + table[:, 0, None, None] * self.scale[None] * factor[:, :, None]
+        )
+        heads = numpy.empty_like(offsets)
+        for i, parent in enumerate(self.parents):
+            heads[:, i] = offsets[:, i]
+            if parent >= 0:
+                heads[:, i] += heads[:, parent]
+        return heads
+
+
+LAYOUT: Optional[HumanoidLayout] = None
+
+
+def get_layout() -> HumanoidLayout:
+    global LAYOUT
+    if not LAYOUT:
+        LAYOUT = HumanoidLayout()
+    return LAYOUT
+
+
+def random_proportions(
+    count: int,
+    seed: int = 0,
+    height: Tuple[float, float] = (1.4, 1.9),
+    variation: float = 0.1,
+) -> List[Proportions]:
+    rng = numpy.random.default_rng(seed)
+    heights = rng.uniform(height[0], height[1], count)
+    ratios = rng.uniform(1 - variation, 1 + variation, (count, 3))
+    return [
+        Proportions(h, arm, leg, finger)
+        for h, (arm, leg, finger) in zip(heights.tolist(), ratios.tolist())
+    ]
@@ -0,0 +1,245 @@
+"""
+batched transform math on numpy arrays.
+
+matrices are row major (n, 4, 4). quaternions are glTF order (x, y, z, w).
+"""
+
+from typing import Sequence
+import numpy
+
+
+def from_blender_matrices(values: numpy.ndarray) -> numpy.ndarray:
+    """
+    flat foreach_get("matrix") buffer(column major) to (n, 4, 4) row major
+    """
+    return values.reshape(-1, 4, 4).transpose(0, 2, 1)
+
+
+def bone_indices(names: Sequence[str], selected: Sequence[str]) -> numpy.ndarray:
+    """
+    position of each selected bone in names(the order of foreach_get)
+    """
+    index = {name: i for i, name in enumerate(names)}
+    return numpy.array([index[name] for name in selected], dtype=int)
+
+
+def select_matrices(values: numpy.ndarray, indices: numpy.ndarray) -> numpy.ndarray:
+    """
+    (len(indices), 4, 4) float64 out of a foreach_get buffer of all bones.
+    only the selected matrices are copied
+    """
+    return from_blender_matrices(values)[indices].astype(numpy.float64)
+
+
+def relative_matrices(
+    matrices: numpy.ndarray, parent_indices: numpy.ndarray
+) -> numpy.ndarray:
+    """
+    parent.inverted() @ m for each m. root(parent_index < 0) is kept as is.
+    """
+    local = matrices.copy()
+    has_parent = parent_indices >= 0
+    parents = matrices[parent_indices[has_parent]]
+    local[has_parent] = numpy.linalg.inv(parents) @ matrices[has_parent]
+    return local
+
+
+def forward_kinematics(
+    local: numpy.ndarray, parent_indices: numpy.ndarray
+) -> numpy.ndarray:
+    """
+    (..., n, 4, 4) local matrices to world. bones of the same depth are
+    multiplied at once
+    """
+    depths = numpy.zeros(len(parent_indices), dtype=int)
+    ancestors = numpy.asarray(parent_indices)
+    while (ancestors >= 0).any():
+        has_parent = ancestors >= 0
+        depths[has_parent] += 1
+        ancestors = numpy.where(has_parent, parent_indices[ancestors], -1)
+
+    world = local.copy()
+    for depth in range(1, depths.max(initial=0) + 1):
+        indices = numpy.nonzero(depths == depth)[0]
+        world[..., indices, :, :] = (
+            world[..., parent_indices[indices], :, :] @ local[..., indices, :, :]
+        )
+    return world
+
+
+def normalized_mat3_to_quat(m: numpy.ndarray) -> numpy.ndarray:
+    """
+    (n, 3, 3) rotation matrices to (n, 4) quaternions. w >= 0
+    """
+    m00 = m[:, 0, 0]
+    m11 = m[:, 1, 1]
+    m22 = m[:, 2, 2]
+    q = numpy.empty((m.shape[0], 4), dtype=m.dtype)
+
+    # select largest diagonal term for stability
+    trace = m00 + m11 + m22
+    choice = numpy.argmax(numpy.stack([trace, m00, m11, m22], axis=1), axis=1)
+
+    c = choice == 0
+    s = numpy.sqrt(1 + trace[c]) * 2
+    q[c, 3] = 0.25 * s
+    q[c, 0] = (m[c, 2, 1] - m[c, 1, 2]) / s
+    q[c, 1] = (m[c, 0, 2] - m[c, 2, 0]) / s
+    q[c, 2] = (m[c, 1, 0] - m[c, 0, 1]) / s
+
+    c = choice == 1
+    s = numpy.sqrt(1 + m00[c] - m11[c] - m22[c]) * 2
+    q[c, 3] = (m[c, 2, 1] - m[c, 1, 2]) / s
+    q[c, 0] = 0.25 * s
+    q[c, 1] = (m[c, 0, 1] + m[c, 1, 0]) / s
+    q[c, 2] = (m[c, 0, 2] + m[c, 2, 0]) / s
+
+    c = choice == 2
+    s = numpy.sqrt(1 + m11[c] - m00[c] - m22[c]) * 2
+    q[c, 3] = (m[c, 0, 2] - m[c, 2, 0]) / s
+    q[c, 0] = (m[c, 0, 1] + m[c, 1, 0]) / s
+    q[c, 1] = 0.25 * s
+    q[c, 2] = (m[c, 1, 2] + m[c, 2, 1]) / s
+
+    c = choice == 3
+    s = numpy.sqrt(1 + m22[c] - m00[c] - m11[c]) * 2
+    q[c, 3] = (m[c, 1, 0] - m[c, 0, 1]) / s
+    q[c, 0] = (m[c, 0, 2] + m[c, 2, 0]) / s
+    q[c, 1] = (m[c, 1, 2] + m[c, 2, 1]) / s
+    q[c, 2] = 0.25 * s
+
+    q[q[:, 3] < 0] *= -1
+    q /= numpy.linalg.norm(q, axis=1, keepdims=True)
+    return q
+
+
+def decompose(matrices: numpy.ndarray):
+    """
+    same as mathutils.Matrix.decompose. returns translation, rotation, scale
+    """
+    t = matrices[:, :3, 3].copy()
+    m3 = matrices[:, :3, :3]
+    s = numpy.linalg.norm(m3, axis=1)
+    # negative scale
+    s[numpy.linalg.det(m3) < 0] *= -1
+    r = normalized_mat3_to_quat(m3 / s[:, numpy.newaxis, :])
+    return t, r, s
+
+
+def normalized_mat3(matrices: numpy.ndarray) -> numpy.ndarray:
+    """
+    rotation part of (n, 4, 4) or (n, 3, 3). scale removed
+    """
+    m3 = matrices[:, :3, :3]
+    return m3 / numpy.linalg.norm(m3, axis=1)[:, numpy.newaxis, :]
+
+
+def normalized_local_rotations(
+    pose_rotations: numpy.ndarray,
+    rest_rotations: numpy.ndarray,
+    parent_indices: numpy.ndarray,
+) -> numpy.ndarray:
+    """
+    VRM normalized local rotations.
+    the rotation of each bone from its rest pose, relative to the rotation of the
+    parent from its rest pose. axes are the ones of the input (armature space).
+    """
+    delta = pose_rotations @ rest_rotations.transpose(0, 2, 1)
+    local = delta.copy()
+    has_parent = parent_indices >= 0
+    parents = delta[parent_indices[has_parent]]
+    local[has_parent] = parents.transpose(0, 2, 1) @ delta[has_parent]
+    return normalized_mat3_to_quat(local)
+
+
+def quat_multiply(a: numpy.ndarray, b: numpy.ndarray) -> numpy.ndarray:
+    """
+    a * b of (..., 4) quaternions
+    """
+    ax, ay, az, aw = a[..., 0], a[..., 1], a[..., 2], a[..., 3]
+    bx, by, bz, bw = b[..., 0], b[..., 1], b[..., 2], b[..., 3]
+    return numpy.stack(
+        [
+            aw * bx + ax * bw + ay * bz - az * by,
+            aw * by - ax * bz + ay * bw + az * bx,
+            aw * bz + ax * by - ay * bx + az * bw,
+            aw * bw - ax * bx - ay * by - az * bz,
+        ],
+        axis=-1,
+    )
+
+
+def quat_conjugate(q: numpy.ndarray) -> numpy.ndarray:
+    return q * numpy.array([-1, -1, -1, 1], dtype=q.dtype)
+
+
+def quat_to_mat3(q: numpy.ndarray) -> numpy.ndarray:
+    """
+    (n, 4) quaternions to (n, 3, 3) row major rotation matrices
+    """
+    x, y, z, w = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    return numpy.stack(
+        [
+            numpy.stack(
+                [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+                axis=1,
+            ),
+            numpy.stack(
+                [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+                axis=1,
+            ),
+            numpy.stack(
+                [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+                axis=1,
+            ),
+        ],
+        axis=1,
+    )
+
+
+# bpy rotation_mode => axis order and parity. same as blender's rotOrders
+EULER_ORDERS = {
+    "XYZ": ((0, 1, 2), False),
+    "XZY": ((0, 2, 1), True),
+    "YXZ": ((1, 0, 2), True),
+    "YZX": ((1, 2, 0), False),
+    "ZXY": ((2, 0, 1), False),
+    "ZYX": ((2, 1, 0), True),
+}
+
+
+def quat_to_euler(q: numpy.ndarray, order: str) -> numpy.ndarray:
+    """
+    (n, 4) quaternions to (n, 3) euler angles of the bpy rotation_mode order
+    """
+    (i, j, k), parity = EULER_ORDERS[order]
+    # blender indexes matrices as [column][row]
+    m = quat_to_mat3(q).transpose(0, 2, 1)
+    cy = numpy.hypot(m[:, i, i], m[:, i, j])
+    gimbal = cy <= 16 * numpy.finfo(numpy.float32).eps
+
+    e = numpy.empty((q.shape[0], 3), dtype=q.dtype)
+    e[:, i] = numpy.where(
+        gimbal,
+        numpy.arctan2(-m[:, k, j], m[:, j, j]),
+        numpy.arctan2(m[:, j, k], m[:, k, k]),
+    )
+    e[:, j] = numpy.arctan2(-m[:, i, k], cy)
+    e[:, k] = numpy.where(gimbal, 0, numpy.arctan2(m[:, i, j], m[:, i, i]))
+    if parity:
+        e *= -1
+    return e
+
+
+def quat_to_axis_angle(q: numpy.ndarray) -> numpy.ndarray:
+    """
+    (n, 4) quaternions to (n, 4) bpy rotation_axis_angle (angle, x, y, z)
+    """
+    w = numpy.clip(q[:, 3], -1, 1)
+    angle = 2 * numpy.arccos(w)
+    s = numpy.sqrt(numpy.maximum(1 - w * w, 0))
+    axis = numpy.empty((q.shape[0], 3), dtype=q.dtype)
+    small = s < 1e-8
+    axis[small] = (0, 1, 0)
+    axis[~small] = q[~small, :3] / s[~small, numpy.newaxis]
+    return numpy.concatenate([angle[:, numpy.newaxis], axis], axis=1)
@@ -0,0 +1,184 @@
+"""
+bpy free part of the declarative rig.
+part specs, ownership check, part hashes and the plan of an incremental rebuild.
+"""
+
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+import hashlib
+import json
+
+Vector3 = Tuple[float, float, float]
+
+
+class EditBoneSpec(NamedTuple):
+    """
+    new bone or change of an existing bone. None keeps current value
+    """
+
+    name: str
+    parent: Optional[str] = None
+    head: Optional[Vector3] = None
+    tail: Optional[Vector3] = None
+    # copy roll of this bone
+    roll_from: Optional[str] = None
+    use_connect: Optional[bool] = None
+    use_inherit_rotation: Optional[bool] = None
+
+
+class PoseBoneSpec(NamedTuple):
+    name: str
+    # pose bone attributes. rotation_mode, lock_rotation ...
+    props: Tuple[Tuple[str, Any], ...] = ()
+    hide: Optional[bool] = None
+
+
+class DriverSpec(NamedTuple):
+    data_path: str
+    expression: str
+    # (name, data path from the armature object) of SINGLE_PROP variables
+    variables: Tuple[Tuple[str, str], ...]
+
+
+class ConstraintSpec(NamedTuple):
+    """
+    target and pole_target are the armature itself
+    """
+
+    bone: str
+    type: str
+    name: str
+    props: Tuple[Tuple[str, Any], ...] = ()
+    drivers: Tuple[DriverSpec, ...] = ()
+
+
+class StyleSpec(NamedTuple):
+    bone: str
+    collection: str
+    palette: str = "DEFAULT"
+
+
+class RigPart(NamedTuple):
+    name: str
+    edit_bones: Sequence[EditBoneSpec] = ()
+    pose_bones: Sequence[PoseBoneSpec] = ()
+    constraints: Sequence[ConstraintSpec] = ()
+    styles: Sequence[StyleSpec] = ()
+
+
+def find_conflicts(parts: Sequence[RigPart]) -> List[str]:
+    """
+    bone properties that more than one part writes
+    """
+    owners: Dict[Tuple[str, str], str] = {}
+    conflicts = []
+
+    def own(bone: str, key: str, part: RigPart):
+        owner = owners.setdefault((bone, key), part.name)
+        if owner != part.name:
+            conflicts.append(f"{bone}.{key}: {owner}, {part.name}")
+
+    for part in parts:
+        for spec in part.edit_bones:
+            for key, value in spec._asdict().items():
+                if key != "name" and value is not None:
+                    own(spec.name, key, part)
+        for spec in part.pose_bones:
+            for key, _ in spec.props:
+                own(spec.name, key, part)
+            if spec.hide is not None:
+                own(spec.name, "hide", part)
+        for spec in part.constraints:
+            own(spec.bone, f'constraints["{spec.name}"]', part)
+        for spec in part.styles:
+            own(spec.bone, "color", part)
+    return conflicts
+
+
+def part_hash(part: RigPart) -> str:
+    """
+    the spec is built from the rest pose and the humanoid mapping,
+    so this changes when the input of the part changes
+    """
+    return hashlib.sha1(repr(part).encode("utf-8")).hexdigest()
+
+
+def parse_state(text: str) -> Dict[str, dict]:
+    """
+    part name => {"hash", "bones", "constraints"} of the last build.
+    bones are the bones that the part created
+    """
+    try:
+        state = json.loads(text)
+    except ValueError:
+        return {}
+    for name, entry in state.items():
+        if isinstance(entry, str):
+            # hash only. older versions
+            state[name] = {"hash": entry, "bones": [], "constraints": []}
+    return state
+
+
+class RigPlan(NamedTuple):
+    # parts to apply
+    dirty: List[RigPart]
+    # state entries of parts that are no longer built
+    stale: List[str]
+    # created by an earlier build and not in the spec any more
+    bones: List[str]
+    constraints: List[Tuple[str, str]]
+
+
+def plan_update(
+    state: Dict[str, dict],
+    parts: Sequence[RigPart],
+    is_built: Callable[[RigPart], bool],
+) -> RigPlan:
+    """
+    parts whose hash changed or whose bones and constraints are missing
+    """
+    names = {part.name for part in parts}
+    stale = [name for name in state if name not in names]
+    dirty = [
+        part
+        for part in parts
+        if state.get(part.name, {}).get("hash") != part_hash(part)
+        or not is_built(part)
+    ]
+    if not stale and not dirty:
+        return RigPlan([], [], [], [])
+
+    bones_in_use = {spec.name for part in parts for spec in part.edit_bones}
+    constraints_in_use = {
+        (spec.bone, spec.name) for part in parts for spec in part.constraints
+    }
+    bones = []
+    constraints = []
+    for entry in [state[name] for name in stale] + [
+        state[part.name] for part in dirty if part.name in state
+    ]:
+        bones += [name for name in entry["bones"] if name not in bones_in_use]
+        constraints += [
+            (bone, name)
+            for bone, name in entry["constraints"]
+            if (bone, name) not in constraints_in_use
+        ]
+    return RigPlan(dirty, stale, bones, constraints)
+
+
+def record_state(
+    state: Dict[str, dict], plan: RigPlan, owned: Sequence[str]
+) -> Dict[str, dict]:
+    """
+    drop the stale parts and hash the applied ones.
+    owned are the bones that the rig created
+    """
+    owned = set(owned)
+    for name in plan.stale:
+        del state[name]
+    for part in plan.dirty:
+        state[part.name] = {
+            "hash": part_hash(part),
+            "bones": [spec.name for spec in part.edit_bones if spec.name in owned],
+            "constraints": [[spec.bone, spec.name] for spec in part.constraints],
+        }
+    return state
@@ -0,0 +1,381 @@
+"""
+humanoid bone tree. prop names, VRM humanBone names and flat index tables
+"""
+
+from typing import NamedTuple, List, Iterable, Optional, Dict, Tuple
+import numpy
+
+PROP_NAMES = [
+    "hips",
+    "spine",
+    "chest",
+    "neck",
+    "head",
+    "left_shoulder",
+    "left_upper_arm",
+    "left_lower_arm",
+    "left_hand",
+    "right_shoulder",
+    "right_upper_arm",
+    "right_lower_arm",
+    "right_hand",
+    "left_upper_leg",
+    "left_lower_leg",
+    "left_foot",
+    "left_toes",
+    "right_upper_leg",
+    "right_lower_leg",
+    "right_foot",
+    "right_toes",
+    "left_thumb_metacarpal",
+    "left_thumb_proximal",
+    "left_thumb_distal",
+    "left_index_proximal",
+    "left_index_intermediate",
+    "left_index_distal",
+    "left_middle_proximal",
+    "left_middle_intermediate",
+    "left_middle_distal",
+    "left_ring_proximal",
+    "left_ring_intermediate",
+    "left_ring_distal",
+    "left_little_proximal",
+    "left_little_intermediate",
+    "left_little_distal",
+    "right_thumb_metacarpal",
+    "right_thumb_proximal",
+    "right_thumb_distal",
+    "right_index_proximal",
+    "right_index_intermediate",
+    "right_index_distal",
+    "right_middle_proximal",
+    "right_middle_intermediate",
+    "right_middle_distal",
+    "right_ring_proximal",
+    "right_ring_intermediate",
+    "right_ring_distal",
+    "right_little_proximal",
+    "right_little_intermediate",
+    "right_little_distal",
+]
+
+# for VRM
+PROP_TO_HUMANBONE = {
+    "left_shoulder": "leftShoulder",
+    "left_upper_arm": "leftUpperArm",
+    "left_lower_arm": "leftLowerArm",
+    "left_hand": "leftHand",
+    "right_shoulder": "rightShoulder",
+    "right_upper_arm": "rightUpperArm",
+    "right_lower_arm": "rightLowerArm",
+    "right_hand": "rightHand",
+    "left_upper_leg": "leftUpperLeg",
+    "left_lower_leg": "leftLowerLeg",
+    "left_foot": "leftFoot",
+    "left_toes": "leftToes",
+    "right_upper_leg": "rightUpperLeg",
+    "right_lower_leg": "rightLowerLeg",
+    "right_foot": "rightFoot",
+    "right_toes": "rightToes",
+    "left_thumb_metacarpal": "leftThumbMetacarpal",
+    "left_thumb_proximal": "leftThumbProximal",
+    "left_thumb_distal": "leftThumbDistal",
+    "left_index_proximal": "leftIndexProximal",
+    "left_index_intermediate": "leftIndexIntermediate",
+    "left_index_distal": "leftIndexDistal",
+    "left_middle_proximal": "leftMiddleProximal",
+    "left_middle_intermediate": "leftMiddleIntermediate",
+    "left_middle_distal": "leftMiddleDistal",
+    "left_ring_proximal": "leftRingProximal",
+    "left_ring_intermediate": "leftRingIntermediate",
+    "left_ring_distal": "leftRingDistal",
+    "left_little_proximal": "leftLittleProximal",
+    "left_little_intermediate": "leftLittleIntermediate",
+    "left_little_distal": "leftLittleDistal",
+    "right_thumb_metacarpal": "rightThumbMetacarpal",
+    "right_thumb_proximal": "rightThumbProximal",
+    "right_thumb_distal": "rightThumbDistal",
+    "right_index_proximal": "rightIndexProximal",
+    "right_index_intermediate": "rightIndexIntermediate",
+    "right_index_distal": "rightIndexDistal",
+    "right_middle_proximal": "rightMiddleProximal",
+    "right_middle_intermediate": "rightMiddleIntermediate",
+    "right_middle_distal": "rightMiddleDistal",
+    "right_ring_proximal": "rightRingProximal",
+    "right_ring_intermediate": "rightRingIntermediate",
+    "right_ring_distal": "rightRingDistal",
+    "right_little_proximal": "rightLittleProximal",
+    "right_little_intermediate": "rightLittleIntermediate",
+    "right_little_distal": "rightLittleDistal",
+}
+HUMANBONE_TO_PROP = {v: k for k, v in PROP_TO_HUMANBONE.items()}
+
+
+class Node(NamedTuple):
+    prop: str
+    children: List["Node"]
+
+
+def make_hand(prefix: str) -> Node:
+    return Node(
+        f"{prefix}hand",
+        [
+            Node(
+                f"{prefix}thumb_metacarpal",
+                [Node(f"{prefix}thumb_proximal", [Node(f"{prefix}thumb_distal", [])])],
+            ),
+            Node(
+                f"{prefix}index_proximal",
+                [
+                    Node(
+                        f"{prefix}index_intermediate",
+                        [Node(f"{prefix}index_distal", [])],
+                    )
+                ],
+            ),
+            Node(
+                f"{prefix}middle_proximal",
+                [
+                    Node(
+                        f"{prefix}middle_intermediate",
+                        [Node(f"{prefix}middle_distal", [])],
+                    )
+                ],
+            ),
+            Node(
+                f"{prefix}ring_proximal",
+                [
+                    Node(
+                        f"{prefix}ring_intermediate",
+                        [Node(f"{prefix}ring_distal", [])],
+                    )
+                ],
+            ),
+            Node(
+                f"{prefix}little_proximal",
+                [
+                    Node(
+                        f"{prefix}little_intermediate",
+                        [Node(f"{prefix}little_distal", [])],
+                    )
+                ],
+            ),
+        ],
+    )
+
+
+TREE = Node(
+    "hips",
+    [
+        Node(
+            "spine",
+            [
+                Node(
+                    "chest",
+                    [
+                        Node("neck", [Node("head", [])]),
+                        Node(
+                            "left_shoulder",
+                            [
+                                Node(
+                                    "left_upper_arm",
+                                    [Node("left_lower_arm", [make_hand("left_")])],
+                                )
+                            ],
+                        ),
+                        Node(
+                            "right_shoulder",
+                            [
+                                Node(
+                                    "right_upper_arm",
+                                    [Node("right_lower_arm", [make_hand("right_")])],
+                                )
+                            ],
+                        ),
+                    ],
+                )
+            ],
+        ),
+        Node(
+            "left_upper_leg",
+            [Node("left_lower_leg", [Node("left_foot", [Node("left_toes", [])])])],
+        ),
+        Node(
+            "right_upper_leg",
+            [Node("right_lower_leg", [Node("right_foot", [Node("right_toes", [])])])],
+        ),
+    ],
+)
+
+
+def _compile(root: Node):
+    """
+    TREE to flat arrays. depth first order, parent before children
+    """
+    nodes: Dict[str, Node] = {}
+    order: List[str] = []
+    parents: List[int] = []
+    stack: List[Tuple[Node, int]] = [(root, -1)]
+    while stack:
+        node, parent = stack.pop()
+        nodes[node.prop] = node
+        order.append(node.prop)
+        parents.append(parent)
+        index = len(order) - 1
+        for child in reversed(node.children):
+            stack.append((child, index))
+
+    # children of i are child_indices[child_offsets[i] : child_offsets[i + 1]]
+    counts = [0] * len(order)
+    for parent in parents:
+        if parent >= 0:
+            counts[parent] += 1
+    offsets = [0]
+    for count in counts:
+        offsets.append(offsets[-1] + count)
+    children = [0] * offsets[-1]
+    fill = offsets[:-1]
+    for i, parent in enumerate(parents):
+        if parent >= 0:
+            children[fill[parent]] = i
+            fill[parent] += 1
+
+    # depth first order. a subtree is the range [i, subtree_ends[i])
+    sizes = [1] * len(order)
+    for i in range(len(order) - 1, 0, -1):
+        sizes[parents[i]] += sizes[i]
+    subtree_ends = [i + size for i, size in enumerate(sizes)]
+
+    index = {prop: i for i, prop in enumerate(order)}
+    mirror = []
+    for prop in order:
+        if prop.startswith("left_"):
+            mirror.append(index["right_" + prop[5:]])
+        elif prop.startswith("right_"):
+            mirror.append(index["left_" + prop[6:]])
+        else:
+            mirror.append(index[prop])
+
+    return (
+        nodes,
+        order,
+        index,
+        numpy.array(parents, dtype=numpy.int32),
+        numpy.array(offsets, dtype=numpy.int32),
+        numpy.array(children, dtype=numpy.int32),
+        numpy.array(mirror, dtype=numpy.int32),
+        numpy.array(subtree_ends, dtype=numpy.int32),
+    )
+
+
+# compiled once at import
+(
+    _NODES,
+    PROP_ORDER,
+    PROP_INDEX,
+    PARENT_INDICES,
+    CHILD_OFFSETS,
+    CHILD_INDICES,
+    MIRROR_INDICES,
+    SUBTREE_ENDS,
+) = _compile(TREE)
+
+
+def get_node(prop: str) -> Optional[Node]:
+    return _NODES.get(prop)
+
+
+def enum_children(prop: str) -> Iterable[str]:
+    i = PROP_INDEX.get(prop)
+    if i is None:
+        return
+    for child in CHILD_INDICES[CHILD_OFFSETS[i] : CHILD_OFFSETS[i + 1]]:
+        yield PROP_ORDER[child]
+
+
+def get_parent(prop: str) -> Optional[str]:
+    i = PROP_INDEX.get(prop)
+    if i is None or PARENT_INDICES[i] < 0:
+        return None
+    return PROP_ORDER[PARENT_INDICES[i]]
+
+
+def get_mirror(prop: str) -> str:
+    return PROP_ORDER[MIRROR_INDICES[PROP_INDEX[prop]]]
+
+
+def enum_subtree(prop: str) -> Iterable[str]:
+    """
+    prop and descendants. same order as PROP_ORDER
+    """
+    i = PROP_INDEX[prop]
+    yield from PROP_ORDER[i : SUBTREE_ENDS[i]]
+
+
+class HumanIndex:
+    """
+    bone name tables of one humanoid mapping(prop => bone name).
+    lookups during traversal never touch RNA.
+    """
+
+    def __init__(self, bone_from_prop: Dict[str, str]) -> None:
+        self.bone_from_prop: Dict[str, str] = {}
+        self.prop_from_bone: Dict[str, str] = {}
+        for prop in PROP_NAMES:
+            bone_name = bone_from_prop.get(prop)
+            if bone_name:
+                self.bone_from_prop[prop] = bone_name
+                # first prop wins. same as linear search
+                self.prop_from_bone.setdefault(bone_name, prop)
+
+        self.vrm_from_bone: Dict[str, str] = {
+            bone_name: PROP_TO_HUMANBONE.get(prop, prop)
+            for bone_name, prop in self.prop_from_bone.items()
+        }
+
+        # an unassigned prop (chest, shoulder ...) is skipped.
+        # its children hang on the nearest assigned ancestor
+        self.parent_from_bone: Dict[str, str] = {}
+        self.children_from_bone: Dict[str, List[str]] = {}
+        for prop in PROP_ORDER:
+            bone_name = self.bone_from_prop.get(prop)
+            if not bone_name or self.prop_from_bone[bone_name] != prop:
+                continue
+            self.children_from_bone[bone_name] = []
+            parent_prop = get_parent(prop)
+            while parent_prop:
+                parent_name = self.bone_from_prop.get(parent_prop)
+                if parent_name and self.prop_from_bone[parent_name] == parent_prop:
+                    self.parent_from_bone[bone_name] = parent_name
+                    self.children_from_bone[parent_name].append(bone_name)
+                    break
+                parent_prop = get_parent(parent_prop)
+
+    def enum_bones(self) -> Iterable[Tuple[str, Optional[str]]]:
+        """
+        (bone name, parent bone name) reachable from hips. depth first order
+        """
+        hips = self.bone_from_prop.get("hips")
+        if not hips:
+            return
+        stack: List[Tuple[str, Optional[str]]] = [(hips, None)]
+        while stack:
+            bone_name, parent_name = stack.pop()
+            yield bone_name, parent_name
+            for child_name in reversed(self.children_from_bone[bone_name]):
+                stack.append((child_name, bone_name))
+
+    def flatten(self) -> Tuple[List[str], List[str], numpy.ndarray]:
+        """
+        bone names, humanBone names and parent indices in enum_bones order
+        """
+        bone_names = []
+        vrm_names = []
+        parent_indices = []
+        order = {}
+        for bone_name, parent_name in self.enum_bones():
+            order[bone_name] = len(bone_names)
+            bone_names.append(bone_name)
+            vrm_names.append(self.vrm_from_bone[bone_name])
+            parent_indices.append(order[parent_name] if parent_name else -1)
+        return bone_names, vrm_names, numpy.array(parent_indices, dtype=int)
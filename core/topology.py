@@ -0,0 +1,352 @@
+"""
+humanoid bone detection from the bone hierarchy and head positions.
+for rigs with meaningless names such as Bone.023.
+
+blender armature space. +x is left of the character, +z is up.
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+import numpy
+
+
+def unit(v: numpy.ndarray) -> numpy.ndarray:
+    length = numpy.linalg.norm(v)
+    return v / length if length > 1e-9 else numpy.zeros(3)
+
+
+class Signature(NamedTuple):
+    # bones in subtree including self
+    size: int
+    # longest chain below self
+    height: int
+    children: int
+
+
+class Match(NamedTuple):
+    bone: str
+    confidence: float
+
+
+class Skeleton:
+    """
+    parent index array with per bone subtree signatures.
+    signatures are computed once bottom up, so matching stays linear.
+    """
+
+    def __init__(
+        self,
+        names: Sequence[str],
+        parents: Sequence[int],
+        heads: Sequence[Tuple[float, float, float]],
+    ) -> None:
+        self.names = list(names)
+        self.parents = list(parents)
+        self.heads = list(heads)
+        count = len(self.names)
+        self.children: List[List[int]] = [[] for _ in range(count)]
+        for i, parent in enumerate(self.parents):
+            if parent >= 0:
+                self.children[parent].append(i)
+
+        # parent first order
+        order = []
+        stack = [i for i, parent in enumerate(self.parents) if parent < 0]
+        while stack:
+            i = stack.pop()
+            order.append(i)
+            stack.extend(self.children[i])
+
+        size = [1] * count
+        height = [0] * count
+        for i in reversed(order):
+            parent = self.parents[i]
+            if parent >= 0:
+                size[parent] += size[i]
+                height[parent] = max(height[parent], height[i] + 1)
+        self.signatures = [
+            Signature(size[i], height[i], len(self.children[i])) for i in range(count)
+        ]
+        # (bone, stop_branches) => chain. find_pair asks for the same chains
+        self._chains: Dict[Tuple[int, int], List[int]] = {}
+
+    def branches(self, i: int, min_height: int = 1) -> List[int]:
+        """
+        children that are chains, not end or helper bones
+        """
+        return [c for c in self.children[i] if self.signatures[c].height >= min_height]
+
+    def main_child(self, i: int) -> Optional[int]:
+        if not self.children[i]:
+            return None
+        return max(self.children[i], key=lambda c: self.signatures[c].size)
+
+    def chain(self, i: int, stop_branches: int = 3) -> List[int]:
+        """
+        follow the main child until a bone with stop_branches branches.
+        memoized. do not modify the returned list
+        """
+        key = (i, stop_branches)
+        cached = self._chains.get(key)
+        if cached is not None:
+            return cached
+        chain = [i]
+        self._chains[key] = chain
+        while True:
+            if len(self.branches(i)) >= stop_branches:
+                break
+            child = self.main_child(i)
+            if child is None:
+                break
+            chain.append(child)
+            i = child
+        return chain
+
+    def symmetry(self, a: int, b: int) -> float:
+        """
+        1.0 for mirrored subtrees of the same shape
+        """
+        sa = self.signatures[a]
+        sb = self.signatures[b]
+        ax, ay, az = self.heads[a]
+        bx, by, bz = self.heads[b]
+        if ax * bx >= 0:
+            return 0
+        shape = min(sa.size, sb.size) / max(sa.size, sb.size)
+        scale = max(abs(ax), abs(bx), 1e-6)
+        mirror = 1 - min(
+            (abs(ax + bx) + abs(ay - by) + abs(az - bz)) / (scale * 3), 1
+        )
+        return shape * mirror
+
+
+class TopologyMatcher:
+    def __init__(self, skeleton: Skeleton) -> None:
+        self.skeleton = skeleton
+        self.result: Dict[str, Match] = {}
+
+    def assign(self, prop: str, i: int, confidence: float):
+        self.result[prop] = Match(self.skeleton.names[i], round(confidence, 3))
+
+    def find_pair(
+        self, i: int, down: bool
+    ) -> Tuple[Optional[int], Optional[int], float]:
+        """
+        mirrored (left, right) branches of bone i going up or down
+        """
+        sk = self.skeleton
+        z = sk.heads[i][2]
+        best = (None, None, 0.0)
+        branches = sk.branches(i)
+        for a in branches:
+            for b in branches:
+                if sk.heads[a][0] <= 0 or sk.heads[b][0] >= 0:
+                    continue
+                # compare the tips of the chains
+                tip_a = sk.chain(a)[-1]
+                if (sk.heads[tip_a][2] < z) != down:
+                    continue
+                score = sk.symmetry(a, b)
+                if score > best[2]:
+                    best = (a, b, score)
+        return best
+
+    def find_hips(self) -> Tuple[Optional[int], float]:
+        sk = self.skeleton
+        best = None
+        best_score = 0.0
+        for i, signature in enumerate(sk.signatures):
+            if len(sk.branches(i)) < 3:
+                continue
+            _, _, legs = self.find_pair(i, down=True)
+            if legs <= 0:
+                continue
+            # prefer the junction that owns the whole body
+            score = legs * signature.size / len(sk.names)
+            if score > best_score:
+                best = i
+                best_score = score
+        return best, best_score
+
+    def match_chain(
+        self, props: Sequence[str], chain: Sequence[int], confidence: float
+    ):
+        """
+        assign chain bones from the root. a short chain lowers confidence
+        """
+        if len(chain) < len(props):
+            confidence *= len(chain) / len(props)
+        for prop, i in zip(props, chain):
+            self.assign(prop, i, confidence)
+
+    def _finger_direction(self, hand: int, root: int) -> numpy.ndarray:
+        sk = self.skeleton
+        tip = sk.chain(root, stop_branches=2)[-1]
+        if tip == root:
+            return unit(numpy.subtract(sk.heads[root], sk.heads[hand]))
+        return unit(numpy.subtract(sk.heads[tip], sk.heads[root]))
+
+    def find_thumb(
+        self, hand: int, roots: Sequence[int], forward: numpy.ndarray
+    ) -> Tuple[int, float]:
+        """
+        the root farthest from the other roots and pointing away from the arm.
+        returns the thumb and the margin to the next candidate (0-1)
+        """
+        sk = self.skeleton
+        heads = numpy.array([sk.heads[r] for r in roots], dtype=float)
+        distances = numpy.linalg.norm(heads[:, None] - heads[None], axis=2)
+        spread = distances.sum(axis=1) / max(len(roots) - 1, 1)
+        spread /= max(spread.max(), 1e-9)
+        deviation = numpy.array(
+            [1 - self._finger_direction(hand, r) @ forward for r in roots]
+        )
+        scores = spread + deviation
+        order = numpy.argsort(-scores)
+        if len(roots) < 2 or scores[order[0]] <= 0:
+            return roots[order[0]], 1.0
+        margin = (scores[order[0]] - scores[order[1]]) / scores[order[0]]
+        return roots[order[0]], float(margin)
+
+    def order_fingers(
+        self, thumb: int, others: Sequence[int], forward: numpy.ndarray
+    ) -> Tuple[List[int], float]:
+        """
+        index to little along the palm axis, the index next to the thumb.
+        returns the fingers and how clearly they are separated (0-1)
+        """
+        if len(others) < 2:
+            return list(others), 1.0
+        sk = self.skeleton
+        heads = numpy.array([sk.heads[r] for r in others], dtype=float)
+        center = heads.mean(axis=0)
+        # across the knuckles. the largest spread perpendicular to the arm
+        offsets = heads - center
+        offsets -= numpy.outer(offsets @ forward, forward)
+        _, vectors = numpy.linalg.eigh(offsets.T @ offsets)
+        axis = vectors[:, -1]
+        # the side of the thumb
+        thumb_chain = sk.chain(thumb, stop_branches=2)
+        side = numpy.add(sk.heads[thumb], sk.heads[thumb_chain[-1]]) / 2 - center
+        side = unit(side - (side @ forward) * forward)
+        if axis @ side < 0:
+            axis = -axis
+        projections = offsets @ axis
+        order = numpy.argsort(-projections)
+        gaps = -numpy.diff(projections[order])
+        mean_gap = gaps.mean()
+        if mean_gap <= 1e-9:
+            return [others[i] for i in order], 0.0
+        clarity = min(1.0, 2 * gaps.min() / mean_gap, abs(axis @ side) * 2)
+        return [others[i] for i in order], float(clarity)
+
+    def match_fingers(self, prefix: str, hand: int, confidence: float):
+        sk = self.skeleton
+        roots = sk.branches(hand)
+        if len(roots) < 5:
+            confidence *= len(roots) / 5
+        # lower arm to hand
+        parent = sk.parents[hand]
+        forward = numpy.zeros(3)
+        if parent >= 0:
+            forward = unit(numpy.subtract(sk.heads[hand], sk.heads[parent]))
+        if not forward.any():
+            forward = unit(sum(self._finger_direction(hand, r) for r in roots))
+        thumb, margin = self.find_thumb(hand, roots, forward)
+        fingers, clarity = self.order_fingers(
+            thumb, [r for r in roots if r != thumb], forward
+        )
+        # a close second thumb candidate or packed finger roots
+        confidence *= 0.5 + 0.5 * min(1.0, margin * 4, clarity)
+
+        names = ["thumb", "index", "middle", "ring", "little"]
+        for name, finger in zip(names, [thumb] + fingers):
+            if name == "thumb":
+                segments = ["metacarpal", "proximal", "distal"]
+            else:
+                segments = ["proximal", "intermediate", "distal"]
+            self.match_chain(
+                [f"{prefix}{name}_{segment}" for segment in segments],
+                sk.chain(finger, stop_branches=2),
+                confidence,
+            )
+
+    def match_arm(self, prefix: str, start: int, confidence: float):
+        sk = self.skeleton
+        chain = sk.chain(start)
+        hand = chain[-1]
+        arm = chain[:-1]
+        if len(sk.branches(hand)) < 3:
+            # no fingers. the end of a short chain is the hand
+            if len(chain) <= 3:
+                arm = chain[:-1]
+                hand = chain[-1]
+            else:
+                arm = chain[:3]
+                hand = chain[3]
+            confidence *= 0.7
+        if len(arm) >= 3:
+            self.match_chain(
+                [f"{prefix}shoulder", f"{prefix}upper_arm", f"{prefix}lower_arm"],
+                arm[-3:],
+                confidence,
+            )
+        else:
+            self.match_chain(
+                [f"{prefix}upper_arm", f"{prefix}lower_arm"],
+                arm,
+                confidence * 0.9,
+            )
+        self.assign(f"{prefix}hand", hand, confidence)
+        if len(sk.branches(hand)) >= 3:
+            self.match_fingers(prefix, hand, confidence)
+
+    def match(self) -> Dict[str, Match]:
+        sk = self.skeleton
+        hips, hips_score = self.find_hips()
+        if hips is None:
+            return self.result
+        confidence = min(1.0, hips_score * 2)
+        self.assign("hips", hips, confidence)
+
+        left_leg, right_leg, legs = self.find_pair(hips, down=True)
+        if left_leg is not None and right_leg is not None:
+            props = ["upper_leg", "lower_leg", "foot", "toes"]
+            self.match_chain(
+                [f"left_{prop}" for prop in props], sk.chain(left_leg), legs
+            )
+            self.match_chain(
+                [f"right_{prop}" for prop in props], sk.chain(right_leg), legs
+            )
+
+        # the branch going up
+        ups = [
+            c
+            for c in sk.branches(hips)
+            if c not in (left_leg, right_leg) and sk.heads[c][2] >= sk.heads[hips][2]
+        ]
+        if not ups:
+            return self.result
+        spine = max(ups, key=lambda c: sk.signatures[c].size)
+        torso = sk.chain(spine)
+        chest = torso[-1]
+        self.assign("spine", spine, confidence)
+        if chest != spine:
+            self.assign("chest", chest, confidence)
+
+        left_arm, right_arm, arms = self.find_pair(chest, down=False)
+        if left_arm is None or right_arm is None:
+            # A-pose. arms may go down
+            left_arm, right_arm, arms = self.find_pair(chest, down=True)
+        if left_arm is not None and right_arm is not None:
+            self.match_arm("left_", left_arm, arms)
+            self.match_arm("right_", right_arm, arms)
+
+        necks = [c for c in sk.branches(chest, 0) if c not in (left_arm, right_arm)]
+        if necks:
+            neck = max(necks, key=lambda c: sk.heads[c][2])
+            head_chain = sk.chain(neck, stop_branches=2)
+            self.assign("neck", neck, confidence)
+            if len(head_chain) > 1:
+                self.assign("head", head_chain[1], confidence)
+
+        return self.result
@@ -0,0 +1,346 @@
+"""
+VRMC_vrm_animation and UNIVRM_pose documents.
+
+blender side values are armature space arrays in the order of
+HumanIndex.flatten (hips first, parent before children).
+"""
+
+from typing import Dict, List, NamedTuple
+import math
+import numpy
+from . import pose_math
+from . import skeleton
+from .gltf import BinaryBuffer
+
+VRM_ANIMATION = "VRMC_vrm_animation"
+VRM_POSE = "UNIVRM_pose"
+# blender z-up to gltf y-up. unit length
+ZUP_ROTATION = [-math.sqrt(0.5), 0, 0, math.sqrt(0.5)]
+
+
+def new_pose_gltf() -> dict:
+    return {
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [
+            {
+                "name": "__zup__",
+                "rotation": ZUP_ROTATION,
+            }
+        ],
+        "asset": {"version": "2.0"},
+        "extensionsUsed": [VRM_ANIMATION, VRM_POSE],
+        "extensions": {
+            VRM_ANIMATION: {
+                "humanoid": {
+                    "humanBones": {},
+                },
+                "specVersion": "1.0",
+                "extras": {
+                    VRM_POSE: {
+                        "humanoid": {
+                            "translation": [0, 0, 0],
+                            "rotations": {},
+                        },
+                        "expressions": {
+                            "preset": {
+                                "happy": 1,
+                                "Aa": 1,
+                            }
+                        },
+                        "lookAt": {
+                            "position": [4, 5, 6],
+                        },
+                    },
+                },
+            },
+        },
+    }
+
+
+def get_human_bones(gltf: dict) -> dict:
+    return gltf["extensions"][VRM_ANIMATION]["humanoid"]["humanBones"]
+
+
+def get_pose(gltf: dict) -> dict:
+    return gltf["extensions"][VRM_ANIMATION]["extras"][VRM_POSE]["humanoid"]
+
+
+def add_tpose(
+    gltf: dict,
+    bone_names: List[str],
+    vrm_names: List[str],
+    parent_indices: numpy.ndarray,
+    rest_matrices: numpy.ndarray,
+    to_meter: float,
+):
+    """
+    rest_matrices: (n, 4, 4) row major armature space.
+    bone nodes are added under the z-up root node
+    """
+    local = pose_math.relative_matrices(rest_matrices, parent_indices)
+    t, r, _ = pose_math.decompose(local)
+    nodes = gltf["nodes"]
+    human_bones = get_human_bones(gltf)
+    base = len(nodes)
+    for i, bone_name in enumerate(bone_names):
+        parent = parent_indices[i]
+        gltf_parent = nodes[base + parent] if parent >= 0 else nodes[0]
+        gltf_parent.setdefault("children", []).append(base + i)
+        nodes.append(
+            {
+                "name": bone_name,
+                "translation": (t[i] * to_meter).tolist(),
+                "rotation": r[i].tolist(),
+            }
+        )
+        if vrm_names[i]:
+            # bone node mapping
+            human_bones[vrm_names[i]] = {"node": base + i}
+
+
+def set_pose(
+    gltf: dict,
+    vrm_names: List[str],
+    parent_indices: numpy.ndarray,
+    matrices: numpy.ndarray,
+    to_meter: float,
+):
+    """
+    matrices: (n, 4, 4) posed armature space. local rotations and hips translation
+    """
+    local = pose_math.relative_matrices(matrices, parent_indices)
+    t, r, _ = pose_math.decompose(local)
+    pose = get_pose(gltf)
+    for i, vrm_name in enumerate(vrm_names):
+        pose["rotations"][vrm_name] = r[i].tolist()
+        if vrm_name == "hips":
+            pose["translation"] = (t[i] * to_meter).tolist()
+
+
+def write_animation(
+    gltf: dict,
+    times: numpy.ndarray,
+    vrm_names: List[str],
+    rotations: numpy.ndarray,
+    translations: numpy.ndarray,
+) -> bytes:
+    """
+    times: (frames,) seconds. rotations: (len(vrm_names), frames, 4) local.
+    translations: (frames, 3) hips. returns glb
+    """
+    buffer = BinaryBuffer(gltf)
+    times_accessor = buffer.add_accessor(times, min_max=True)
+
+    channels = []
+    samplers = []
+
+    def add_channel(node: int, path: str, values: numpy.ndarray):
+        output = buffer.add_accessor(values)
+        channels.append(
+            {"sampler": len(samplers), "target": {"node": node, "path": path}}
+        )
+        samplers.append(
+            {"input": times_accessor, "output": output, "interpolation": "LINEAR"}
+        )
+
+    human_bones = get_human_bones(gltf)
+    for j, vrm_name in enumerate(vrm_names):
+        node = human_bones[vrm_name]["node"]
+        if vrm_name == "hips":
+            add_channel(node, "translation", translations)
+        add_channel(node, "rotation", rotations[j])
+
+    gltf["animations"] = [{"channels": channels, "samplers": samplers}]
+    return buffer.to_glb()
+
+
+def from_gltf_positions(positions: numpy.ndarray) -> numpy.ndarray:
+    """
+    glTF(y-up) => blender(z-up)
+    """
+    x, y, z = positions[..., 0], positions[..., 1], positions[..., 2]
+    return numpy.stack([x, -z, y], axis=-1)
+
+
+def from_gltf_rotations(rotations: numpy.ndarray) -> numpy.ndarray:
+    x, y, z, w = (
+        rotations[..., 0],
+        rotations[..., 1],
+        rotations[..., 2],
+        rotations[..., 3],
+    )
+    return numpy.stack([x, -z, y, w], axis=-1)
+
+
+class GltfSkeleton:
+    """
+    node hierarchy and humanBones of VRMC_vrm_animation
+    """
+
+    def __init__(self, gltf: dict) -> None:
+        nodes = gltf.get("nodes", [])
+        self.parents = [-1] * len(nodes)
+        for i, node in enumerate(nodes):
+            for child in node.get("children", []):
+                self.parents[child] = i
+
+        # parent first order
+        self.order: List[int] = []
+        stack = [i for i, parent in enumerate(self.parents) if parent < 0]
+        stack.reverse()
+        while stack:
+            i = stack.pop()
+            self.order.append(i)
+            stack.extend(reversed(nodes[i].get("children", [])))
+
+        count = len(nodes)
+        self.rest_translations = numpy.zeros((count, 3))
+        self.rest_rotations = numpy.zeros((count, 4))
+        self.rest_rotations[:, 3] = 1
+        self.rest_scales = numpy.ones((count, 3))
+        for i, node in enumerate(nodes):
+            if "matrix" in node:
+                m = numpy.array(node["matrix"], dtype=numpy.float64).reshape(4, 4).T
+                t, r, scale = pose_math.decompose(m[numpy.newaxis])
+                self.rest_translations[i] = t[0]
+                self.rest_rotations[i] = r[0]
+                self.rest_scales[i] = scale[0]
+            else:
+                self.rest_translations[i] = node.get("translation", (0, 0, 0))
+                self.rest_rotations[i] = node.get("rotation", (0, 0, 0, 1))
+                self.rest_scales[i] = node.get("scale", (1, 1, 1))
+        # documents written with rounded values, e.g. __zup__ of older versions
+        self.rest_rotations /= numpy.linalg.norm(self.rest_rotations, axis=1)[
+            :, numpy.newaxis
+        ]
+
+        # world matrices of rest pose
+        local = numpy.tile(numpy.eye(4), (count, 1, 1))
+        if count:
+            local[:, :3, :3] = (
+                pose_math.quat_to_mat3(self.rest_rotations)
+                * self.rest_scales[:, numpy.newaxis, :]
+            )
+        local[:, :3, 3] = self.rest_translations
+        self.rest_world = pose_math.forward_kinematics(
+            local, numpy.array(self.parents, dtype=int)
+        )
+        self.rest_world_rotations = numpy.zeros((count, 4))
+        if count:
+            self.rest_world_rotations = pose_math.normalized_mat3_to_quat(
+                pose_math.normalized_mat3(self.rest_world)
+            )
+
+        human_bones = (
+            gltf.get("extensions", {})
+            .get(VRM_ANIMATION, {})
+            .get("humanoid", {})
+            .get("humanBones", {})
+        )
+        self.human_bones: Dict[str, int] = {
+            vrm_name: value["node"] for vrm_name, value in human_bones.items()
+        }
+
+    def world_deltas(
+        self, local_rotations: Dict[int, numpy.ndarray]
+    ) -> Dict[str, numpy.ndarray]:
+        """
+        local_rotations: node => (frames, 4) posed local rotation.
+        returns humanBone => (frames, 4) world rotation from rest pose
+        in blender armature axes.
+        """
+        frames = 1
+        for values in local_rotations.values():
+            frames = values.shape[0]
+            break
+
+        world: Dict[int, numpy.ndarray] = {}
+        for i in self.order:
+            local = local_rotations.get(i)
+            if local is None:
+                local = numpy.broadcast_to(self.rest_rotations[i], (frames, 4))
+            parent = self.parents[i]
+            if parent >= 0:
+                world[i] = pose_math.quat_multiply(world[parent], local)
+            else:
+                world[i] = local
+
+        deltas = {}
+        for vrm_name, i in self.human_bones.items():
+            delta = pose_math.quat_multiply(
+                world[i], pose_math.quat_conjugate(self.rest_world_rotations[i])
+            )
+            deltas[vrm_name] = from_gltf_rotations(delta)
+        return deltas
+
+    def hips_positions(self, translations: numpy.ndarray) -> numpy.ndarray:
+        """
+        (frames, 3) hips local translation => blender armature space
+        """
+        parent = self.parents[self.human_bones["hips"]]
+        if parent >= 0:
+            m = self.rest_world[parent]
+            translations = translations @ m[:3, :3].T + m[:3, 3]
+        return from_gltf_positions(translations)
+
+
+def normalized_from_world_deltas(
+    deltas: Dict[str, numpy.ndarray],
+    vrm_names: List[str],
+    parent_indices: numpy.ndarray,
+    frames: int = 1,
+) -> numpy.ndarray:
+    """
+    humanBone => (frames, 4) world rotation from rest pose.
+    returns (frames, len(vrm_names), 4) VRM normalized local rotations.
+    bones not in deltas follow the parent.
+    """
+    identity = numpy.zeros((frames, 4))
+    identity[:, 3] = 1
+    world = []
+    rotations = numpy.empty((frames, len(vrm_names), 4))
+    for i, vrm_name in enumerate(vrm_names):
+        parent = parent_indices[i]
+        parent_world = world[parent] if parent >= 0 else identity
+        delta = deltas.get(vrm_name)
+        if delta is None:
+            delta = parent_world
+        world.append(delta)
+        rotations[:, i] = pose_math.quat_multiply(
+            pose_math.quat_conjugate(parent_world), delta
+        )
+    return rotations
+
+
+class ParsedPose(NamedTuple):
+    # humanBone => (1, 4) world rotation from rest pose
+    deltas: Dict[str, numpy.ndarray]
+    # (3,)
+    hips_position: numpy.ndarray
+    # humanBone names that are not VRM humanoid bones
+    unknown: List[str]
+
+
+def parse_pose(gltf: dict) -> ParsedPose:
+    """
+    UNIVRM_pose of new_pose_gltf. values are in blender armature space.
+    """
+    gltf_skeleton = GltfSkeleton(gltf)
+    pose = gltf["extensions"][VRM_ANIMATION]["extras"][VRM_POSE]["humanoid"]
+    local_rotations = {}
+    unknown = []
+    for vrm_name, rotation in pose.get("rotations", {}).items():
+        if vrm_name not in skeleton.HUMANBONE_TO_PROP and (
+            vrm_name not in skeleton.PROP_NAMES
+        ):
+            unknown.append(vrm_name)
+            continue
+        node = gltf_skeleton.human_bones.get(vrm_name)
+        if node is not None:
+            local_rotations[node] = numpy.array([rotation], dtype=numpy.float64)
+    deltas = gltf_skeleton.world_deltas(local_rotations)
+    translation = numpy.array(pose.get("translation", (0, 0, 0)), dtype=numpy.float64)
+    return ParsedPose(
+        deltas, gltf_skeleton.hips_positions(translation[numpy.newaxis])[0], unknown
+    )
@@ -1,7 +1,16 @@
-from typing import NamedTuple, Tuple, List
+from typing import Optional, Sequence, List
 import bpy
 import math
+import numpy
 from .humanoid_utils import get_or_create_editbone
+from .core.humanoid_layout import (
+    BONE_FROM_PROP,
+    Bone,
+    Proportions,
+    get_humanoid,
+    get_layout,
+    random_proportions,
+)
 
 ROLL_MAP = {
     "Shoulder.L": 90,
@@ -45,185 +54,34 @@ ROLL_MAP = {
 }
 
 
-class Bone(NamedTuple):
-    human_bone: str
-    head: Tuple[float, float, float]
-    children: List["Bone"] = []
-
-    def create(self, armature: bpy.types.Armature, parent: bpy.types.EditBone):
-        name = self.human_bone
-        if parent and self.human_bone == "tip":
-            name = parent.name + ".tip"
-
-        bone = get_or_create_editbone(armature, name)
-        bone.head = self.head
-        if parent:
-            bone.parent = parent
-            bone.head += parent.head
-        if bone.head.x > 0:
-            bone.name += ".L"
-        elif bone.head.x < 0:
-            bone.name += ".R"
-        bone.tail = bone.head
-        for i, child in enumerate(self.children):
-            child_bone = child.create(armature, bone)
-            if i == 0:
-                bone.tail = child_bone.head
-                child_bone.use_connect = True
-        return bone
-
-
-def get_finger(name: str, lr: float, y: float) -> Bone:
-    """
-    手首から指: 10
-    指: 5-3-2
-    親指: 5-4-3
-    """
-    base = lr / 10
-    return Bone(
-        f"{name}Proximal",
-        (base * 10, y, 0),
-        [
-            Bone(
-                f"{name}Intermediate",
-                (base * 5, 0, 0),
-                [
-                    Bone(
-                        f"{name}Distal",
-                        (base * 3, 0, 0),
-                        [Bone("tip", (base * 2, 0, 0))],
-                    )
-                ],
-            )
-        ],
-    )
-
-
-def get_thumb(x, y, z) -> Bone:
-    return Bone(
-        f"ThumbMetacarpal",
-        (0, 0, -0.02),
-        [
-            Bone(
-                f"ThumbProximal",
-                (x * 5, y * 5, z * 5),
-                [
-                    Bone(
-                        f"ThumbDistal",
-                        (x * 3, y * 3, z * 3),
-                        [Bone("tip", (x * 2, y * 2, z * 2))],
-                    )
-                ],
-            )
-        ],
-    )
-
-
-def get_arm(lr: float) -> Bone:
-    f = lr * 0.6
-    return Bone(
-        "Shoulder",
-        (lr * 0.1, 0, math.fabs(lr) * 2),
-        [
-            Bone(
-                "UpperArm",
-                (lr, 0, 0),
-                [
-                    Bone(
-                        "LowerArm",
-                        (lr * 2, 0, 0),
-                        [
-                            Bone(
-                                "Hand",
-                                (lr * 2, 0, 0),
-                                [
-                                    get_finger("Middle", f, 0),
-                                    get_finger("Index", f, -0.015),
-                                    get_finger("Ring", f, 0.015),
-                                    get_finger("Little", f, 0.03),
-                                    get_thumb(f / 10, -abs(f / 10), 0),
-                                ],
-                            )
-                        ],
-                    )
-                ],
-            )
-        ],
-    )
-
-
-def get_leg(tall: float, lr: float):
-    # upper 1
-    # lower 1
-    # foot 0.2
-    base = tall / 11
-    return Bone(
-        "UpperLeg",
-        (lr * base, 0, 0),
-        [
-            Bone(
-                "LowerLeg",
-                (0, 0, -base * 5),
-                [
-                    Bone(
-                        "Foot",
-                        (0, 0, -base * 5),
-                        [
-                            Bone(
-                                "Toes",
-                                (0, -base, -base),
-                                [Bone("tip", (0, -base, 0))],
-                            )
-                        ],
-                    )
-                ],
-            ),
-        ],
-    )
-
-
-def get_humanoid(tall: float):
-    head = tall / 6
-    # head=1
-    #
-    # neck  1
-    # chest 4
-    # spine 2
-    # hips  2
-    base = head * 2 / 9
-    return Bone(
-        "Hips",
-        (0, 0, tall / 2),
-        [
-            Bone(
-                "Spine",
-                (0, 0, base * 2),
-                [
-                    Bone(
-                        "Chest",
-                        (0, 0, base * 2),
-                        [
-                            Bone(
-                                "Neck",
-                                (0, 0, base * 4),
-                                [
-                                    Bone(
-                                        "Head",
-                                        (0, 0, base),
-                                        [Bone("tip", (0, 0, head))],
-                                    )
-                                ],
-                            ),
-                            get_arm(base * 2),
-                            get_arm(-base * 2),
-                        ],
-                    )
-                ],
-            ),
-            get_leg(tall / 2, 1),
-            get_leg(tall / 2, -1),
-        ],
-    )
+def create_bone(
+    bone: Bone, armature: bpy.types.Armature, parent: Optional[bpy.types.EditBone]
+) -> bpy.types.EditBone:
+    name = bone.human_bone
+    if parent and bone.human_bone == "tip":
+        name = parent.name + ".tip"
+
+    edit_bone = get_or_create_editbone(armature, name)
+    edit_bone.head = bone.head
+    if parent:
+        edit_bone.parent = parent
+        edit_bone.head += parent.head
+    if edit_bone.head.x > 0:
+        edit_bone.name += ".L"
+    elif edit_bone.head.x < 0:
+        edit_bone.name += ".R"
+    edit_bone.tail = edit_bone.head
+    for i, child in enumerate(bone.children):
+        child_bone = create_bone(child, armature, edit_bone)
+        if i == 0:
+            edit_bone.tail = child_bone.head
+            child_bone.use_connect = True
+    return edit_bone
+
+
+def assign_humanoid(armature: bpy.types.Armature):
+    for prop, name in BONE_FROM_PROP.items():
+        setattr(armature.humanoid, prop, name)
 
 
 def activate(context, obj):
@@ -254,7 +112,7 @@ def create(context):
     # root
     root = get_or_create_editbone(armature, "Root")
     root.tail = (0, 1, 0)
-    humanoid.create(armature, root)
+    create_bone(humanoid, armature, root)
 
     # fix roll
     def to_rad(degree: float) -> float:
@@ -270,61 +128,7 @@ def create(context):
         bpy.ops.object.mode_set(mode="OBJECT")
 
     # custom property
-    armature.humanoid.hips = "Hips"
-    armature.humanoid.spine = "Spine"
-    armature.humanoid.chest = "Chest"
-    armature.humanoid.neck = "Neck"
-    armature.humanoid.head = "Head"
-
-    armature.humanoid.left_shoulder = "Shoulder.L"
-    armature.humanoid.left_upper_arm = "UpperArm.L"
-    armature.humanoid.left_lower_arm = "LowerArm.L"
-    armature.humanoid.left_hand = "Hand.L"
-    armature.humanoid.right_shoulder = "Shoulder.R"
-    armature.humanoid.right_upper_arm = "UpperArm.R"
-    armature.humanoid.right_lower_arm = "LowerArm.R"
-    armature.humanoid.right_hand = "Hand.R"
-
-    armature.humanoid.left_upper_leg = "UpperLeg.L"
-    armature.humanoid.left_lower_leg = "LowerLeg.L"
-    armature.humanoid.left_foot = "Foot.L"
-    armature.humanoid.left_toes = "Toes.L"
-    armature.humanoid.right_upper_leg = "UpperLeg.R"
-    armature.humanoid.right_lower_leg = "LowerLeg.R"
-    armature.humanoid.right_foot = "Foot.R"
-    armature.humanoid.right_toes = "Toes.R"
-
-    armature.humanoid.left_thumb_metacarpal = "ThumbMetacarpal.L"
-    armature.humanoid.left_thumb_proximal = "ThumbProximal.L"
-    armature.humanoid.left_thumb_distal = "ThumbDistal.L"
-    armature.humanoid.left_index_proximal = "IndexProximal.L"
-    armature.humanoid.left_index_intermediate = "IndexIntermediate.L"
-    armature.humanoid.left_index_distal = "IndexDistal.L"
-    armature.humanoid.left_middle_proximal = "MiddleProximal.L"
-    armature.humanoid.left_middle_intermediate = "MiddleIntermediate.L"
-    armature.humanoid.left_middle_distal = "MiddleDistal.L"
-    armature.humanoid.left_ring_proximal = "RingProximal.L"
-    armature.humanoid.left_ring_intermediate = "RingIntermediate.L"
-    armature.humanoid.left_ring_distal = "RingDistal.L"
-    armature.humanoid.left_little_proximal = "LittleProximal.L"
-    armature.humanoid.left_little_intermediate = "LittleIntermediate.L"
-    armature.humanoid.left_little_distal = "LittleDistal.L"
-
-    armature.humanoid.right_thumb_metacarpal = "ThumbMetacarpal.R"
-    armature.humanoid.right_thumb_proximal = "ThumbProximal.R"
-    armature.humanoid.right_thumb_distal = "ThumbDistal.R"
-    armature.humanoid.right_index_proximal = "IndexProximal.R"
-    armature.humanoid.right_index_intermediate = "IndexIntermediate.R"
-    armature.humanoid.right_index_distal = "IndexDistal.R"
-    armature.humanoid.right_middle_proximal = "MiddleProximal.R"
-    armature.humanoid.right_middle_intermediate = "MiddleIntermediate.R"
-    armature.humanoid.right_middle_distal = "MiddleDistal.R"
-    armature.humanoid.right_ring_proximal = "RingProximal.R"
-    armature.humanoid.right_ring_intermediate = "RingIntermediate.R"
-    armature.humanoid.right_ring_distal = "RingDistal.R"
-    armature.humanoid.right_little_proximal = "LittleProximal.R"
-    armature.humanoid.right_little_intermediate = "LittleIntermediate.R"
-    armature.humanoid.right_little_distal = "LittleDistal.R"
+    assign_humanoid(armature)
 
     # to object mode
     mode = context.object.mode
@@ -333,6 +137,81 @@ def create(context):
         bpy.ops.object.mode_set(mode="OBJECT")
 
 
+def _build_bones(armature: bpy.types.Armature, heads: numpy.ndarray):
+    layout = get_layout()
+    edit_bones = armature.edit_bones
+    root = edit_bones.new("Root")
+    root.head = (0, 0, 0)
+    root.tail = (0, 1, 0)
+    bones = {}
+    for i in layout.bones:
+        bone = edit_bones.new(layout.names[i])
+        bone.head = heads[i]
+        bone.tail = heads[layout.tails[i]]
+        bones[i] = bone
+    for i, bone in bones.items():
+        parent = layout.parents[i]
+        bone.parent = bones[parent] if parent >= 0 else root
+        bone.use_connect = layout.connected[i]
+        roll = ROLL_MAP.get(bone.name)
+        if roll:
+            bone.roll = math.pi * roll / 180
+
+
+def create_humanoids(
+    context: bpy.types.Context,
+    table: Sequence[Proportions],
+    *,
+    columns: int = 10,
+    spacing: float = 1.0,
+) -> List[bpy.types.Object]:
+    """
+    one object per row. rows with the same proportions share the armature data.
+    all armatures are built in one multi object EDIT mode session
+    """
+    if not table:
+        return []
+    rows, inverse = numpy.unique(
+        numpy.array(table, dtype=float), axis=0, return_inverse=True
+    )
+    heads = get_layout().heads(rows)
+
+    armatures = []
+    for _ in rows:
+        armature = bpy.data.armatures.new("Humanoid")
+        armature.show_axes = True
+        armature.use_mirror_x = True
+        armature.display_type = "OCTAHEDRAL"
+        armatures.append(armature)
+
+    objects = []
+    for i, row in enumerate(inverse.reshape(-1).tolist()):
+        obj = bpy.data.objects.new("Humanoid", armatures[row])
+        obj.location = ((i % columns) * spacing, (i // columns) * spacing, 0)
+        context.scene.collection.objects.link(obj)
+        objects.append(obj)
+
+    # an owner per armature data enters EDIT mode together
+    for obj in context.selected_objects:
+        obj.select_set(False)
+    owners = {}
+    for obj in objects:
+        owners.setdefault(obj.data.name, obj)
+    for obj in owners.values():
+        obj.select_set(True)
+    context.view_layer.objects.active = objects[0]
+    bpy.ops.object.mode_set(mode="EDIT")
+    try:
+        for armature, bone_heads in zip(armatures, heads):
+            _build_bones(armature, bone_heads)
+    finally:
+        bpy.ops.object.mode_set(mode="OBJECT")
+
+    for armature in armatures:
+        assign_humanoid(armature)
+    return objects
+
+
 class CreateHumanoid(bpy.types.Operator):
     """CreateHumanoidArmature"""
 
@@ -349,3 +228,40 @@ class CreateHumanoid(bpy.types.Operator):
     def execute(self, context):
         create(context)
         return {"FINISHED"}
+
+
+class CreateHumanoidCrowd(bpy.types.Operator):
+    """Create humanoid armatures with random proportions"""
+
+    bl_idname = "humanoid.create_crowd"
+    bl_label = "Humanoid Crowd(VRM-1.0)"
+    bl_options = {"REGISTER", "UNDO"}
+    bl_icon = "COMMUNITY"
+    bl_menu = "VIEW3D_MT_armature_add"
+
+    count: bpy.props.IntProperty(name="count", default=10, min=1)
+    seed: bpy.props.IntProperty(name="seed", default=0)
+    height_min: bpy.props.FloatProperty(name="height min", default=1.4, min=0.1)
+    height_max: bpy.props.FloatProperty(name="height max", default=1.9, min=0.1)
+    variation: bpy.props.FloatProperty(
+        name="limb variation", default=0.1, min=0, max=0.9
+    )
+    columns: bpy.props.IntProperty(name="columns", default=10, min=1)
+    spacing: bpy.props.FloatProperty(name="spacing", default=1.0)
+
+    @classmethod
+    def poll(cls, context):
+        return context.mode == "OBJECT"
+
+    def execute(self, context):
+        table = random_proportions(
+            self.count,
+            self.seed,
+            (self.height_min, self.height_max),
+            self.variation,
+        )
+        objects = create_humanoids(
+            context, table, columns=self.columns, spacing=self.spacing
+        )
+        self.report({"INFO"}, f"{len(objects)} humanoids")
+        return {"FINISHED"}
@@ -0,0 +1,133 @@
+from typing import Optional
+import bpy
+import bpy_extras.io_utils
+import numpy
+from .copy_humanoid_pose import Builder
+from . import bone_map_cache
+from .core.vrma import VRM_ANIMATION, write_animation
+
+
+class AnimationBaker:
+    """
+    samples a frame range with Builder and stores it as VRMC_vrm_animation
+    """
+
+    def __init__(self, obj: bpy.types.Object, to_meter: float = 1) -> None:
+        self.obj = obj
+        self.builder = Builder(obj, to_meter)
+        self.builder.get_tpose()
+        # keep humanoid mapping. drop UNIVRM_pose
+        extension = self.builder.gltf["extensions"][VRM_ANIMATION]
+        del extension["extras"]
+        self.builder.gltf["extensionsUsed"] = [VRM_ANIMATION]
+        self.bone_names = list(self.builder.human_bones.keys())
+
+    def bake(
+        self,
+        scene: bpy.types.Scene,
+        frame_start: int,
+        frame_end: int,
+        step: int = 1,
+        depsgraph: Optional[bpy.types.Depsgraph] = None,
+    ):
+        if frame_end < frame_start:
+            raise ValueError(f"empty frame range: {frame_start}-{frame_end}")
+        if step < 1:
+            raise ValueError(f"frame step must be positive: {step}")
+        frames = list(range(frame_start, frame_end + 1, step))
+        count = len(frames)
+        self.times = numpy.array(frames, dtype=numpy.float32)
+        self.times -= frame_start
+        self.times *= scene.render.fps_base / scene.render.fps
+        self.rotations = numpy.empty((len(self.bone_names), count, 4), numpy.float32)
+        self.translations = numpy.empty((count, 3), numpy.float32)
+
+        # the builder sampler. flatten and rest matrices are not read twice
+        sampler = self.builder.sampler
+        columns = [sampler.vrm_names.index(bone_name) for bone_name in self.bone_names]
+
+        current = scene.frame_current
+        try:
+            for i, frame in enumerate(frames):
+                scene.frame_set(frame)
+                translation, rotations = sampler.sample(depsgraph)
+                self.rotations[:, i] = rotations[columns]
+                self.translations[i] = translation
+        finally:
+            scene.frame_set(current)
+
+    def to_glb(self) -> bytes:
+        return write_animation(
+            self.builder.gltf,
+            self.times,
+            self.bone_names,
+            self.rotations,
+            self.translations,
+        )
+
+
+def export_vrma(
+    obj: bpy.types.Object,
+    path: str,
+    frame_start: int,
+    frame_end: int,
+    *,
+    step: int = 1,
+    to_meter: float = 1,
+    scene: Optional[bpy.types.Scene] = None,
+):
+    if not scene:
+        scene = bpy.context.scene
+    baker = AnimationBaker(obj, to_meter)
+    baker.bake(scene, frame_start, frame_end, step)
+    with open(path, "wb") as w:
+        w.write(baker.to_glb())
+
+
+class ExportHumanoidVrma(bpy.types.Operator, bpy_extras.io_utils.ExportHelper):
+    """Bake humanoid pose of frame range to VRMC_vrm_animation"""
+
+    bl_idname = "humanoid.export_vrma"
+    bl_label = "Humanoid Animation (.vrma)"
+    bl_options = {"REGISTER"}
+    bl_menu = "TOPBAR_MT_file_export"
+
+    filename_ext = ".vrma"
+    filter_glob: bpy.props.StringProperty(default="*.vrma", options={"HIDDEN"})
+
+    frame_start: bpy.props.IntProperty(name="frame_start")
+    frame_end: bpy.props.IntProperty(name="frame_end")
+    frame_step: bpy.props.IntProperty(name="frame_step", default=1, min=1)
+
+    @classmethod
+    def poll(cls, context: bpy.types.Context) -> bool:
+        if context.active_object:
+            return isinstance(context.active_object.data, bpy.types.Armature)
+        return False
+
+    def invoke(self, context: bpy.types.Context, event):
+        self.frame_start = context.scene.frame_start
+        self.frame_end = context.scene.frame_end
+        return bpy_extras.io_utils.ExportHelper.invoke(self, context, event)
+
+    def execute(self, context: bpy.types.Context):
+        if self.frame_end < self.frame_start:
+            self.report(
+                {"ERROR"}, f"empty frame range: {self.frame_start}-{self.frame_end}"
+            )
+            return {"CANCELLED"}
+        export_vrma(
+            context.active_object,
+            self.filepath,
+            self.frame_start,
+            self.frame_end,
+            step=self.frame_step,
+            scene=context.scene,
+        )
+        # the mapping is confirmed by the export
+        try:
+            bone_map_cache.store(context.active_object.data)
+        except OSError as e:
+            self.report({"WARNING"}, f"bone map cache: {e}")
+        self.report({"INFO"}, f"export: {self.filepath}")
+        return {"FINISHED"}
@@ -1,6 +1,17 @@
 import bpy
+import json
+import os
+import re
 from .humanoid_properties import PROP_NAMES
-from typing import Optional
+from .core.bone_names import (
+    BUILTIN_PROFILES,
+    BoneNameIndex,
+    NamingProfile,
+    select_profile,
+)
+from . import guess_topology
+from . import bone_map_cache
+from typing import Optional, Dict, List
 
 
 VRM_MAP = {
@@ -120,47 +131,110 @@ RIGIFY_MAP = {
 }
 
 
-def guess_bone(armature: bpy.types.Armature, prop: str) -> Optional[str]:
-    if hasattr(armature, "vrm_addon_extension"):
-        vrm = armature.vrm_addon_extension
-        if hasattr(vrm, "vrm1"):
-            vrm1 = vrm.vrm1
-            if hasattr(vrm1, "humanoid"):
-                human_bones = vrm1.humanoid.human_bones
-                if hasattr(human_bones, prop):
-                    return getattr(human_bones, prop).node.get_bone_name()
-        elif hasattr(vrm, "vrm0"):
-            vrm0 = vrm.vrm0
-            if hasattr(vrm0, "humanoid"):
-                humanoid = vrm0.humanoid
-                vrm0_bone_name = VRM_MAP.get(prop)
-                for b in humanoid.human_bones:
-                    name = b.node.get_bone_name()
-                    # print(prop, name, b.bone)
-                    if b.bone == vrm0_bone_name:
-                        return name
-        raise Exception(f"{prop} not found")
+def get_vrm_bones(armature: bpy.types.Armature) -> Dict[str, str]:
+    """
+    prop => bone name from vrm_addon_extension. built in one pass
+    """
+    if not hasattr(armature, "vrm_addon_extension"):
+        return {}
+    vrm = armature.vrm_addon_extension
+    result = {}
+    if getattr(vrm, "spec_version", "1.0") != "0.0" and hasattr(vrm, "vrm1"):
+        human_bones = vrm.vrm1.humanoid.human_bones
+        for prop in PROP_NAMES:
+            if hasattr(human_bones, prop):
+                name = getattr(human_bones, prop).node.get_bone_name()
+                if name:
+                    result[prop] = name
+    elif hasattr(vrm, "vrm0"):
+        # vrm0 bone => blender bone
+        vrm0_bones = {}
+        for b in vrm.vrm0.humanoid.human_bones:
+            name = b.node.get_bone_name()
+            if name:
+                vrm0_bones[b.bone] = name
+        for prop in PROP_NAMES:
+            name = vrm0_bones.get(VRM_MAP.get(prop))
+            if name:
+                result[prop] = name
+    return {prop: name for prop, name in result.items() if name in armature.bones}
+
+
+def guess_bone(
+    armature: bpy.types.Armature,
+    prop: str,
+    vrm_bones: Optional[Dict[str, str]] = None,
+) -> Optional[str]:
+    if vrm_bones is None:
+        vrm_bones = get_vrm_bones(armature)
+    if prop in vrm_bones:
+        return vrm_bones[prop]
 
     bone_name = RIGIFY_MAP.get(prop)
     if bone_name in armature.bones:
         return bone_name
 
-    # fall back. name based search
-    tokens = prop.split("_")
-    search = tokens[-1].lower()
 
-    found = [bone.name for bone in armature.bones if search in bone.name.lower()]
-    if len(found) == 1:
-        return found[0]
-    if len(found) > 1:
-        if tokens[0] == "left":
-            for f in found:
-                if "left" in f.lower():
-                    return f
-        elif tokens[0] == "right":
-            for f in found:
-                if "right" in f.lower():
-                    return f
+PROFILES: Dict[str, NamingProfile] = {}
+
+
+# broken json, unknown prop, bad regex or "{...}" in a regex
+PROFILE_ERRORS = (OSError, ValueError, KeyError, IndexError, re.error)
+
+
+def register_profile(data: dict) -> NamingProfile:
+    profile = NamingProfile(data)
+    PROFILES[profile.name] = profile
+    return profile
+
+
+def load_profiles(path: str) -> List[NamingProfile]:
+    """
+    json file of a profile or a list of profiles. a directory of them.
+    a broken file in the directory is skipped
+    """
+    if os.path.isdir(path):
+        profiles = []
+        for name in sorted(os.listdir(path)):
+            if name.endswith(".json"):
+                file = os.path.join(path, name)
+                try:
+                    profiles += load_profiles(file)
+                except PROFILE_ERRORS as e:
+                    print(f"{file}: {e}")
+        return profiles
+    with open(path, encoding="utf-8") as r:
+        data = json.load(r)
+    if isinstance(data, dict):
+        data = [data]
+    # compile all before registering. a bad regex skips the whole file
+    profiles = [NamingProfile(item) for item in data]
+    for profile in profiles:
+        PROFILES[profile.name] = profile
+    return profiles
+
+
+def get_profiles() -> Dict[str, NamingProfile]:
+    if not PROFILES:
+        for data in BUILTIN_PROFILES:
+            register_profile(data)
+        register_profile({"name": "rigify", "bones": RIGIFY_MAP})
+        # user profiles override builtin
+        user = bpy.utils.user_resource("CONFIG", path="humanoid/profiles")
+        if os.path.isdir(user):
+            try:
+                load_profiles(user)
+            except PROFILE_ERRORS as e:
+                print(f"{user}: {e}")
+    return PROFILES
+
+
+def get_depths(armature: bpy.types.Armature) -> Dict[str, int]:
+    depths = {}
+    for bone in armature.bones:
+        # bones are ordered parent first
+        depths[bone.name] = depths[bone.parent.name] + 1 if bone.parent else 0
+    return depths
 
 
 class GuessHumanBones(bpy.types.Operator):
@@ -169,6 +243,12 @@ class GuessHumanBones(bpy.types.Operator):
     bl_options = {"REGISTER", "UNDO"}
 
     clear: bpy.props.BoolProperty(name="clear")
+    use_cache: bpy.props.BoolProperty(name="use_cache", default=True)
+    # naming profile. empty for auto
+    profile: bpy.props.StringProperty(name="profile")
+    min_confidence: bpy.props.FloatProperty(
+        name="min_confidence", default=0.5, min=0, max=1
+    )
 
     @classmethod
     def poll(cls, context: bpy.types.Context) -> bool:
@@ -183,11 +263,79 @@ class GuessHumanBones(bpy.types.Operator):
             for prop in PROP_NAMES:
                 setattr(humanoid, prop, "")
         else:
+            if self.use_cache:
+                # known skeleton
+                cached = bone_map_cache.lookup(armature)
+                if cached:
+                    for prop, bone in cached.items():
+                        if not getattr(humanoid, prop):
+                            setattr(humanoid, prop, bone)
+                    # keep the assignments made before the lookup
+                    self.store(armature)
+                    self.report({"INFO"}, "bone map from cache")
+                    return {"FINISHED"}
+
+            vrm_bones = get_vrm_bones(armature)
+            missing = []
             for prop in PROP_NAMES:
                 bone = getattr(humanoid, prop)
                 if not bone:
-                    bone = guess_bone(armature, prop)
+                    bone = guess_bone(armature, prop, vrm_bones)
                     if bone:
                         setattr(humanoid, prop, bone)
+                    else:
+                        missing.append(prop)
+            if vrm_bones and missing:
+                self.report({"INFO"}, f"not in vrm humanoid: {', '.join(missing)}")
+
+            if missing:
+                # naming convention of the rig
+                names = armature.bones.keys()
+                profile = (
+                    get_profiles().get(self.profile)
+                    if self.profile
+                    else select_profile(get_profiles().values(), names)
+                )
+                if profile:
+                    assigned = {getattr(humanoid, prop) for prop in PROP_NAMES}
+                    for prop, bone in profile.map_bones(names).items():
+                        if prop in missing and bone not in assigned:
+                            setattr(humanoid, prop, bone)
+                            assigned.add(bone)
+                    missing = [prop for prop in missing if not getattr(humanoid, prop)]
+                    self.report({"INFO"}, f"profile: {profile.name}")
+
+            if missing:
+                # fall back. name based search
+                assigned = [getattr(humanoid, prop) for prop in PROP_NAMES]
+                index = BoneNameIndex(armature.bones.keys(), get_depths(armature))
+                for prop, bone in index.match_all(missing, assigned).items():
+                    setattr(humanoid, prop, bone)
+                missing = [prop for prop in missing if not getattr(humanoid, prop)]
+
+            if missing:
+                # fall back. hierarchy and head positions
+                assigned = {getattr(humanoid, prop) for prop in PROP_NAMES}
+                matches = guess_topology.guess_by_topology(armature)
+                low = []
+                for prop in missing:
+                    match = matches.get(prop)
+                    if not match or match.bone in assigned:
+                        continue
+                    setattr(humanoid, prop, match.bone)
+                    assigned.add(match.bone)
+                    if match.confidence < self.min_confidence:
+                        low.append(f"{prop}({match.confidence:.2f})")
+                if low:
+                    self.report({"WARNING"}, f"low confidence: {', '.join(low)}")
+
+            if self.use_cache:
+                self.store(armature)
 
         return {"FINISHED"}
+
+    def store(self, armature: bpy.types.Armature):
+        try:
+            bone_map_cache.store(armature)
+        except OSError as e:
+            self.report({"WARNING"}, f"bone map cache: {e}")
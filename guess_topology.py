@@ -0,0 +1,23 @@
+"""
+topology matcher over the bones of a blender armature
+"""
+
+from typing import Dict
+import bpy
+from .core.topology import Match, Skeleton, TopologyMatcher
+
+
+def skeleton_from_armature(armature: bpy.types.Armature) -> Skeleton:
+    indices = {b.name: i for i, b in enumerate(armature.bones)}
+    return Skeleton(
+        [b.name for b in armature.bones],
+        [indices[b.parent.name] if b.parent else -1 for b in armature.bones],
+        [tuple(b.head_local) for b in armature.bones],
+    )
+
+
+def guess_by_topology(armature: bpy.types.Armature) -> Dict[str, Match]:
+    """
+    prop => (bone name, confidence 0-1)
+    """
+    return TopologyMatcher(skeleton_from_armature(armature)).match()
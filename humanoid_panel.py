@@ -1,7 +1,40 @@
+from typing import Dict, List
+import time
 import bpy
 from .copy_humanoid_pose import CopyHumanoidPose
+from .apply_humanoid_pose import PasteHumanoidPose
+from .export_vrma import ExportHumanoidVrma
+from . import vmc
 from .guess_human_bones import GuessHumanBones
+from .bone_map_cache import ExportBoneMapCache, ImportBoneMapCache
 from .add_humanoid_rig import AddHumanoidRig
+from . import humanoid_properties
+from . import constraint_index
+
+# left side represents the pair. PROP_ORDER is depth first
+FINGER_PROPS = [
+    prop
+    for prop in humanoid_properties.enum_subtree("left_hand")
+    if prop != "left_hand"
+]
+BODY_PROPS = [
+    prop
+    for prop in humanoid_properties.PROP_ORDER
+    if not prop.startswith("right_") and prop not in FINGER_PROPS
+]
+TORSO_PROPS = [
+    prop for prop in BODY_PROPS if humanoid_properties.get_mirror(prop) == prop
+]
+ARM_PROPS = [
+    prop
+    for prop in humanoid_properties.enum_subtree("left_shoulder")
+    if prop not in FINGER_PROPS
+]
+LEG_PROPS = list(humanoid_properties.enum_subtree("left_upper_leg"))
+RIGHT_FINGER_PROPS = [humanoid_properties.get_mirror(prop) for prop in FINGER_PROPS]
+
+# panel idname => last draw time in ms
+DRAW_TIMES: Dict[str, float] = {}
 
 
 class SelectPoseBone(bpy.types.Operator):
@@ -37,34 +70,17 @@ class ArmatureHumanoidPanel(bpy.types.Panel):
         if context.active_object:
             return isinstance(context.active_object.data, bpy.types.Armature)
 
-    def draw_bone(self, armature: bpy.types.Armature, bone: str):
-        self.layout.prop_search(armature.humanoid, bone, armature, "bones")
-
-    def draw_bone_lr(self, armature: bpy.types.Armature, bone: str):
-        split = self.layout.split(factor=0.24)
-        split.label(text=f"{bone}:")
-        split.column().prop_search(
-            armature.humanoid, f"left_{bone}", armature, "bones", text=""
-        )
-        split.column().prop_search(
-            armature.humanoid, f"right_{bone}", armature, "bones", text=""
-        )
+    def draw_status(self, armature: bpy.types.Armature):
+        index = humanoid_properties.get_index(armature)
+        assigned = len(index.bone_from_prop)
+        missing = len(humanoid_properties.PROP_NAMES) - assigned
+        row = self.layout.row()
+        row.label(text=f"assigned: {assigned}", icon="CHECKMARK")
+        row.label(text=f"missing: {missing}", icon="ERROR" if missing else "NONE")
 
     def draw(self, context):
         armature = context.active_object.data
-        self.draw_bone(armature, "hips")
-        self.draw_bone(armature, "spine")
-        self.draw_bone(armature, "chest")
-        self.draw_bone(armature, "neck")
-        self.draw_bone(armature, "head")
-        self.draw_bone_lr(armature, "shoulder")
-        self.draw_bone_lr(armature, "upper_arm")
-        self.draw_bone_lr(armature, "lower_arm")
-        self.draw_bone_lr(armature, "hand")
-        self.draw_bone_lr(armature, "upper_leg")
-        self.draw_bone_lr(armature, "lower_leg")
-        self.draw_bone_lr(armature, "foot")
-        self.draw_bone_lr(armature, "toes")
+        self.draw_status(armature)
 
         # guess
         btn = self.layout.operator(GuessHumanBones.bl_idname)
@@ -72,26 +88,45 @@ class ArmatureHumanoidPanel(bpy.types.Panel):
         # clear
         btn = self.layout.operator(GuessHumanBones.bl_idname, text="clear")
         btn.clear = True
+        # bone map cache
+        row = self.layout.row()
+        row.operator(ExportBoneMapCache.bl_idname, text="Export Cache")
+        row.operator(ImportBoneMapCache.bl_idname, text="Import Cache")
         # add rig
         self.layout.operator(AddHumanoidRig.bl_idname)
         # copy pose
         self.layout.operator(CopyHumanoidPose.bl_idname)
+        self.layout.operator(PasteHumanoidPose.bl_idname)
+        # bake frame range
+        self.layout.operator(ExportHumanoidVrma.bl_idname)
+        # live
+        sender = vmc.get_sender(context.active_object)
+        if sender and sender.is_running:
+            self.layout.operator(vmc.VmcSend.bl_idname, text="VMC Stop")
+            self.layout.label(
+                text=f"sent: {sender.packets_sent} dropped: {sender.frames_dropped}"
+            )
+        else:
+            self.layout.operator(vmc.VmcSend.bl_idname)
+        receiver = vmc.get_receiver(context.active_object)
+        if receiver and receiver.is_running:
+            self.layout.operator(vmc.VmcReceive.bl_idname, text="VMC Receive Stop")
+            self.layout.label(
+                text=f"received: {receiver.packets_received} "
+                f"applied: {receiver.frames_applied}"
+            )
+        else:
+            self.layout.operator(vmc.VmcReceive.bl_idname)
 
-        self.draw_bone_lr(armature, "thumb_metacarpal")
-        self.draw_bone_lr(armature, "thumb_proximal")
-        self.draw_bone_lr(armature, "thumb_distal")
-        self.draw_bone_lr(armature, "index_proximal")
-        self.draw_bone_lr(armature, "index_intermediate")
-        self.draw_bone_lr(armature, "index_distal")
-        self.draw_bone_lr(armature, "middle_proximal")
-        self.draw_bone_lr(armature, "middle_intermediate")
-        self.draw_bone_lr(armature, "middle_distal")
-        self.draw_bone_lr(armature, "ring_proximal")
-        self.draw_bone_lr(armature, "ring_intermediate")
-        self.draw_bone_lr(armature, "ring_distal")
-        self.draw_bone_lr(armature, "little_proximal")
-        self.draw_bone_lr(armature, "little_intermediate")
-        self.draw_bone_lr(armature, "little_distal")
+        # draw time of the sub panels. closed panels are not drawn
+        wm = context.window_manager
+        self.layout.prop(wm, "humanoid_show_draw_time")
+        if wm.humanoid_show_draw_time:
+            for panel in BONE_PANELS:
+                if panel.bl_idname in DRAW_TIMES:
+                    self.layout.label(
+                        text=f"{panel.bl_label}: {DRAW_TIMES[panel.bl_idname]:.2f}ms"
+                    )
 
         # constraint debug
         if context.mode == "POSE":
@@ -101,14 +136,91 @@ class ArmatureHumanoidPanel(bpy.types.Panel):
                 current = context.active_pose_bone.name
                 self.layout.label(text=f"active bone: {current}")
                 self.layout.label(text="referenced from ...")
-                for b in context.active_object.pose.bones:
-                    for c in b.constraints:
-                        for k in dir(c):
-                            t = getattr(c, k)
-                            if t == current:
-                                # self.layout.label(text=f"{b.name}.{k} => {t}")
-                                btn = self.layout.operator(
-                                    SelectPoseBone.bl_idname,
-                                    text=f"{b.name}.{c.name}.{k} =>",
-                                )
-                                btn.bone = b.name
+                for ref in constraint_index.find_references(
+                    context.active_object, current
+                ):
+                    btn = self.layout.operator(
+                        SelectPoseBone.bl_idname,
+                        text=f"{ref.bone}.{ref.constraint}.{ref.attribute} =>",
+                    )
+                    btn.bone = ref.bone
+
+
+class HumanoidBonesPanel(bpy.types.Panel):
+    """
+    bone mapping rows of a body part
+    """
+
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "UI"
+    bl_category = "Humanoid"
+    bl_parent_id = "OBJECT_PT_humanoid"
+    bl_options = {"DEFAULT_CLOSED"}
+
+    props: List[str] = []
+
+    def draw_bone(self, armature: bpy.types.Armature, bone: str):
+        self.layout.prop_search(armature.humanoid, bone, armature, "bones")
+
+    def draw_bone_lr(self, armature: bpy.types.Armature, bone: str):
+        split = self.layout.split(factor=0.24)
+        split.label(text=f"{bone}:")
+        split.column().prop_search(
+            armature.humanoid, f"left_{bone}", armature, "bones", text=""
+        )
+        split.column().prop_search(
+            armature.humanoid, f"right_{bone}", armature, "bones", text=""
+        )
+
+    def draw_prop(self, armature: bpy.types.Armature, prop: str):
+        """
+        center bone or left and right pair
+        """
+        i = humanoid_properties.PROP_INDEX[prop]
+        if humanoid_properties.MIRROR_INDICES[i] == i:
+            self.draw_bone(armature, prop)
+        else:
+            self.draw_bone_lr(armature, prop[len("left_") :])
+
+    def draw(self, context):
+        start = time.perf_counter()
+        armature = context.active_object.data
+        for prop in self.props:
+            self.draw_prop(armature, prop)
+        DRAW_TIMES[self.bl_idname] = (time.perf_counter() - start) * 1000
+
+
+class TorsoPanel(HumanoidBonesPanel):
+    bl_idname = "OBJECT_PT_humanoid_torso"
+    bl_label = "Torso"
+    props = TORSO_PROPS
+
+
+class ArmsPanel(HumanoidBonesPanel):
+    bl_idname = "OBJECT_PT_humanoid_arms"
+    bl_label = "Arms"
+    props = ARM_PROPS
+
+
+class LegsPanel(HumanoidBonesPanel):
+    bl_idname = "OBJECT_PT_humanoid_legs"
+    bl_label = "Legs"
+    props = LEG_PROPS
+
+
+class LeftHandPanel(HumanoidBonesPanel):
+    bl_idname = "OBJECT_PT_humanoid_left_hand"
+    bl_label = "Left Hand"
+    props = FINGER_PROPS
+
+    def draw_prop(self, armature: bpy.types.Armature, prop: str):
+        self.draw_bone(armature, prop)
+
+
+class RightHandPanel(LeftHandPanel):
+    bl_idname = "OBJECT_PT_humanoid_right_hand"
+    bl_label = "Right Hand"
+    props = RIGHT_FINGER_PROPS
+
+
+BONE_PANELS = [TorsoPanel, ArmsPanel, LegsPanel, LeftHandPanel, RightHandPanel]
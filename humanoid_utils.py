@@ -1,8 +1,39 @@
-from typing import Literal
-import contextlib
+from typing import Dict, Iterable, List, Literal, Tuple
 import bpy
 
 
+ConstraintType = Literal[
+    "CAMERA_SOLVER",
+    "FOLLOW_TRACK",
+    "OBJECT_SOLVER",
+    "COPY_LOCATION",
+    "COPY_ROTATION",
+    "COPY_SCALE",
+    "COPY_TRANSFORMS",
+    "LIMIT_DISTANCE",
+    "LIMIT_LOCATION",
+    "LIMIT_ROTATION",
+    "LIMIT_SCALE",
+    "MAINTAIN_VOLUME",
+    "TRANSFORM",
+    "TRANSFORM_CACHE",
+    "CLAMP_TO",
+    "DAMPED_TRACK",
+    "IK",
+    "LOCKED_TRACK",
+    "SPLINE_IK",
+    "STRETCH_TO",
+    "TRACK_TO",
+    "ACTION",
+    "ARMATURE",
+    "CHILD_OF",
+    "FLOOR",
+    "FOLLOW_PATH",
+    "PIVOT",
+    "SHRINKWRAP",
+]
+
+
 def prop_to_name(armature: bpy.types.Armature, prop: str) -> str | None:
     if hasattr(armature.humanoid, prop):
         return getattr(armature.humanoid, prop)
@@ -16,14 +47,6 @@ def get_human_bone(armature: bpy.types.Armature, prop: str) -> bpy.types.Bone:
         return armature.bones[prop]
 
 
-def get_human_editbone(armature: bpy.types.Armature, prop: str) -> bpy.types.EditBone:
-    name = prop_to_name(armature, prop)
-    if name:
-        return armature.edit_bones[name]
-    else:
-        return armature.edit_bones[prop]
-
-
 def get_human_posebone(obj: bpy.types.Object, prop: str) -> bpy.types.PoseBone:
     armature = obj.data
     assert isinstance(armature, bpy.types.Armature)
@@ -42,18 +65,16 @@ def get_or_create_editbone(
     return armature.edit_bones.new(name)
 
 
-@contextlib.contextmanager
-def enter_pose(obj: bpy.types.Object):
-    bpy.context.view_layer.objects.active = obj
-    if bpy.context.mode == "POSE":
-        yield
-    else:
-        bpy.ops.object.posemode_toggle()
-        try:
-            yield
-        finally:
-            bpy.context.view_layer.objects.active = obj
-            bpy.ops.object.posemode_toggle()
+def get_evaluated(
+    obj: bpy.types.Object, depsgraph: bpy.types.Depsgraph | None = None
+) -> bpy.types.Object:
+    """
+    evaluated object to read pose matrices without mode switch.
+    works from object mode, timers and background mode.
+    """
+    if not depsgraph:
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+    return obj.evaluated_get(depsgraph)
 
 
 def get_or_create_bone_collection(
@@ -64,58 +85,40 @@ def get_or_create_bone_collection(
     return armature.collections[name]
 
 
-def set_bone_collection(obj: bpy.types.Object, prop: str, group_name: str):
-    armature = obj.data
-    assert isinstance(armature, bpy.types.Armature)
-    collection = get_or_create_bone_collection(armature, group_name)
-    bone = get_human_bone(armature, prop)
-    collection.assign(bone)
-
-
 def get_or_create_constraint(
     armature_obj: bpy.types.Object,
     pose_bone_name: str | None,
-    constraint_type: Literal[
-        "CAMERA_SOLVER",
-        "FOLLOW_TRACK",
-        "OBJECT_SOLVER",
-        "COPY_LOCATION",
-        "COPY_ROTATION",
-        "COPY_SCALE",
-        "COPY_TRANSFORMS",
-        "LIMIT_DISTANCE",
-        "LIMIT_LOCATION",
-        "LIMIT_ROTATION",
-        "LIMIT_SCALE",
-        "MAINTAIN_VOLUME",
-        "TRANSFORM",
-        "TRANSFORM_CACHE",
-        "CLAMP_TO",
-        "DAMPED_TRACK",
-        "IK",
-        "LOCKED_TRACK",
-        "SPLINE_IK",
-        "STRETCH_TO",
-        "TRACK_TO",
-        "ACTION",
-        "ARMATURE",
-        "CHILD_OF",
-        "FLOOR",
-        "FOLLOW_PATH",
-        "PIVOT",
-        "SHRINKWRAP",
-    ],
+    constraint_type: ConstraintType,
     constraint_name: str = "",
-):
-    if not constraint_name:
-        constraint_name = constraint_type
-    if constraint_name in get_human_posebone(armature_obj, pose_bone_name).constraints:  # type: ignore
-        return get_human_posebone(armature_obj, pose_bone_name).constraints[
-            constraint_name
-        ]
-
-    armature = armature_obj.data
-    assert isinstance(armature, bpy.types.Armature)
-    armature.bones.active = get_human_bone(armature, pose_bone_name)
-    bpy.ops.pose.constraint_add(type=constraint_type)
-    return get_human_posebone(armature_obj, pose_bone_name).constraints[constraint_name]
+) -> bpy.types.Constraint:
+    """
+    pose_bone.constraints.new. no operator, works in object mode and background
+    """
+    return get_or_create_constraints(
+        armature_obj, [(pose_bone_name, constraint_type, constraint_name)]
+    )[0]
+
+
+def get_or_create_constraints(
+    armature_obj: bpy.types.Object,
+    specs: Iterable[Tuple[str, ConstraintType, str]],
+) -> List[bpy.types.Constraint]:
+    """
+    (pose bone name or prop, constraint type, constraint name) => constraint.
+    an empty name is the constraint type
+    """
+    pose_bones: Dict[str, bpy.types.PoseBone] = {}
+    constraints = []
+    for pose_bone_name, constraint_type, constraint_name in specs:
+        pose_bone = pose_bones.get(pose_bone_name)
+        if not pose_bone:
+            pose_bone = get_human_posebone(armature_obj, pose_bone_name)
+            pose_bones[pose_bone_name] = pose_bone
+        if not constraint_name:
+            constraint_name = constraint_type
+        c = pose_bone.constraints.get(constraint_name)
+        if not c:
+            c = pose_bone.constraints.new(constraint_type)
+            c.name = constraint_name
+        constraints.append(c)
+    return constraints
@@ -0,0 +1,162 @@
+from typing import Dict, Optional
+import bpy
+import bpy_extras.io_utils
+import numpy
+from .apply_humanoid_pose import PoseApplier
+from .core import pose_math
+from .core.gltf import read_glb, read_accessor, sample_channel, make_continuous
+from .core.vrma import GltfSkeleton
+
+
+def set_fcurve(
+    action: bpy.types.Action,
+    data_path: str,
+    index: int,
+    group: str,
+    frames: numpy.ndarray,
+    values: numpy.ndarray,
+):
+    fcurve = action.fcurves.find(data_path, index=index)
+    if fcurve:
+        action.fcurves.remove(fcurve)
+    fcurve = action.fcurves.new(data_path, index=index, action_group=group)
+    count = len(frames)
+    fcurve.keyframe_points.add(count)
+    co = numpy.empty(count * 2, dtype=numpy.float32)
+    co[0::2] = frames
+    co[1::2] = values
+    fcurve.keyframe_points.foreach_set("co", co)
+    fcurve.update()
+
+
+def import_vrma(
+    obj: bpy.types.Object,
+    path: str,
+    *,
+    frame_start: int = 1,
+    fps: Optional[float] = None,
+    to_meter: float = 1,
+    action_name: str = "",
+) -> bpy.types.Action:
+    with open(path, "rb") as r:
+        gltf, binary = read_glb(r.read())
+    if not gltf.get("animations"):
+        raise ValueError("no animation")
+    if not fps:
+        render = bpy.context.scene.render
+        fps = render.fps / render.fps_base
+
+    skeleton = GltfSkeleton(gltf)
+    animation = gltf["animations"][0]
+    samplers = animation["samplers"]
+
+    # uniform frame grid
+    end = 0.0
+    for sampler in samplers:
+        accessor = gltf["accessors"][sampler["input"]]
+        if "max" in accessor:
+            end = max(end, accessor["max"][0])
+        else:
+            end = max(end, read_accessor(gltf, binary, sampler["input"]).max())
+    frame_count = int(round(end * fps)) + 1
+    grid = numpy.arange(frame_count) / fps
+
+    local_rotations: Dict[int, numpy.ndarray] = {}
+    hips_translations = None
+    hips_node = skeleton.human_bones.get("hips")
+    for channel in animation["channels"]:
+        target = channel["target"]
+        node = target.get("node")
+        path_name = target["path"]
+        if path_name not in ("rotation", "translation"):
+            continue
+        if path_name == "translation" and node != hips_node:
+            continue
+        sampler = samplers[channel["sampler"]]
+        values = sample_channel(
+            read_accessor(gltf, binary, sampler["input"]),
+            read_accessor(gltf, binary, sampler["output"]),
+            sampler.get("interpolation", "LINEAR"),
+            grid,
+            path_name == "rotation",
+        )
+        if path_name == "rotation":
+            local_rotations[node] = values
+        else:
+            hips_translations = values
+
+    applier = PoseApplier(obj, to_meter)
+    deltas = skeleton.world_deltas(local_rotations)
+    basis = applier.to_basis(applier.from_world_deltas(deltas, frame_count))
+
+    if not obj.animation_data:
+        obj.animation_data_create()
+    action = bpy.data.actions.new(action_name or obj.name)
+    obj.animation_data.action = action
+
+    animated = {
+        vrm_name
+        for vrm_name, node in skeleton.human_bones.items()
+        if node in local_rotations
+    }
+    frames = numpy.arange(frame_count, dtype=numpy.float32) + frame_start
+    pose_bones = obj.pose.bones
+    for i, bone_name in enumerate(applier.bone_names):
+        if applier.vrm_names[i] not in animated:
+            # keep current pose
+            continue
+        pose_bone = pose_bones[bone_name]
+        q = make_continuous(basis[:, i])
+        mode = pose_bone.rotation_mode
+        if mode == "QUATERNION":
+            values = q[:, [3, 0, 1, 2]]
+            data_path = pose_bone.path_from_id("rotation_quaternion")
+        elif mode == "AXIS_ANGLE":
+            values = pose_math.quat_to_axis_angle(q)
+            data_path = pose_bone.path_from_id("rotation_axis_angle")
+        else:
+            values = numpy.unwrap(pose_math.quat_to_euler(q, mode), axis=0)
+            data_path = pose_bone.path_from_id("rotation_euler")
+        for j in range(values.shape[1]):
+            set_fcurve(action, data_path, j, bone_name, frames, values[:, j])
+
+    if hips_translations is not None:
+        positions = skeleton.hips_positions(hips_translations)
+        locations = (positions / to_meter - applier.rest_heads[0]) @ applier.hips_rest
+        hips_name = applier.bone_names[0]
+        data_path = pose_bones[hips_name].path_from_id("location")
+        for j in range(3):
+            set_fcurve(action, data_path, j, hips_name, frames, locations[:, j])
+
+    return action
+
+
+class ImportHumanoidVrma(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
+    """Import VRMC_vrm_animation to an Action of humanoid armature"""
+
+    bl_idname = "humanoid.import_vrma"
+    bl_label = "Humanoid Animation (.vrma)"
+    bl_options = {"REGISTER", "UNDO"}
+    bl_menu = "TOPBAR_MT_file_import"
+
+    filename_ext = ".vrma"
+    filter_glob: bpy.props.StringProperty(default="*.vrma", options={"HIDDEN"})
+
+    frame_start: bpy.props.IntProperty(name="frame_start", default=1)
+
+    @classmethod
+    def poll(cls, context: bpy.types.Context) -> bool:
+        if context.active_object:
+            return isinstance(context.active_object.data, bpy.types.Armature)
+        return False
+
+    def execute(self, context: bpy.types.Context):
+        try:
+            action = import_vrma(
+                context.active_object, self.filepath, frame_start=self.frame_start
+            )
+        except (ValueError, KeyError) as e:
+            self.report({"ERROR"}, f"{self.filepath}: {e}")
+            return {"CANCELLED"}
+        self.report({"INFO"}, f"import: {action.name}")
+        return {"FINISHED"}
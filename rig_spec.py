@@ -0,0 +1,247 @@
+"""
+declarative rig description.
+a rig is a list of RigPart. all parts are applied in one EDIT mode session
+and one POSE mode session.
+a hash of each part is stored on the armature, so a rebuild applies only
+the parts whose input changed.
+bones and constraints of parts that are no longer built are removed.
+each bone property is owned by one part.
+"""
+
+from typing import Callable, Dict, List, Tuple
+import json
+import bpy
+from .humanoid_utils import get_or_create_bone_collection, get_or_create_constraints
+from .core.rig_spec import (
+    DriverSpec,
+    RigPart,
+    Vector3,
+    find_conflicts,
+    parse_state,
+    plan_update,
+    record_state,
+)
+
+# armature custom property of the last build
+STATE_KEY = "humanoid_rig"
+# a part changes the rest pose that the next part is built from
+MAX_PASSES = 4
+
+
+def _apply_edit(armature: bpy.types.Armature, parts: List[RigPart]) -> List[str]:
+    """
+    returns the names of the new bones
+    """
+    edit_bones = armature.edit_bones
+    created = []
+    # create all first. parents may be defined later
+    for part in parts:
+        for spec in part.edit_bones:
+            if spec.name not in edit_bones:
+                edit_bones.new(spec.name)
+                created.append(spec.name)
+    for part in parts:
+        for spec in part.edit_bones:
+            bone = edit_bones[spec.name]
+            if spec.parent is not None:
+                bone.parent = edit_bones[spec.parent] if spec.parent else None
+            if spec.use_connect is not None:
+                bone.use_connect = spec.use_connect
+            if spec.head is not None:
+                bone.head = spec.head
+            if spec.tail is not None:
+                bone.tail = spec.tail
+            if spec.roll_from:
+                bone.roll = edit_bones[spec.roll_from].roll
+            if spec.use_inherit_rotation is not None:
+                bone.use_inherit_rotation = spec.use_inherit_rotation
+    return created
+
+
+def add_driver(obj: bpy.types.Object, owner, spec: DriverSpec):
+    owner.driver_remove(spec.data_path)
+    fcurve = owner.driver_add(spec.data_path)
+    driver = fcurve.driver
+    driver.type = "SCRIPTED"
+    for name, data_path in spec.variables:
+        var = driver.variables.new()
+        var.name = name
+        var.type = "SINGLE_PROP"
+        var.targets[0].id = obj
+        var.targets[0].data_path = data_path
+    driver.expression = spec.expression
+    return fcurve
+
+
+def find_python_drivers(obj: bpy.types.Object) -> List[str]:
+    """
+    data paths of the drivers that fall back to python.
+    those are slow and stop when auto run of python scripts is disabled
+    """
+    if not obj.animation_data:
+        return []
+    return [
+        fcurve.data_path
+        for fcurve in obj.animation_data.drivers
+        if fcurve.driver.type == "SCRIPTED"
+        and (fcurve.driver.use_self or not fcurve.driver.is_simple_expression)
+    ]
+
+
+def _apply_pose(obj: bpy.types.Object, parts: List[RigPart]):
+    armature = obj.data
+    pose_bones = obj.pose.bones
+    for part in parts:
+        for spec in part.pose_bones:
+            pose_bone = pose_bones[spec.name]
+            for key, value in spec.props:
+                setattr(pose_bone, key, value)
+            if spec.hide is not None:
+                pose_bone.bone.hide = spec.hide
+
+        constraints = get_or_create_constraints(
+            obj, [(spec.bone, spec.type, spec.name) for spec in part.constraints]
+        )
+        for spec, c in zip(part.constraints, constraints):
+            if hasattr(c, "target"):
+                c.target = obj
+            for key, value in spec.props:
+                if key == "pole_subtarget":
+                    c.pole_target = obj
+                setattr(c, key, value)
+            for driver in spec.drivers:
+                add_driver(obj, c, driver)
+
+        for spec in part.styles:
+            bone = armature.bones[spec.bone]
+            get_or_create_bone_collection(armature, spec.collection).assign(bone)
+            bone.color.palette = spec.palette
+
+
+def apply_rig(obj: bpy.types.Object, parts: List[RigPart]) -> List[str]:
+    """
+    one EDIT mode session for bones, one POSE mode session for the rest.
+    returns the names of the new bones
+    """
+    bpy.context.view_layer.objects.active = obj
+    mode = obj.mode
+    created = []
+    try:
+        if any(part.edit_bones for part in parts):
+            bpy.ops.object.mode_set(mode="EDIT")
+            created = _apply_edit(obj.data, parts)
+        bpy.ops.object.mode_set(mode="POSE")
+        _apply_pose(obj, parts)
+    finally:
+        bpy.ops.object.mode_set(mode=mode)
+    return created
+
+
+def remove_rig(
+    obj: bpy.types.Object, bones: List[str], constraints: List[Tuple[str, str]]
+):
+    """
+    constraints with their drivers, then bones
+    """
+    drivers = obj.animation_data.drivers if obj.animation_data else None
+    for bone, name in constraints:
+        pose_bone = obj.pose.bones.get(bone)
+        c = pose_bone.constraints.get(name) if pose_bone else None
+        if not c:
+            continue
+        if drivers:
+            prefix = f"{c.path_from_id()}."
+            for fcurve in [f for f in drivers if f.data_path.startswith(prefix)]:
+                drivers.remove(fcurve)
+        pose_bone.constraints.remove(c)
+    bones = [name for name in bones if name in obj.data.bones]
+    if not bones:
+        return
+    bpy.context.view_layer.objects.active = obj
+    mode = obj.mode
+    try:
+        bpy.ops.object.mode_set(mode="EDIT")
+        edit_bones = obj.data.edit_bones
+        for name in bones:
+            edit_bones.remove(edit_bones[name])
+    finally:
+        bpy.ops.object.mode_set(mode=mode)
+
+
+def load_state(armature: bpy.types.Armature) -> Dict[str, dict]:
+    return parse_state(armature.get(STATE_KEY, "{}"))
+
+
+def save_state(armature: bpy.types.Armature, state: Dict[str, dict]):
+    armature[STATE_KEY] = json.dumps(state)
+
+
+def is_built(obj: bpy.types.Object, part: RigPart) -> bool:
+    """
+    bones, constraints and drivers of the part exist
+    """
+    armature = obj.data
+    for spec in part.edit_bones:
+        if spec.name not in armature.bones:
+            return False
+    drivers = obj.animation_data.drivers if obj.animation_data else None
+    for spec in part.constraints:
+        pose_bone = obj.pose.bones.get(spec.bone)
+        if not pose_bone:
+            return False
+        c = pose_bone.constraints.get(spec.name)
+        if not c or c.type != spec.type:
+            return False
+        for driver in spec.drivers:
+            data_path = f"{c.path_from_id()}.{driver.data_path}"
+            if not drivers or not drivers.find(data_path):
+                return False
+    return True
+
+
+def update_rig(
+    obj: bpy.types.Object, build: Callable[[bpy.types.Object], List[RigPart]]
+) -> List[str]:
+    """
+    apply only the parts that changed since the last build or are missing.
+    returns the names of the applied parts.
+    raises ValueError if the parts still change after MAX_PASSES
+    """
+    state = load_state(obj.data)
+    owned = {bone for entry in state.values() for bone in entry["bones"]}
+    applied: List[str] = []
+    # the rig changes the rest pose (new parents, bent knees).
+    # build again until the spec of the current state is applied
+    for _ in range(MAX_PASSES):
+        parts = build(obj)
+        conflicts = find_conflicts(parts)
+        if conflicts:
+            raise ValueError(f"owned by two parts: {', '.join(conflicts)}")
+        plan = plan_update(state, parts, lambda part: is_built(obj, part))
+        if not plan.stale and not plan.dirty:
+            break
+        if plan.bones or plan.constraints:
+            remove_rig(obj, plan.bones, plan.constraints)
+            owned.difference_update(plan.bones)
+        if plan.dirty:
+            owned.update(apply_rig(obj, plan.dirty))
+        record_state(state, plan, owned)
+        applied += [part.name for part in plan.dirty if part.name not in applied]
+    else:
+        # keep what was applied. the next build starts from it
+        save_state(obj.data, state)
+        changed = [part.name for part in plan.dirty] + plan.stale
+        raise ValueError(
+            f"rig not stable after {MAX_PASSES} passes: {', '.join(changed)}"
+        )
+    save_state(obj.data, state)
+    return applied
+
+
+def get_rest(armature: bpy.types.Armature) -> Dict[str, Tuple[Vector3, Vector3]]:
+    """
+    bone name => (head, tail) in armature space. readable out of EDIT mode
+    """
+    return {
+        b.name: (tuple(b.head_local), tuple(b.tail_local)) for b in armature.bones
+    }
@@ -0,0 +1,56 @@
+"""
+core and batch_export are imported as top level modules, so the suite runs with
+plain CPython and without blender.
+
+    pip install -r tests/requirements.txt
+    python -m pytest
+"""
+
+import os
+import sys
+import numpy
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import pose_math, skeleton  # noqa: E402
+from core.humanoid_layout import BONE_FROM_PROP, Proportions, get_layout  # noqa: E402
+
+
+def random_quaternions(rng: numpy.random.Generator, count: int) -> numpy.ndarray:
+    """
+    (count, 4) unit quaternions. w >= 0
+    """
+    q = rng.normal(size=(count, 4))
+    q /= numpy.linalg.norm(q, axis=1, keepdims=True)
+    q[q[:, 3] < 0] *= -1
+    return q
+
+
+def same_rotation(a: numpy.ndarray, b: numpy.ndarray, atol: float = 1e-6) -> bool:
+    """
+    q and -q are the same rotation
+    """
+    dot = numpy.abs(numpy.sum(a * b, axis=-1))
+    return bool(numpy.all(numpy.abs(dot - 1) < atol))
+
+
+@pytest.fixture
+def rng() -> numpy.random.Generator:
+    return numpy.random.default_rng(0)
+
+
+@pytest.fixture
+def humanoid_rest(rng):
+    """
+    the default humanoid. bone names, humanBone names, parent indices and
+    (n, 4, 4) rest matrices in armature space with random bone rolls
+    """
+    layout = get_layout()
+    heads = layout.heads(numpy.array([Proportions()], dtype=float))[0]
+    positions = {name: heads[i] for i, name in enumerate(layout.names)}
+    bone_names, vrm_names, parents = skeleton.HumanIndex(BONE_FROM_PROP).flatten()
+    rest = numpy.tile(numpy.eye(4), (len(bone_names), 1, 1))
+    rest[:, :3, :3] = pose_math.quat_to_mat3(random_quaternions(rng, len(bone_names)))
+    rest[:, :3, 3] = [positions[name] for name in bone_names]
+    return bone_names, vrm_names, parents, rest
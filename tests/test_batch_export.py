@@ -0,0 +1,69 @@
+import os
+import sys
+import pytest
+import batch_export
+from batch_export import Job, make_jobs, run_job
+
+
+def test_make_jobs_keeps_directories(tmp_path):
+    blends = [str(tmp_path / "a" / "scene.blend"), str(tmp_path / "b" / "scene.blend")]
+    jobs = make_jobs(blends, "out", ".vrma")
+    assert [job.out for job in jobs] == [
+        os.path.join("out", "a", "scene.vrma"),
+        os.path.join("out", "b", "scene.vrma"),
+    ]
+
+
+def test_make_jobs_single_directory(tmp_path):
+    blend = str(tmp_path / "scene.blend")
+    jobs = make_jobs([blend], "out", ".vrma")
+    assert jobs == [Job(blend, os.path.join("out", "scene.vrma"))]
+
+
+def test_make_jobs_duplicate(tmp_path):
+    blend = str(tmp_path / "scene.blend")
+    same = os.path.join(str(tmp_path), ".", "scene.blend")
+    with pytest.raises(ValueError):
+        make_jobs([blend, same], "out", ".vrma")
+
+
+def fake_blender(tmp_path, body: str) -> str:
+    """
+    a shell script that counts its runs in calls.txt
+    """
+    path = tmp_path / "blender"
+    path.write_text(f"#!/bin/sh\necho x >> {tmp_path / 'calls.txt'}\n{body}\n")
+    path.chmod(0o755)
+    return str(path)
+
+
+def count_calls(tmp_path) -> int:
+    return len((tmp_path / "calls.txt").read_text().splitlines())
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="shell script as blender")
+@pytest.mark.parametrize(
+    "body, status, calls",
+    [
+        ("exit 0", "ok", 1),
+        (f"exit {batch_export.EXIT_MAPPING_ERROR}", "mapping_error", 1),
+        # python exception in the worker. deterministic
+        ("exit 2", "failed", 1),
+        ("kill -9 $$", "failed", 3),
+    ],
+)
+def test_run_job_retries_signals_only(tmp_path, body, status, calls):
+    blender = fake_blender(tmp_path, body)
+    result = run_job(blender, Job("scene.blend", "scene.vrma"), [], retries=2)
+    assert result.status == status
+    assert count_calls(tmp_path) == calls
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="shell script as blender")
+def test_run_job_retries_timeout(tmp_path):
+    blender = fake_blender(tmp_path, "exec sleep 10")
+    job = Job("scene.blend", "scene.vrma")
+    result = run_job(blender, job, [], retries=1, timeout=0.2)
+    assert result.status == "failed"
+    assert result.message.startswith("timeout")
+    assert count_calls(tmp_path) == 2
@@ -0,0 +1,202 @@
+from typing import Dict, List, Tuple
+import re
+import pytest
+from core import skeleton
+from core.bone_names import (
+    BUILTIN_PROFILES,
+    BoneNameIndex,
+    NamingProfile,
+    select_profile,
+    tokenize,
+)
+
+FINGERS = ["thumb", "index", "middle", "ring", "little"]
+
+# naming conventions of the synthetic rigs. "{s}" is the side
+CONVENTIONS: Dict[str, Tuple[Tuple[str, str], Dict[str, str]]] = {
+    "blender": (
+        ("L", "R"),
+        {
+            "hips": "hips",
+            "spine": "spine",
+            "chest": "chest",
+            "neck": "neck",
+            "head": "head",
+            "shoulder": "shoulder.{s}",
+            "upper_arm": "upper_arm.{s}",
+            "lower_arm": "forearm.{s}",
+            "hand": "hand.{s}",
+            "upper_leg": "thigh.{s}",
+            "lower_leg": "shin.{s}",
+            "foot": "foot.{s}",
+            "toes": "toe.{s}",
+            "finger": "{finger}.{n:02}.{s}",
+        },
+    ),
+    "game": (
+        ("l", "r"),
+        {
+            "hips": "pelvis",
+            "spine": "spine_01",
+            "chest": "spine_02",
+            "neck": "neck_01",
+            "head": "head",
+            "shoulder": "clavicle_{s}",
+            "upper_arm": "upperarm_{s}",
+            "lower_arm": "lowerarm_{s}",
+            "hand": "hand_{s}",
+            "upper_leg": "thigh_{s}",
+            "lower_leg": "calf_{s}",
+            "foot": "foot_{s}",
+            "toes": "ball_{s}",
+            "finger": "{finger}_{n:02}_{s}",
+        },
+    ),
+    "prefix": (
+        ("Left", "Right"),
+        {
+            "hips": "Hips",
+            "spine": "Spine",
+            "chest": "Chest",
+            "neck": "Neck",
+            "head": "Head",
+            "shoulder": "{s}Shoulder",
+            "upper_arm": "{s}Arm",
+            "lower_arm": "{s}ForeArm",
+            "hand": "{s}Hand",
+            "upper_leg": "{s}UpLeg",
+            "lower_leg": "{s}Leg",
+            "foot": "{s}Foot",
+            "toes": "{s}ToeBase",
+            "finger": "{s}Hand{Finger}{n}",
+        },
+    ),
+}
+# UE5 mannequin. metacarpals between the hand and the fingers except the thumb
+CONVENTIONS["ue5"] = CONVENTIONS["game"]
+FINGER_WORDS = {"ue5": {"little": "pinky"}}
+FINGER_EXTRA = {"ue5": "{finger}_metacarpal_{s}"}
+
+# non humanoid bones. helper words keep them behind the plain bones
+NOISE = [
+    "upperarm_twist_{k:02}_{s}",
+    "lowerarm_twist_{k:02}_{s}",
+    "thigh_twist_{k:02}_{s}",
+    "ik_hand_{s}_{k}",
+    "hair_{k:03}",
+    "skirt_{k:02}_{s}",
+    "cloth_{k:03}",
+    "face_{k:03}",
+    "prop_{k:03}",
+]
+
+
+def make_rig(convention: str, count: int) -> Tuple[List[str], Dict[str, str]]:
+    """
+    bone names and the expected prop => bone name
+    """
+    sides, table = CONVENTIONS[convention]
+    expected = {}
+    for prop in skeleton.PROP_NAMES:
+        side = None
+        body = prop
+        for i, prefix in enumerate(("left_", "right_")):
+            if prop.startswith(prefix):
+                side = sides[i]
+                body = prop[len(prefix) :]
+        finger, _, segment = body.partition("_")
+        if finger in FINGERS:
+            segments = (
+                ["metacarpal", "proximal", "distal"]
+                if finger == "thumb"
+                else ["proximal", "intermediate", "distal"]
+            )
+            word = FINGER_WORDS.get(convention, {}).get(finger, finger)
+            expected[prop] = table["finger"].format(
+                s=side,
+                finger=word,
+                Finger=word.capitalize(),
+                n=segments.index(segment) + 1,
+            )
+        else:
+            expected[prop] = table[body].format(s=side)
+
+    names = list(expected.values())
+    extra = FINGER_EXTRA.get(convention)
+    if extra:
+        for side in sides:
+            for finger in FINGERS[1:]:
+                word = FINGER_WORDS[convention].get(finger, finger)
+                names.append(extra.format(finger=word, s=side))
+    k = 0
+    while len(names) < count:
+        pattern = NOISE[k % len(NOISE)]
+        names.append(pattern.format(k=k, s=sides[k % 2]))
+        k += 1
+    return names, expected
+
+
+def accuracy(result: Dict[str, str], expected: Dict[str, str]) -> float:
+    hit = sum(1 for prop, bone in expected.items() if result.get(prop) == bone)
+    return hit / len(expected)
+
+
+def test_tokenize():
+    assert tokenize("mixamorig:LeftUpLeg") == ["mixamorig", "left", "up", "leg"]
+    assert tokenize("upperarm_twist_01_l") == ["upperarm", "twist", "01", "l"]
+    assert tokenize("DEF-upper_arm.L") == ["def", "upper", "arm", "l"]
+
+
+@pytest.mark.parametrize("convention", sorted(CONVENTIONS))
+@pytest.mark.parametrize("count", [50, 500, 5000])
+def test_index_accuracy(convention, count):
+    names, expected = make_rig(convention, count)
+    result = BoneNameIndex(names).match_all()
+    assert accuracy(result, expected) == 1, {
+        prop: (result.get(prop), bone)
+        for prop, bone in expected.items()
+        if result.get(prop) != bone
+    }
+
+
+@pytest.mark.benchmark(group="name index")
+@pytest.mark.parametrize("count", [50, 500, 5000])
+def test_index_benchmark(benchmark, count):
+    """
+    5000 bones should cost about 100 times 50 bones
+    """
+    names, _ = make_rig("game", count)
+    benchmark(lambda: BoneNameIndex(names).match_all())
+
+
+@pytest.mark.parametrize("data", BUILTIN_PROFILES, ids=lambda data: data["name"])
+def test_profile_maps_own_names(data):
+    profile = NamingProfile(data)
+    left, right = data.get("sides", ["Left", "Right"])
+    expected = {}
+    for key, bone in data["bones"].items():
+        if f"left_{key}" in skeleton.PROP_NAMES:
+            expected[f"left_{key}"] = bone.format(side=left)
+            expected[f"right_{key}"] = bone.format(side=right)
+        else:
+            expected[key] = bone
+    names = list(expected.values())
+    assert profile.map_bones(names) == expected
+    assert profile.score(names) == 1
+
+
+
+def test_select_profile():
+    profiles = [NamingProfile(data) for data in BUILTIN_PROFILES]
+    names, _ = make_rig("prefix", 0)
+    profile = select_profile(profiles, [f"mixamorig:{name}" for name in names])
+    assert profile and profile.name == "mixamo"
+    # a few generic names match every profile
+    names = ["head", "hand_l"] + [f"hair_{k:03}" for k in range(30)]
+    assert select_profile(profiles, names) is None
+    assert select_profile(profiles, []) is None
+
+
+def test_profile_bad_regex():
+    with pytest.raises(re.error):
+        NamingProfile({"name": "broken", "patterns": {"head": "(head"}})
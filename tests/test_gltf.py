@@ -0,0 +1,139 @@
+import struct
+import numpy
+import pytest
+from conftest import random_quaternions, same_rotation
+from core import gltf
+
+
+def test_glb_roundtrip(rng):
+    doc = {"asset": {"version": "2.0"}}
+    buffer = gltf.BinaryBuffer(doc)
+    times = numpy.linspace(0, 1, 7)
+    rotations = random_quaternions(rng, 7)
+    positions = rng.normal(size=(7, 3))
+    a = buffer.add_accessor(times, min_max=True)
+    b = buffer.add_accessor(rotations)
+    c = buffer.add_accessor(positions)
+    data = buffer.to_glb()
+    assert len(data) % 4 == 0
+
+    doc, binary = gltf.read_glb(data)
+    assert doc["accessors"][a]["min"] == [0]
+    assert doc["accessors"][a]["max"] == [1]
+    numpy.testing.assert_allclose(
+        gltf.read_accessor(doc, binary, a)[:, 0], times, atol=1e-7
+    )
+    numpy.testing.assert_allclose(
+        gltf.read_accessor(doc, binary, b), rotations, atol=1e-7
+    )
+    numpy.testing.assert_allclose(
+        gltf.read_accessor(doc, binary, c), positions, atol=1e-6
+    )
+
+
+def test_read_glb_rejects_version():
+    with pytest.raises(ValueError):
+        gltf.read_glb(struct.pack("<4sII", gltf.GLB_MAGIC, 1, 12))
+
+
+def test_read_accessor_interleaved_normalized():
+    # VEC4 int16 normalized with 4 padding bytes per item
+    values = numpy.array([[32767, 0, 0, 0], [0, -32767, 0, 0]], dtype=numpy.int16)
+    padding = numpy.zeros((2, 2), dtype=numpy.int16)
+    binary = numpy.concatenate([values, padding], axis=1).tobytes()
+    doc = {
+        "bufferViews": [{"buffer": 0, "byteLength": len(binary), "byteStride": 12}],
+        "accessors": [
+            {
+                "bufferView": 0,
+                "componentType": 5122,
+                "type": "VEC4",
+                "count": 2,
+                "normalized": True,
+            }
+        ],
+    }
+    numpy.testing.assert_allclose(
+        gltf.read_accessor(doc, binary, 0), [[1, 0, 0, 0], [0, -1, 0, 0]]
+    )
+
+
+def test_sample_channel_linear_and_step():
+    times = numpy.array([[0.0], [1.0]])
+    values = numpy.array([[0.0, 0, 0], [2.0, 0, 0]])
+    grid = numpy.array([-1, 0, 0.25, 0.5, 1, 2])
+    linear = gltf.sample_channel(times, values, "LINEAR", grid, False)
+    numpy.testing.assert_allclose(linear[:, 0], [0, 0, 0.5, 1, 2, 2])
+    step = gltf.sample_channel(times, values, "STEP", grid, False)
+    numpy.testing.assert_allclose(step[:, 0], [0, 0, 0, 0, 2, 2])
+
+
+def test_sample_channel_cubic_uses_values():
+    times = numpy.array([[0.0], [1.0]])
+    tangent = numpy.full((1, 3), 100.0)
+    values = numpy.concatenate(
+        [tangent, [[0.0, 0, 0]], tangent, tangent, [[1.0, 0, 0]], tangent]
+    )
+    grid = numpy.array([0.5])
+    result = gltf.sample_channel(times, values, "CUBICSPLINE", grid, False)
+    numpy.testing.assert_allclose(result, [[0.5, 0, 0]])
+
+
+def test_sample_channel_rotation_shortest_path():
+    times = numpy.array([[0.0], [1.0]])
+    s = numpy.sqrt(0.5)
+    # the second key is in the other hemisphere
+    values = numpy.array([[0, 0, 0, 1.0], [0, 0, -s, -s]])
+    result = gltf.sample_channel(times, values, "LINEAR", numpy.array([0.5]), True)
+    angle = numpy.pi / 8
+    expected = numpy.array([[0, 0, numpy.sin(angle), numpy.cos(angle)]])
+    assert same_rotation(result, expected)
+
+
+def test_make_continuous(rng):
+    q = random_quaternions(rng, 16)
+    flipped = q * numpy.where(rng.random(16) < 0.5, -1, 1)[:, numpy.newaxis]
+    result = gltf.make_continuous(flipped)
+    assert same_rotation(result, q)
+    assert numpy.all(numpy.sum(result[1:] * result[:-1], axis=1) >= 0)
+
+
+@pytest.fixture
+def clip(rng):
+    """
+    55 bones x 2000 frames. 110k rotation keys
+    """
+    frames = 2000
+    doc = {"asset": {"version": "2.0"}}
+    buffer = gltf.BinaryBuffer(doc)
+    times = buffer.add_accessor(numpy.arange(frames) / 30, min_max=True)
+    outputs = [
+        buffer.add_accessor(random_quaternions(rng, frames)) for _ in range(55)
+    ]
+    return buffer.to_glb(), times, outputs
+
+
+@pytest.mark.benchmark(group="import")
+def test_import_clip_benchmark(benchmark, clip):
+    """
+    the bpy free part of Import VRMA: read, resample and make continuous.
+    writing the fcurves with foreach_set needs blender and is not measured
+    here, neither is keyframe_insert
+    """
+    data, times_index, outputs = clip
+
+    def read():
+        doc, binary = gltf.read_glb(data)
+        times = gltf.read_accessor(doc, binary, times_index)
+        grid = numpy.arange(0, times[-1, 0], 1 / 30)
+        return [
+            gltf.make_continuous(
+                gltf.sample_channel(
+                    times, gltf.read_accessor(doc, binary, i), "LINEAR", grid, True
+                )
+            )
+            for i in outputs
+        ]
+
+    channels = benchmark(read)
+    assert len(channels) == 55
@@ -0,0 +1,72 @@
+import numpy
+import pytest
+from core import skeleton
+from core.humanoid_layout import (
+    BONE_FROM_PROP,
+    Proportions,
+    get_humanoid,
+    get_layout,
+    random_proportions,
+)
+
+
+def walk_heads(bone, parent=(0, 0, 0)):
+    """
+    get_humanoid heads by recursion. the reference for the flat layout
+    """
+    head = numpy.add(parent, bone.head)
+    yield head
+    for child in bone.children:
+        yield from walk_heads(child, head)
+
+
+def test_layout_matches_tree():
+    layout = get_layout()
+    for height in (1.0, 1.6, 1.85):
+        table = numpy.array([Proportions(height)], dtype=float)
+        expected = numpy.array(list(walk_heads(get_humanoid(height))))
+        numpy.testing.assert_allclose(layout.heads(table)[0], expected, atol=1e-12)
+
+
+def test_layout_names():
+    layout = get_layout()
+    for prop in skeleton.PROP_NAMES:
+        assert BONE_FROM_PROP[prop] in layout.names
+    for i in layout.bones:
+        assert not layout.names[i].endswith(".tip")
+        assert layout.tails[i] > i
+
+
+def test_limb_ratios():
+    layout = get_layout()
+    base, long_arm = layout.heads(
+        numpy.array([Proportions(), Proportions(arm=1.5)], dtype=float)
+    )
+    upper = layout.names.index("LowerArm.L")
+    hand = layout.names.index("Hand.L")
+    numpy.testing.assert_allclose(
+        numpy.linalg.norm(long_arm[hand] - long_arm[upper]),
+        numpy.linalg.norm(base[hand] - base[upper]) * 1.5,
+    )
+    leg = layout.names.index("LowerLeg.L")
+    numpy.testing.assert_allclose(long_arm[leg], base[leg])
+
+
+def test_random_proportions():
+    table = random_proportions(100, seed=1, height=(1.5, 1.7), variation=0.1)
+    assert len(table) == 100
+    assert all(1.5 <= row.height <= 1.7 for row in table)
+    assert all(0.9 <= row.arm <= 1.1 for row in table)
+    assert table == random_proportions(100, seed=1, height=(1.5, 1.7), variation=0.1)
+
+
+@pytest.mark.benchmark(group="crowd")
+def test_crowd_heads_benchmark(benchmark):
+    """
+    bone heads of 1000 armatures. creating the armatures needs blender and is
+    not measured here
+    """
+    table = numpy.array(random_proportions(1000), dtype=float)
+    layout = get_layout()
+    heads = benchmark(layout.heads, table)
+    assert heads.shape == (1000, len(layout.names), 3)
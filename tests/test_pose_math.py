@@ -0,0 +1,221 @@
+import numpy
+import pytest
+from conftest import random_quaternions, same_rotation
+from core import pose_math, skeleton, vrma
+from core.humanoid_layout import BONE_FROM_PROP
+
+
+def make_matrices(rotations: numpy.ndarray, translations: numpy.ndarray):
+    m = numpy.tile(numpy.eye(4), (len(rotations), 1, 1))
+    m[:, :3, :3] = pose_math.quat_to_mat3(rotations)
+    m[:, :3, 3] = translations
+    return m
+
+
+def test_quat_to_mat3_roundtrip(rng):
+    q = random_quaternions(rng, 256)
+    m = pose_math.quat_to_mat3(q)
+    assert same_rotation(pose_math.normalized_mat3_to_quat(m), q)
+
+
+@pytest.mark.parametrize(
+    "q",
+    [
+        (0, 0, 0, 1),
+        # half turns select each diagonal branch
+        (1, 0, 0, 0),
+        (0, 1, 0, 0),
+        (0, 0, 1, 0),
+    ],
+)
+def test_normalized_mat3_to_quat_branches(q):
+    q = numpy.array([q], dtype=numpy.float64)
+    result = pose_math.normalized_mat3_to_quat(pose_math.quat_to_mat3(q))
+    assert same_rotation(result, q)
+    assert result[0, 3] >= 0
+
+
+def test_decompose(rng):
+    q = random_quaternions(rng, 64)
+    t = rng.normal(size=(64, 3))
+    s = rng.uniform(0.5, 2, size=(64, 3))
+    m = make_matrices(q, t)
+    m[:, :3, :3] *= s[:, numpy.newaxis, :]
+    translation, rotation, scale = pose_math.decompose(m)
+    numpy.testing.assert_allclose(translation, t)
+    numpy.testing.assert_allclose(scale, s)
+    assert same_rotation(rotation, q)
+
+
+def test_relative_matrices_and_forward_kinematics(rng):
+    parents = numpy.array([-1, 0, 1, 1, 0, 4])
+    local = make_matrices(random_quaternions(rng, 6), rng.normal(size=(6, 3)))
+    world = pose_math.forward_kinematics(local, parents)
+    numpy.testing.assert_allclose(world[2], world[1] @ local[2])
+    numpy.testing.assert_allclose(world[5], local[0] @ local[4] @ local[5])
+    numpy.testing.assert_allclose(
+        pose_math.relative_matrices(world, parents), local, atol=1e-12
+    )
+
+
+def test_quat_multiply_conjugate(rng):
+    a = random_quaternions(rng, 32)
+    b = random_quaternions(rng, 32)
+    ab = pose_math.quat_multiply(a, b)
+    numpy.testing.assert_allclose(
+        pose_math.quat_to_mat3(ab),
+        pose_math.quat_to_mat3(a) @ pose_math.quat_to_mat3(b),
+        atol=1e-12,
+    )
+    identity = pose_math.quat_multiply(a, pose_math.quat_conjugate(a))
+    numpy.testing.assert_allclose(
+        identity, numpy.tile([0, 0, 0, 1.0], (32, 1)), atol=1e-12
+    )
+
+
+def axis_matrix(axis: int, angle: numpy.ndarray) -> numpy.ndarray:
+    c = numpy.cos(angle)
+    s = numpy.sin(angle)
+    m = numpy.tile(numpy.eye(3), (len(angle), 1, 1))
+    i, j = (axis + 1) % 3, (axis + 2) % 3
+    m[:, i, i] = c
+    m[:, j, j] = c
+    m[:, j, i] = s
+    m[:, i, j] = -s
+    return m
+
+
+@pytest.mark.parametrize("order", sorted(pose_math.EULER_ORDERS))
+def test_quat_to_euler(rng, order):
+    q = random_quaternions(rng, 128)
+    e = pose_math.quat_to_euler(q, order)
+    # the first axis of the order is applied first
+    axes = ["XYZ".index(c) for c in order]
+    m = numpy.tile(numpy.eye(3), (len(q), 1, 1))
+    for axis in axes:
+        m = axis_matrix(axis, e[:, axis]) @ m
+    numpy.testing.assert_allclose(m, pose_math.quat_to_mat3(q), atol=1e-9)
+
+
+def test_quat_to_axis_angle(rng):
+    q = random_quaternions(rng, 64)
+    axis_angle = pose_math.quat_to_axis_angle(q)
+    half = axis_angle[:, 0:1] / 2
+    xyz = axis_angle[:, 1:] * numpy.sin(half)
+    numpy.testing.assert_allclose(
+        numpy.concatenate([xyz, numpy.cos(half)], axis=1), q, atol=1e-9
+    )
+    identity = pose_math.quat_to_axis_angle(numpy.array([[0, 0, 0, 1.0]]))
+    numpy.testing.assert_allclose(identity, [[0, 0, 1, 0]])
+
+
+def test_normalized_local_rotations(rng):
+    parents = numpy.array([-1, 0, 1])
+    rest = pose_math.quat_to_mat3(random_quaternions(rng, 3))
+    delta = random_quaternions(rng, 1)
+    # the whole chain rotated by the root delta
+    pose = pose_math.quat_to_mat3(delta) @ rest
+    local = pose_math.normalized_local_rotations(pose, rest, parents)
+    assert same_rotation(local[0:1], delta)
+    assert same_rotation(local[1:], numpy.array([[0, 0, 0, 1.0]] * 2))
+
+
+#
+# pose capture. one batch for all bones against the per bone path
+#
+def per_bone_capture(matrices: numpy.ndarray, parents: numpy.ndarray):
+    translations = []
+    rotations = []
+    for i, parent in enumerate(parents):
+        m = matrices[i]
+        if parent >= 0:
+            m = numpy.linalg.inv(matrices[parent]) @ m
+        t, r, _ = pose_math.decompose(m[numpy.newaxis])
+        translations.append(t[0])
+        rotations.append(r[0])
+    return numpy.array(translations), numpy.array(rotations)
+
+
+def batch_capture(matrices: numpy.ndarray, parents: numpy.ndarray):
+    t, r, _ = pose_math.decompose(pose_math.relative_matrices(matrices, parents))
+    return t, r
+
+
+@pytest.fixture
+def pose_matrices(rng):
+    parents = numpy.array([-1] + [i // 2 for i in range(54)])
+    local = make_matrices(random_quaternions(rng, 55), rng.normal(size=(55, 3)))
+    return pose_math.forward_kinematics(local, parents), parents
+
+
+def test_batch_capture_matches_per_bone(pose_matrices):
+    matrices, parents = pose_matrices
+    t0, r0 = per_bone_capture(matrices, parents)
+    t1, r1 = batch_capture(matrices, parents)
+    numpy.testing.assert_allclose(t1, t0, atol=1e-9)
+    numpy.testing.assert_allclose(r1, r0, atol=1e-9)
+
+
+@pytest.mark.benchmark(group="capture")
+@pytest.mark.parametrize("capture", [per_bone_capture, batch_capture])
+def test_capture_benchmark(benchmark, pose_matrices, capture):
+    matrices, parents = pose_matrices
+    benchmark(capture, matrices, parents)
+
+
+def make_pose_buffer(humanoid_rest, rng, extra: int):
+    """
+    pose bone names and a foreach_get("matrix") buffer of an armature with
+    extra non humanoid bones. the humanoid bones are mixed into them
+    """
+    bone_names, _, _, rest = humanoid_rest
+    posed = rest.copy()
+    posed[:, :3, :3] = pose_math.quat_to_mat3(random_quaternions(rng, len(rest)))
+    names = bone_names + [f"extra_{i:04}" for i in range(extra)]
+    matrices = numpy.tile(numpy.eye(4), (len(names), 1, 1))
+    matrices[: len(rest)] = posed
+    order = rng.permutation(len(names))
+    names = [names[i] for i in order]
+    buffer = matrices[order].transpose(0, 2, 1).reshape(-1).astype(numpy.float32)
+    return names, buffer
+
+
+def capture_pose(index: skeleton.HumanIndex, names, buffer) -> dict:
+    """
+    PoseSampler and Builder.get_current_pose of one copy. the index is cached
+    per armature
+    """
+    bone_names, vrm_names, parents = index.flatten()
+    matrices = pose_math.select_matrices(
+        buffer, pose_math.bone_indices(names, bone_names)
+    )
+    doc = vrma.new_pose_gltf()
+    vrma.set_pose(doc, vrm_names, parents, matrices, 1)
+    return vrma.get_pose(doc)
+
+
+def test_capture_ignores_extra_bones(humanoid_rest):
+    index = skeleton.HumanIndex(BONE_FROM_PROP)
+    poses = []
+    for extra in (0, 2000):
+        # same humanoid pose. a different mix of extra bones
+        rng = numpy.random.default_rng(1)
+        names, buffer = make_pose_buffer(humanoid_rest, rng, extra)
+        indices = pose_math.bone_indices(names, humanoid_rest[0])
+        assert [names[i] for i in indices] == humanoid_rest[0]
+        poses.append(capture_pose(index, names, buffer))
+    assert poses[0] == poses[1]
+    assert len(poses[0]["rotations"]) == len(humanoid_rest[0])
+
+
+@pytest.mark.benchmark(group="capture extra bones")
+@pytest.mark.parametrize("extra", [0, 500, 2000])
+def test_capture_extra_bones_benchmark(benchmark, humanoid_rest, rng, extra):
+    """
+    one copy of the pose. only the humanoid matrices are copied out of the
+    buffer, the name lookup is linear in all bones
+    """
+    index = skeleton.HumanIndex(BONE_FROM_PROP)
+    names, buffer = make_pose_buffer(humanoid_rest, rng, extra)
+    pose = benchmark(capture_pose, index, names, buffer)
+    assert len(pose["rotations"]) == len(humanoid_rest[0])
@@ -0,0 +1,159 @@
+import pytest
+from core.humanoid_layout import BONE_FROM_PROP
+from core.rig_spec import (
+    ConstraintSpec,
+    EditBoneSpec,
+    PoseBoneSpec,
+    RigPart,
+    find_conflicts,
+    parse_state,
+    part_hash,
+    plan_update,
+    record_state,
+)
+
+FINGERS = ["Thumb", "Index", "Middle", "Ring", "Little"]
+
+
+def make_parts(extra: int = 0):
+    """
+    parts shaped like add_humanoid_rig.make_rig. extra bones are in the base part
+    """
+    parts = [
+        RigPart(
+            "pelvis",
+            edit_bones=[
+                EditBoneSpec("Root", parent="", head=(0, 0, 0), tail=(0, 1, 0)),
+                EditBoneSpec("COG", parent="Root", head=(0, 0, 1), tail=(0, 0.4, 1)),
+                EditBoneSpec("Pelvis", parent="COG", head=(0, 0, 1), tail=(0, 0, 0.9)),
+                EditBoneSpec(BONE_FROM_PROP["hips"], parent="Pelvis"),
+            ],
+            pose_bones=[
+                PoseBoneSpec(BONE_FROM_PROP["hips"], (("lock_rotation", (1, 1, 1)),))
+            ],
+        )
+    ]
+    for suffix, side in ((".L", "left_"), (".R", "right_")):
+        for limb, target in (("Leg", "foot"), ("Arm", "hand")):
+            lower = BONE_FROM_PROP[f"{side}lower_{limb.lower()}"]
+            parts.append(
+                RigPart(
+                    f"{limb.lower()}_ik{suffix}",
+                    edit_bones=[
+                        EditBoneSpec(f"{limb}IK{suffix}", parent="Root"),
+                        EditBoneSpec(f"{limb}Pole{suffix}", parent="Root"),
+                    ],
+                    constraints=[
+                        ConstraintSpec(lower, "IK", "IK"),
+                        ConstraintSpec(
+                            BONE_FROM_PROP[f"{side}{target}"],
+                            "COPY_ROTATION",
+                            "Copy Rotation",
+                        ),
+                    ],
+                )
+            )
+        for finger in FINGERS:
+            bend = f"Bend{finger}{suffix}"
+            parts.append(
+                RigPart(
+                    f"bend_{finger.lower()}{suffix}",
+                    edit_bones=[
+                        EditBoneSpec(bend, parent=BONE_FROM_PROP[f"{side}hand"])
+                    ],
+                    pose_bones=[PoseBoneSpec(bend, (("rotation_mode", "ZYX"),))],
+                )
+            )
+    rig_names = {spec.name for part in parts for spec in part.edit_bones}
+    bones = [bone for bone in BONE_FROM_PROP.values() if bone not in rig_names]
+    bones += [f"extra_{i:04}" for i in range(extra)]
+    base = RigPart(
+        "base",
+        pose_bones=[PoseBoneSpec(bone, (("lock_scale", (1, 1, 1)),)) for bone in bones],
+    )
+    return [base] + parts
+
+
+def build_state(owned=()):
+    """
+    the state after the first build
+    """
+    return record_state({}, plan_update({}, make_parts(), lambda _: False), owned)
+
+
+def test_first_build_applies_all_parts():
+    parts = make_parts()
+    plan = plan_update({}, parts, lambda _: False)
+    assert plan.dirty == parts
+    assert plan.stale == plan.bones == plan.constraints == []
+
+
+def test_rebuild_is_noop():
+    state = build_state(["Root"])
+    assert state["pelvis"]["bones"] == ["Root"]
+    assert plan_update(state, make_parts(), lambda _: True) == ([], [], [], [])
+
+
+def test_changed_or_missing_part_only():
+    state = build_state()
+    parts = make_parts()
+    parts[1] = parts[1]._replace(edit_bones=parts[1].edit_bones[:-1])
+    plan = plan_update(state, parts, lambda _: True)
+    assert [part.name for part in plan.dirty] == ["pelvis"]
+    plan = plan_update(state, make_parts(), lambda part: part.name != "base")
+    assert [part.name for part in plan.dirty] == ["base"]
+
+
+def test_stale_part_is_removed():
+    parts = make_parts()
+    state = build_state(["LegIK.L"])
+    leg = next(part for part in parts if part.name == "leg_ik.L")
+    rest = [part for part in parts if part is not leg]
+    plan = plan_update(state, rest, lambda _: True)
+    assert plan.stale == ["leg_ik.L"]
+    assert plan.bones == ["LegIK.L"]
+    assert sorted(plan.constraints) == sorted(
+        (spec.bone, spec.name) for spec in leg.constraints
+    )
+    record_state(state, plan, [])
+    assert "leg_ik.L" not in state
+
+
+def test_parse_state():
+    assert parse_state("broken") == {}
+    assert parse_state('{"base": "abc"}') == {
+        "base": {"hash": "abc", "bones": [], "constraints": []}
+    }
+
+
+def test_find_conflicts():
+    parts = make_parts()
+    assert find_conflicts(parts) == []
+    hips = BONE_FROM_PROP["hips"]
+    twice = parts + [
+        RigPart("other", pose_bones=[PoseBoneSpec(hips, (("lock_rotation", ()),))])
+    ]
+    assert find_conflicts(twice) == [f"{hips}.lock_rotation: pelvis, other"]
+
+
+def test_part_hash():
+    assert part_hash(make_parts()[1]) == part_hash(make_parts()[1])
+    assert part_hash(make_parts()[0]) != part_hash(make_parts(1)[0])
+
+
+@pytest.mark.benchmark(group="add rig")
+@pytest.mark.parametrize("extra", [0, 500, 5000])
+def test_rebuild_plan_benchmark(benchmark, extra):
+    """
+    the bpy free part of Add Rig on a built rig: ownership check, hashes and
+    the plan. applying the parts needs blender and is not measured here
+    """
+    state = record_state({}, plan_update({}, make_parts(extra), lambda _: False), [])
+
+    def rebuild():
+        parts = make_parts(extra)
+        assert not find_conflicts(parts)
+        return plan_update(state, parts, lambda _: True)
+
+    plan = benchmark(rebuild)
+    assert not plan.dirty
@@ -0,0 +1,83 @@
+import pytest
+from core import skeleton
+from core.humanoid_layout import BONE_FROM_PROP
+
+
+def test_prop_order():
+    assert sorted(skeleton.PROP_ORDER) == sorted(skeleton.PROP_NAMES)
+    assert skeleton.PROP_ORDER[0] == "hips"
+    for i, parent in enumerate(skeleton.PARENT_INDICES):
+        assert parent < i
+
+
+def test_tree_tables():
+    assert skeleton.get_parent("hips") is None
+    assert skeleton.get_parent("left_hand") == "left_lower_arm"
+    assert list(skeleton.enum_children("chest")) == [
+        "neck",
+        "left_shoulder",
+        "right_shoulder",
+    ]
+    assert list(skeleton.enum_children("head")) == []
+    assert len(list(skeleton.enum_subtree("left_hand"))) == 16
+    assert list(skeleton.enum_subtree("hips")) == skeleton.PROP_ORDER
+
+
+@pytest.mark.parametrize("prop", skeleton.PROP_NAMES)
+def test_mirror(prop):
+    mirror = skeleton.get_mirror(prop)
+    assert skeleton.get_mirror(mirror) == prop
+    assert mirror.replace("right_", "left_") == prop.replace("right_", "left_")
+
+
+def test_humanbone_names():
+    # props without an entry have the same humanBone name
+    vrm_names = [skeleton.PROP_TO_HUMANBONE.get(p, p) for p in skeleton.PROP_NAMES]
+    assert len(set(vrm_names)) == len(skeleton.PROP_NAMES)
+    for prop, vrm_name in skeleton.PROP_TO_HUMANBONE.items():
+        assert skeleton.HUMANBONE_TO_PROP[vrm_name] == prop
+
+
+def test_human_index_flatten():
+    index = skeleton.HumanIndex(BONE_FROM_PROP)
+    bone_names, vrm_names, parents = index.flatten()
+    assert len(bone_names) == len(skeleton.PROP_NAMES)
+    assert bone_names[0] == "Hips"
+    assert vrm_names[bone_names.index("UpperArm.L")] == "leftUpperArm"
+    for i, parent in enumerate(parents):
+        assert parent < i
+    assert bone_names[parents[bone_names.index("Hand.L")]] == "LowerArm.L"
+
+
+def test_human_index_first_prop_wins():
+    index = skeleton.HumanIndex({**BONE_FROM_PROP, "neck": "Head"})
+    assert index.prop_from_bone["Head"] == "neck"
+    bone_names, _, _ = index.flatten()
+    assert bone_names.count("Head") == 1
+
+
+def test_human_index_skips_unassigned():
+    """
+    the subtree of an unassigned chest hangs on the spine
+    """
+    mapping = {
+        prop: bone
+        for prop, bone in BONE_FROM_PROP.items()
+        if prop not in ("chest", "left_shoulder")
+    }
+    index = skeleton.HumanIndex(mapping)
+    bone_names, vrm_names, parents = index.flatten()
+    assert len(bone_names) == len(mapping)
+    spine = BONE_FROM_PROP["spine"]
+    assert index.parent_from_bone[BONE_FROM_PROP["neck"]] == spine
+    assert index.parent_from_bone[BONE_FROM_PROP["left_upper_arm"]] == spine
+    assert bone_names[parents[vrm_names.index("leftUpperArm")]] == spine
+
+
+@pytest.mark.benchmark(group="human index")
+def test_human_index_benchmark(benchmark):
+    def build():
+        return skeleton.HumanIndex(BONE_FROM_PROP).flatten()
+
+    bone_names, _, _ = benchmark(build)
+    assert len(bone_names) == len(skeleton.PROP_NAMES)
@@ -0,0 +1,123 @@
+import numpy
+import pytest
+from core import skeleton
+from core.humanoid_layout import BONE_FROM_PROP, Proportions, get_layout
+from core.topology import Skeleton, TopologyMatcher
+
+
+def make_skeleton(tips: bool = True, table=Proportions(), rename: bool = True):
+    """
+    the default humanoid under a Root bone. bones are renamed Bone.000 ...
+    """
+    layout = get_layout()
+    heads = layout.heads(numpy.array([table], dtype=float))[0]
+    indices = [i for i in range(len(layout.names)) if tips or i in layout.bones]
+    order = {i: j + 1 for j, i in enumerate(indices)}
+    names = ["Root"] + [layout.names[i] for i in indices]
+    parents = [-1] + [order.get(layout.parents[i], 0) for i in indices]
+    positions = [(0.0, 0.0, 0.0)] + [tuple(heads[i]) for i in indices]
+    if rename:
+        expected = {
+            prop: f"Bone.{names.index(bone):03}"
+            for prop, bone in BONE_FROM_PROP.items()
+        }
+        names = [f"Bone.{i:03}" for i in range(len(names))]
+    else:
+        expected = dict(BONE_FROM_PROP)
+    return Skeleton(names, parents, positions), expected
+
+
+@pytest.mark.parametrize("tips", [True, False])
+@pytest.mark.parametrize(
+    "table", [Proportions(), Proportions(1.8, 1.1, 0.9, 1.2)], ids=["default", "tall"]
+)
+def test_default_humanoid(tips, table):
+    sk, expected = make_skeleton(tips, table)
+    result = TopologyMatcher(sk).match()
+    wrong = {
+        prop: (result[prop].bone if prop in result else None, bone)
+        for prop, bone in expected.items()
+        if prop not in result or result[prop].bone != bone
+    }
+    assert not wrong
+    assert all(match.confidence > 0.9 for match in result.values())
+
+
+def test_ambiguous_fingers_lower_confidence():
+    """
+    finger roots on one point give no palm axis
+    """
+    sk, expected = make_skeleton()
+    little = sk.names.index(expected["left_little_proximal"])
+    for prop in ("index_proximal", "middle_proximal", "ring_proximal"):
+        sk.heads[sk.names.index(expected[f"left_{prop}"])] = sk.heads[little]
+    result = TopologyMatcher(sk).match()
+    assert result["left_hand"].confidence > 0.9
+    assert result["left_index_proximal"].confidence < 0.9
+    assert result["right_index_proximal"].confidence > 0.9
+
+
+def remove_bones(sk: Skeleton, removed: set) -> Skeleton:
+    """
+    children of a removed bone move to its parent
+    """
+
+    def get_parent(i):
+        parent = sk.parents[i]
+        while parent in removed:
+            parent = sk.parents[parent]
+        return parent
+
+    keep = [i for i in range(len(sk.names)) if i not in removed]
+    order = {i: j for j, i in enumerate(keep)}
+    parents = [order.get(get_parent(i), -1) for i in keep]
+    return Skeleton([sk.names[i] for i in keep], parents, [sk.heads[i] for i in keep])
+
+
+def test_short_arm_without_fingers():
+    """
+    upper arm, lower arm and hand. no shoulder, no fingers, no tips
+    """
+    sk, expected = make_skeleton(tips=False)
+    fingers = ("thumb", "index", "middle", "ring", "little")
+    props = [
+        prop
+        for prop in expected
+        if prop.endswith("shoulder") or any(f in prop for f in fingers)
+    ]
+    sk = remove_bones(sk, {sk.names.index(expected[prop]) for prop in props})
+    result = TopologyMatcher(sk).match()
+    for side in ("left_", "right_"):
+        arm = [f"{side}upper_arm", f"{side}lower_arm", f"{side}hand"]
+        assert [result[prop].bone for prop in arm] == [expected[p] for p in arm]
+        assert f"{side}shoulder" not in result
+
+
+def test_chain_is_memoized():
+    sk, expected = make_skeleton()
+    arm = sk.names.index(expected["left_shoulder"])
+    assert len(sk.chain(arm)) == 4
+    assert sk.chain(arm) is sk.chain(arm)
+
+
+@pytest.mark.benchmark(group="topology")
+@pytest.mark.parametrize("count", [1, 10])
+def test_topology_benchmark(benchmark, count):
+    """
+    count humanoids under one root. the largest subtree wins
+    """
+    sk, _ = make_skeleton()
+    names = ["Root"]
+    parents = [-1]
+    heads = [(0.0, 0.0, 0.0)]
+    for k in range(count):
+        base = len(names) - 1
+        names += [f"{name}.{k}" for name in sk.names[1:]]
+        parents += [p + base if p > 0 else 0 for p in sk.parents[1:]]
+        heads += sk.heads[1:]
+
+    def match():
+        return TopologyMatcher(Skeleton(names, parents, heads)).match()
+
+    result = benchmark(match)
+    assert len(result) == len(skeleton.PROP_NAMES)
@@ -0,0 +1,97 @@
+import json
+import numpy
+import pytest
+from conftest import random_quaternions, same_rotation
+from core import gltf, pose_math, vrma
+
+
+def test_zup_rotation_is_unit():
+    rotation = vrma.new_pose_gltf()["nodes"][0]["rotation"]
+    assert numpy.linalg.norm(rotation) == pytest.approx(1, abs=1e-15)
+
+
+def make_pose(humanoid_rest, rng, to_meter=1.0):
+    """
+    returns the document, (n, 4) world deltas and the posed hips position
+    """
+    bone_names, vrm_names, parents, rest = humanoid_rest
+    deltas = random_quaternions(rng, len(bone_names))
+    posed = rest.copy()
+    posed[:, :3, :3] = pose_math.quat_to_mat3(deltas) @ rest[:, :3, :3]
+    posed[0, :3, 3] += (0.1, 0.2, -0.3)
+
+    doc = vrma.new_pose_gltf()
+    vrma.add_tpose(doc, bone_names, vrm_names, parents, rest, to_meter)
+    vrma.set_pose(doc, vrm_names, parents, posed, to_meter)
+    # through the clipboard
+    return json.loads(json.dumps(doc)), deltas, posed[0, :3, 3]
+
+
+def test_pose_roundtrip(humanoid_rest, rng):
+    _, vrm_names, _, _ = humanoid_rest
+    doc, deltas, hips = make_pose(humanoid_rest, rng)
+    pose = vrma.parse_pose(doc)
+    assert pose.unknown == []
+    numpy.testing.assert_allclose(pose.hips_position, hips, atol=1e-9)
+    for i, vrm_name in enumerate(vrm_names):
+        assert same_rotation(pose.deltas[vrm_name][0], deltas[i], atol=1e-9), vrm_name
+
+
+def test_pose_roundtrip_rounded_zup(humanoid_rest, rng):
+    """
+    documents of older versions have a rounded __zup__ rotation
+    """
+    _, vrm_names, _, _ = humanoid_rest
+    doc, deltas, _ = make_pose(humanoid_rest, rng)
+    doc["nodes"][0]["rotation"] = [-0.7071, 0, 0, 0.7071]
+    pose = vrma.parse_pose(doc)
+    for i, vrm_name in enumerate(vrm_names):
+        assert same_rotation(pose.deltas[vrm_name][0], deltas[i], atol=1e-9), vrm_name
+
+
+def test_parse_pose_unknown(humanoid_rest, rng):
+    doc, _, _ = make_pose(humanoid_rest, rng)
+    vrma.get_pose(doc)["rotations"]["tail"] = [0, 0, 0, 1]
+    assert vrma.parse_pose(doc).unknown == ["tail"]
+
+
+def test_normalized_from_world_deltas(humanoid_rest, rng):
+    _, vrm_names, parents, _ = humanoid_rest
+    hips = random_quaternions(rng, 1)
+    # the rest follows the hips
+    rotations = vrma.normalized_from_world_deltas({"hips": hips}, vrm_names, parents)
+    assert rotations.shape == (1, len(vrm_names), 4)
+    assert same_rotation(rotations[0, 0], hips[0])
+    identity = numpy.tile([0, 0, 0, 1.0], (len(vrm_names) - 1, 1))
+    assert same_rotation(rotations[0, 1:], identity)
+
+
+def test_write_animation(humanoid_rest, rng):
+    bone_names, vrm_names, parents, rest = humanoid_rest
+    doc = vrma.new_pose_gltf()
+    vrma.add_tpose(doc, bone_names, vrm_names, parents, rest, 1)
+    frames = 10
+    times = numpy.arange(frames) / 30
+    rotations = numpy.stack(
+        [random_quaternions(rng, frames) for _ in vrm_names], axis=0
+    )
+    translations = rng.normal(size=(frames, 3))
+    data = vrma.write_animation(doc, times, vrm_names, rotations, translations)
+
+    doc, binary = gltf.read_glb(data)
+    vrm_from_node = {
+        value["node"]: name for name, value in vrma.get_human_bones(doc).items()
+    }
+    (animation,) = doc["animations"]
+    for channel in animation["channels"]:
+        sampler = animation["samplers"][channel["sampler"]]
+        target = channel["target"]
+        vrm_name = vrm_from_node[target["node"]]
+        values = gltf.read_accessor(doc, binary, sampler["output"])
+        if target["path"] == "translation":
+            assert vrm_name == "hips"
+            numpy.testing.assert_allclose(values, translations, atol=1e-6)
+        else:
+            expected = rotations[vrm_names.index(vrm_name)]
+            numpy.testing.assert_allclose(values, expected, atol=1e-6)
+    assert len(animation["channels"]) == len(vrm_names) + 1
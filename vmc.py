@@ -0,0 +1,640 @@
+"""
+VMC protocol (OSC over UDP) sender and receiver
+
+https://protocol.vmc.info/specification
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import socket
+import struct
+import threading
+import time
+import bpy
+import numpy
+from .copy_humanoid_pose import PoseSampler
+from .apply_humanoid_pose import PoseApplier
+
+ROOT_POS = "/VMC/Ext/Root/Pos"
+BONE_POS = "/VMC/Ext/Bone/Pos"
+OK = "/VMC/Ext/OK"
+TIME = "/VMC/Ext/T"
+
+# keep bundles under a typical MTU
+MAX_PACKET = 1400
+
+# VRM-1.0 humanBone => Unity HumanBodyBones
+VRM1_TO_UNITY = {
+    "leftThumbMetacarpal": "LeftThumbProximal",
+    "leftThumbProximal": "LeftThumbIntermediate",
+    "leftThumbDistal": "LeftThumbDistal",
+    "rightThumbMetacarpal": "RightThumbProximal",
+    "rightThumbProximal": "RightThumbIntermediate",
+    "rightThumbDistal": "RightThumbDistal",
+}
+
+
+def unity_bone_name(vrm_name: str) -> str:
+    unity_name = VRM1_TO_UNITY.get(vrm_name)
+    if unity_name:
+        return unity_name
+    return vrm_name[0].upper() + vrm_name[1:]
+
+
+def osc_string(value: str) -> bytes:
+    data = value.encode("utf-8") + b"\x00"
+    return data + b"\x00" * (-len(data) % 4)
+
+
+def osc_message(address: str, tags: str, *args) -> bytes:
+    data = [osc_string(address), osc_string("," + tags)]
+    for tag, arg in zip(tags, args):
+        if tag == "s":
+            data.append(osc_string(arg))
+        elif tag == "f":
+            data.append(struct.pack(">f", arg))
+        elif tag == "i":
+            data.append(struct.pack(">i", arg))
+        else:
+            raise ValueError(f"unknown osc tag: {tag}")
+    return b"".join(data)
+
+
+BUNDLE_HEADER = osc_string("#bundle") + struct.pack(">Q", 1)  # immediately
+
+
+def pack_bundles(
+    messages: List[bytes], max_size: int = MAX_PACKET
+) -> List[Tuple[bytes, int, int]]:
+    """
+    pack messages into as few bundles as possible.
+    (bundle, first message index, end message index)
+    """
+    bundles = []
+    current = [BUNDLE_HEADER]
+    size = len(BUNDLE_HEADER)
+    first = 0
+    for i, message in enumerate(messages):
+        element = struct.pack(">i", len(message)) + message
+        if len(current) > 1 and size + len(element) > max_size:
+            bundles.append((b"".join(current), first, i))
+            current = [BUNDLE_HEADER]
+            size = len(BUNDLE_HEADER)
+            first = i
+        current.append(element)
+        size += len(element)
+    if len(current) > 1:
+        bundles.append((b"".join(current), first, len(messages)))
+    return bundles
+
+
+def osc_bundles(messages: List[bytes], max_size: int = MAX_PACKET) -> List[bytes]:
+    return [bundle for bundle, _, _ in pack_bundles(messages, max_size)]
+
+
+def to_unity_positions(positions: numpy.ndarray) -> numpy.ndarray:
+    """
+    blender(z-up, right handed) => unity(y-up, left handed)
+    """
+    x, y, z = positions[..., 0], positions[..., 1], positions[..., 2]
+    return numpy.stack([-x, z, -y], axis=-1)
+
+
+def to_unity_rotations(rotations: numpy.ndarray) -> numpy.ndarray:
+    x, y, z, w = (
+        rotations[..., 0],
+        rotations[..., 1],
+        rotations[..., 2],
+        rotations[..., 3],
+    )
+    return numpy.stack([x, -z, y, w], axis=-1)
+
+
+def from_unity_positions(positions: numpy.ndarray) -> numpy.ndarray:
+    x, y, z = positions[..., 0], positions[..., 1], positions[..., 2]
+    return numpy.stack([-x, -z, y], axis=-1)
+
+
+def from_unity_rotations(rotations: numpy.ndarray) -> numpy.ndarray:
+    x, y, z, w = (
+        rotations[..., 0],
+        rotations[..., 1],
+        rotations[..., 2],
+        rotations[..., 3],
+    )
+    return numpy.stack([x, z, -y, w], axis=-1)
+
+
+BONE_STRUCT = struct.Struct(">7f")
+
+
+class Frame(NamedTuple):
+    messages: List[bytes]
+    # bone index of each message. -1 for others
+    bones: List[int]
+    translation: numpy.ndarray
+    rotations: numpy.ndarray
+
+
+class VmcSender:
+    """
+    sends humanoid bone rotations and hips translation of obj
+    from a bpy.app.timers loop
+    """
+
+    def __init__(
+        self,
+        obj: bpy.types.Object,
+        host: str = "127.0.0.1",
+        port: int = 39539,
+        *,
+        rate: float = 60,
+        epsilon: float = 1e-5,
+        keyframe: float = 1,
+        to_meter: float = 1,
+    ) -> None:
+        self.obj = obj
+        self.address = (host, port)
+        self.interval = 1 / rate
+        self.epsilon = epsilon
+        # seconds between full poses. recovers receivers from lost packets
+        self.keyframe = keyframe
+        self.sampler = PoseSampler(obj, to_meter)
+
+        # address, type tags and bone name do not change
+        self.bone_prefixes = [
+            osc_string(BONE_POS)
+            + osc_string(",sfffffff")
+            + osc_string(unity_bone_name(vrm_name))
+            for vrm_name in self.sampler.vrm_names
+        ]
+        # rest offset from parent. VRM normalized bones have no rest rotation
+        heads = self.sampler.rest_matrices[:, :3, 3]
+        offsets = heads.copy()
+        has_parent = self.sampler.parent_indices >= 0
+        offsets[has_parent] -= heads[self.sampler.parent_indices[has_parent]]
+        self.offsets = to_unity_positions(offsets * to_meter)
+
+        # last values that reached the socket
+        self.last_rotations: Optional[numpy.ndarray] = None
+        self.last_translation: Optional[numpy.ndarray] = None
+        self.last_keyframe = 0.0
+        self.socket: Optional[socket.socket] = None
+        self.last_tick = 0.0
+        self.started = 0.0
+
+        # counters
+        self.frames_sent = 0
+        self.packets_sent = 0
+        self.frames_dropped = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self.socket is not None
+
+    def start(self):
+        if self.socket:
+            return
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.started = self.last_tick = time.perf_counter()
+        bpy.app.timers.register(self._tick, first_interval=0)
+
+    def stop(self):
+        if bpy.app.timers.is_registered(self._tick):
+            bpy.app.timers.unregister(self._tick)
+        if self.socket:
+            self.socket.close()
+            self.socket = None
+        # next start sends the full pose
+        self.last_rotations = None
+        self.last_translation = None
+
+    def _tick(self) -> Optional[float]:
+        if not self.socket:
+            return None
+        now = time.perf_counter()
+        missed = int((now - self.last_tick) / self.interval) - 1
+        if missed > 0:
+            self.frames_dropped += missed
+        self.last_tick = now
+        try:
+            self.send_frame(now - self.started)
+        except ReferenceError:
+            # object removed
+            self.stop()
+            return None
+        return self.interval
+
+    def build_frame(self, elapsed: float, full: bool = False) -> Frame:
+        translation, rotations = self.sampler.sample_normalized()
+        rotations = to_unity_rotations(rotations)
+        translation = to_unity_positions(translation)
+
+        # changed bones only
+        if full or self.last_rotations is None:
+            changed = numpy.ones(len(rotations), dtype=bool)
+        else:
+            dot = numpy.abs(numpy.sum(rotations * self.last_rotations, axis=1))
+            changed = 1 - dot > self.epsilon
+        if self.last_translation is None or (
+            numpy.abs(translation - self.last_translation).max() > self.epsilon
+        ):
+            changed[0] = True
+
+        messages = [osc_message(TIME, "f", elapsed), osc_message(OK, "i", 1)]
+        if full or self.last_rotations is None:
+            messages.append(
+                osc_message(ROOT_POS, "sfffffff", "root", 0, 0, 0, 0, 0, 0, 1)
+            )
+        bones = [-1] * len(messages)
+        for i in numpy.flatnonzero(changed):
+            p = translation if i == 0 else self.offsets[i]
+            q = rotations[i]
+            messages.append(
+                self.bone_prefixes[i]
+                + BONE_STRUCT.pack(p[0], p[1], p[2], q[0], q[1], q[2], q[3])
+            )
+            bones.append(int(i))
+        return Frame(messages, bones, translation, rotations)
+
+    def commit(self, frame: Frame, sent: List[int]):
+        """
+        remember the bones that were sent. the others are sent again next frame
+        """
+        if self.last_rotations is None:
+            # zero never matches, so unsent bones stay changed
+            self.last_rotations = numpy.zeros_like(frame.rotations)
+        self.last_rotations[sent] = frame.rotations[sent]
+        if 0 in sent:
+            self.last_translation = frame.translation
+
+    def send_frame(self, elapsed: float):
+        assert self.socket
+        full = (
+            self.last_rotations is None
+            or elapsed - self.last_keyframe >= self.keyframe
+        )
+        frame = self.build_frame(elapsed, full)
+        sent: List[int] = []
+        for bundle, first, end in pack_bundles(frame.messages):
+            try:
+                self.socket.sendto(bundle, self.address)
+                self.packets_sent += 1
+            except (BlockingIOError, OSError):
+                # receiver or network can not keep up
+                self.frames_dropped += 1
+                break
+            sent += [bone for bone in frame.bones[first:end] if bone >= 0]
+        else:
+            self.frames_sent += 1
+            if full:
+                self.last_keyframe = elapsed
+        self.commit(frame, sent)
+
+
+BUNDLE_TAG = osc_string("#bundle")
+BONE_PREFIX = osc_string(BONE_POS) + osc_string(",sfffffff")
+TIME_PREFIX = osc_string(TIME) + osc_string(",f")
+INT32 = struct.Struct(">i")
+FLOAT32 = struct.Struct(">f")
+TIMETAG = struct.Struct(">Q")
+IMMEDIATELY = 1
+# nested bundles. deeper packets are dropped
+MAX_BUNDLE_DEPTH = 8
+
+
+class PoseRingBuffer:
+    """
+    single producer (receive thread) and single consumer (timer).
+    the producer fills slot `writing % size` and publishes it by assigning head.
+    slots keep the raw big endian floats of /VMC/Ext/Bone/Pos: px py pz qx qy qz qw
+    """
+
+    def __init__(self, bone_count: int, size: int = 4) -> None:
+        self.size = size
+        self.frames = numpy.zeros((size, bone_count, 7), dtype=">f4")
+        self.frames[:, :, 6] = 1
+        self.raw = memoryview(self.frames).cast("B")
+        self.slot_size = bone_count * BONE_STRUCT.size
+        # frame number in each slot. -1 while the producer writes it
+        self.sequences = [-1] * size
+        self.head = -1
+        self.writing = 0
+
+    def begin(self) -> int:
+        slot = self.writing % self.size
+        self.sequences[slot] = -1
+        if self.head >= 0:
+            # bones not in this packet keep last values
+            self.frames[slot] = self.frames[self.head % self.size]
+        return slot
+
+    def publish(self):
+        self.sequences[self.writing % self.size] = self.writing
+        self.head = self.writing
+        self.writing += 1
+
+    def read(self) -> Optional[Tuple[int, numpy.ndarray]]:
+        """
+        (frame number, copy of the latest frame).
+        None if the producer lapped the consumer during the copy
+        """
+        head = self.head
+        if head < 0:
+            return None
+        slot = head % self.size
+        if self.sequences[slot] != head:
+            return None
+        frame = self.frames[slot].astype(numpy.float64)
+        if self.sequences[slot] != head:
+            return None
+        return head, frame
+
+
+class VmcReceiver:
+    """
+    receives /VMC/Ext/Bone/Pos in a background thread.
+    a bpy.app.timers callback applies only the latest frame to obj.
+
+    a frame may be split into several bundles. bones are merged into one slot
+    and the slot is published when /VMC/Ext/T or the bundle time tag changes.
+    streams without either publish every packet.
+    """
+
+    def __init__(
+        self,
+        obj: bpy.types.Object,
+        host: str = "0.0.0.0",
+        port: int = 39539,
+        *,
+        rate: float = 120,
+        to_meter: float = 1,
+    ) -> None:
+        self.obj = obj
+        self.address = (host, port)
+        self.interval = 1 / rate
+        self.applier = PoseApplier(obj, to_meter)
+        # padded name size => (padded name, bone index)
+        self.bone_names: Dict[int, List[Tuple[bytes, int]]] = {}
+        for i, vrm_name in enumerate(self.applier.vrm_names):
+            name = osc_string(unity_bone_name(vrm_name))
+            self.bone_names.setdefault(len(name), []).append((name, i))
+        self.ring = PoseRingBuffer(len(self.applier.vrm_names))
+        self.buffer = bytearray(65536)
+        self.view = memoryview(self.buffer)
+        # slot of the frame being received
+        self.slot: Optional[int] = None
+        # marker kind => value of the frame being received
+        self.markers: Dict[str, float] = {}
+        self.socket: Optional[socket.socket] = None
+        self.thread: Optional[threading.Thread] = None
+        self.applied = -1
+
+        # counters
+        self.packets_received = 0
+        self.packets_dropped = 0
+        self.frames_applied = 0
+        self.frames_skipped = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self.socket is not None
+
+    def start(self):
+        if self.socket:
+            return
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            s.bind(self.address)
+        except OSError:
+            s.close()
+            raise
+        # wake up to check stop
+        s.settimeout(0.5)
+        self.socket = s
+        self.thread = threading.Thread(target=self._receive_loop, daemon=True)
+        self.thread.start()
+        bpy.app.timers.register(self._tick, first_interval=0)
+
+    def stop(self):
+        if bpy.app.timers.is_registered(self._tick):
+            bpy.app.timers.unregister(self._tick)
+        s = self.socket
+        self.socket = None
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        if s:
+            s.close()
+
+    def _receive_loop(self):
+        s = self.socket
+        assert s
+        while self.socket:
+            try:
+                size = s.recv_into(self.buffer)
+            except socket.timeout:
+                # stream paused. the last frame is complete
+                self._publish()
+                continue
+            except OSError:
+                break
+            try:
+                self._parse(0, size)
+            except (ValueError, struct.error):
+                # malformed packet. keep receiving
+                self.packets_dropped += 1
+                continue
+            if not self.markers:
+                # no frame boundary in this stream
+                self._publish()
+            self.packets_received += 1
+
+    def _publish(self):
+        if self.slot is not None:
+            self.ring.publish()
+            self.slot = None
+
+    def _mark(self, kind: str, value: float):
+        """
+        a new value starts a new frame
+        """
+        last = self.markers.get(kind)
+        if last is not None and last != value:
+            self._publish()
+        self.markers[kind] = value
+
+    def _find_bone(self, start: int, end: int) -> Optional[int]:
+        """
+        compare in place. no bytes copy per message
+        """
+        for name, index in self.bone_names.get(end - start, ()):
+            if self.buffer.startswith(name, start, end):
+                return index
+        return None
+
+    def _parse(self, start: int, end: int, depth: int = 0):
+        """
+        raises ValueError or struct.error on a malformed packet
+        """
+        buffer = self.buffer
+        view = self.view
+        if buffer.startswith(BUNDLE_TAG, start, end):
+            if depth >= MAX_BUNDLE_DEPTH:
+                raise ValueError("bundle too deep")
+            pos = start + len(BUNDLE_TAG)
+            if pos + TIMETAG.size > end:
+                raise ValueError("truncated bundle")
+            (timetag,) = TIMETAG.unpack_from(view, pos)
+            if timetag != IMMEDIATELY:
+                self._mark("timetag", timetag)
+            pos += TIMETAG.size
+            while pos + 4 <= end:
+                (size,) = INT32.unpack_from(view, pos)
+                pos += 4
+                if size <= 0 or pos + size > end:
+                    raise ValueError(f"bundle element size: {size}")
+                self._parse(pos, pos + size, depth + 1)
+                pos += size
+        elif buffer.startswith(BONE_PREFIX, start, end):
+            pos = start + len(BONE_PREFIX)
+            # padded name
+            name_end = buffer.index(0, pos, end)
+            data = pos + (name_end - pos + 4) // 4 * 4
+            index = self._find_bone(pos, data)
+            if index is not None and data + BONE_STRUCT.size <= end:
+                if self.slot is None:
+                    self.slot = self.ring.begin()
+                offset = self.slot * self.ring.slot_size + index * BONE_STRUCT.size
+                self.ring.raw[offset : offset + BONE_STRUCT.size] = view[
+                    data : data + BONE_STRUCT.size
+                ]
+        elif buffer.startswith(TIME_PREFIX, start, end):
+            pos = start + len(TIME_PREFIX)
+            if pos + FLOAT32.size <= end:
+                (t,) = FLOAT32.unpack_from(view, pos)
+                self._mark("time", t)
+
+    def _tick(self) -> Optional[float]:
+        if not self.socket:
+            return None
+        # None while the slot is overwritten. retry on the next tick
+        latest = self.ring.read()
+        if latest and latest[0] > self.applied:
+            head, frame = latest
+            if self.applied >= 0:
+                self.frames_skipped += head - self.applied - 1
+            self.applied = head
+            try:
+                self.applier.apply(
+                    from_unity_rotations(frame[:, 3:]),
+                    from_unity_positions(frame[0, :3]),
+                )
+            except ReferenceError:
+                # object removed
+                self.stop()
+                return None
+            self.frames_applied += 1
+        return self.interval
+
+
+# object name => sender
+SENDERS: Dict[str, VmcSender] = {}
+# object name => receiver
+RECEIVERS: Dict[str, VmcReceiver] = {}
+
+
+def get_sender(obj: bpy.types.Object) -> Optional[VmcSender]:
+    return SENDERS.get(obj.name)
+
+
+def get_receiver(obj: bpy.types.Object) -> Optional[VmcReceiver]:
+    return RECEIVERS.get(obj.name)
+
+
+def stop_all():
+    for sender in SENDERS.values():
+        sender.stop()
+    SENDERS.clear()
+    for receiver in RECEIVERS.values():
+        receiver.stop()
+    RECEIVERS.clear()
+
+
+class VmcSend(bpy.types.Operator):
+    """Start or stop sending humanoid pose by VMC protocol"""
+
+    bl_idname = "humanoid.vmc_send"
+    bl_label = "VMC Send"
+    bl_options = {"REGISTER"}
+
+    host: bpy.props.StringProperty(name="host", default="127.0.0.1")
+    port: bpy.props.IntProperty(name="port", default=39539, min=1, max=65535)
+    rate: bpy.props.FloatProperty(name="rate", default=60, min=1, max=240)
+    epsilon: bpy.props.FloatProperty(name="epsilon", default=1e-5, min=0)
+
+    @classmethod
+    def poll(cls, context: bpy.types.Context) -> bool:
+        if context.active_object:
+            return isinstance(context.active_object.data, bpy.types.Armature)
+        return False
+
+    def execute(self, context: bpy.types.Context):
+        obj = context.active_object
+        sender = SENDERS.pop(obj.name, None)
+        if sender:
+            sender.stop()
+            self.report(
+                {"INFO"},
+                f"vmc stop: {sender.packets_sent} packets, "
+                f"{sender.frames_dropped} dropped frames",
+            )
+            return {"FINISHED"}
+
+        sender = VmcSender(
+            obj, self.host, self.port, rate=self.rate, epsilon=self.epsilon
+        )
+        sender.start()
+        SENDERS[obj.name] = sender
+        self.report({"INFO"}, f"vmc send: {self.host}:{self.port}")
+        return {"FINISHED"}
+
+
+class VmcReceive(bpy.types.Operator):
+    """Start or stop driving humanoid pose by received VMC protocol"""
+
+    bl_idname = "humanoid.vmc_receive"
+    bl_label = "VMC Receive"
+    bl_options = {"REGISTER"}
+
+    host: bpy.props.StringProperty(name="host", default="0.0.0.0")
+    port: bpy.props.IntProperty(name="port", default=39539, min=1, max=65535)
+
+    @classmethod
+    def poll(cls, context: bpy.types.Context) -> bool:
+        if context.active_object:
+            return isinstance(context.active_object.data, bpy.types.Armature)
+        return False
+
+    def execute(self, context: bpy.types.Context):
+        obj = context.active_object
+        receiver = RECEIVERS.pop(obj.name, None)
+        if receiver:
+            receiver.stop()
+            self.report(
+                {"INFO"},
+                f"vmc stop: {receiver.packets_received} packets, "
+                f"{receiver.packets_dropped} dropped, "
+                f"{receiver.frames_applied} applied",
+            )
+            return {"FINISHED"}
+
+        receiver = VmcReceiver(obj, self.host, self.port)
+        try:
+            receiver.start()
+        except OSError as e:
+            self.report({"ERROR"}, f"vmc receive: {e}")
+            return {"CANCELLED"}
+        RECEIVERS[obj.name] = receiver
+        self.report({"INFO"}, f"vmc receive: {self.host}:{self.port}")
+        return {"FINISHED"}